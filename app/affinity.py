@@ -0,0 +1,357 @@
+# app/affinity.py
+
+import json
+import time
+import bisect
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
+
+from app.config import settings
+
+
+# Clients / upstream load balancers hash on this header (e.g. nginx
+# `hash $http_x_user_id consistent;`); the local router also reads user_id
+# from JSON bodies when it is missing.
+USER_HEADER = "x-user-id"
+EPOCH_HEADER = "x-affinity-epoch"      # router → workers: ring membership version
+NODE_HEADER = "x-affinity-node"        # router → client: worker that answered
+
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "content-length", "host",
+}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# ------------------------------------------------------------
+# CONSISTENT HASHING
+# ------------------------------------------------------------
+class HashRing:
+    """
+    Consistent hashing with `vnodes` virtual nodes per node: removing a
+    node only moves that node's users (to their next node on the ring),
+    and they move back when it returns.
+    """
+
+    def __init__(self, nodes, vnodes: int = 160):
+        self.nodes = list(nodes)
+        self.vnodes = vnodes
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str, exclude=()):
+        """Owner of `key`, skipping `exclude`d nodes; None if every node is excluded."""
+        if not self._hashes:
+            return None
+        start = bisect.bisect(self._hashes, _hash(str(key)))
+        for step in range(len(self._owners)):
+            node = self._owners[(start + step) % len(self._owners)]
+            if node not in exclude:
+                return node
+        return None
+
+
+# ------------------------------------------------------------
+# PER-USER STATE CACHE (worker side)
+# ------------------------------------------------------------
+_INVALIDATED = object()      # versioned invalidate marker: a miss that still rejects older puts
+
+
+class UserStateCache:
+    """
+    In-process cache of per-user state, by kind:
+      - "window"     recent turns + running summary (ChatMemory)
+      - "summaries"  long-term summary points with vectors (UserHistoryManager)
+      - "retrieval"  previous turn's context chunks (ContextSelector)
+
+    Only correct while each user is served by one worker (the affinity
+    router, or an upstream load balancer hashing on X-User-Id): that worker
+    then sees every write and keeps the entries current (write-through /
+    invalidate). A put carrying a `version` never replaces a newer cached
+    one, so a slow read cannot overwrite a write-through that raced it; an
+    invalidate with a `version` leaves a marker that rejects older puts the
+    same way (a read that started before the write cannot re-cache it).
+    Safety nets for when ownership moves:
+      - the router's epoch changes whenever ring membership changes, and a
+        worker seeing a new epoch drops everything
+      - entries expire after `ttl_seconds` regardless
+
+    Bounded LRU over users (`max_users`); hit / miss counts per kind.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl_seconds: float = 300.0, enabled: bool = False):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+
+        self._entries: OrderedDict[str, dict] = OrderedDict()      # user_id -> {kind: (expires_at, value, version)}
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self._clears = 0
+        self._stale = defaultdict(int)
+
+    def get(self, kind: str, user_id: str):
+        if not self.enabled:
+            return None
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            slot = self._entries.get(user_id)
+            item = slot.get(kind) if slot else None
+            if item is not None and item[0] > now and item[1] is not _INVALIDATED:
+                self._entries.move_to_end(user_id)
+                self._hits[kind] += 1
+                return item[1]
+            if item is not None and item[0] <= now:
+                del slot[kind]
+            self._misses[kind] += 1
+            return None
+
+    def put(self, kind: str, user_id: str, value, version: int | None = None):
+        """Store `value`; with a `version`, skipped when the cached one is as new or newer."""
+        if not self.enabled:
+            return
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            slot = self._entries.get(user_id)
+            if slot is None:
+                slot = self._entries[user_id] = {}
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(user_id)
+                item = slot.get(kind)
+                if version is not None and item is not None and item[0] > now \
+                        and item[2] is not None and item[2] >= version:
+                    self._stale[kind] += 1
+                    return
+            slot[kind] = (now + self.ttl_seconds, value, version)
+
+    def update(self, kind: str, user_id: str, fn):
+        """Write-through: replace a cached value with fn(value); absent entries stay absent."""
+        if not self.enabled:
+            return
+        user_id = str(user_id)
+        with self._lock:
+            slot = self._entries.get(user_id)
+            item = slot.get(kind) if slot else None
+            if item is not None and item[1] is not _INVALIDATED:
+                slot[kind] = (item[0], fn(item[1]), item[2])
+
+    def invalidate(self, user_id: str, kind: str | None = None, version: int | None = None):
+        """Drop cached state; with a `version`, puts of older versions stay rejected until ttl."""
+        if not self.enabled:
+            return
+        with self._lock:
+            slot = self._entries.get(str(user_id))
+            if kind is not None and version is not None:
+                if slot is None:
+                    slot = self._entries[str(user_id)] = {}
+                    while len(self._entries) > self.max_users:
+                        self._entries.popitem(last=False)
+                slot[kind] = (time.monotonic() + self.ttl_seconds, _INVALIDATED, version)
+                return
+            if slot is None:
+                return
+            if kind is None:
+                del self._entries[str(user_id)]
+            else:
+                slot.pop(kind, None)
+
+    def observe_epoch(self, epoch: str | None):
+        """Drop everything when the router reports a ring membership change."""
+        if not self.enabled or epoch is None or epoch == self._epoch:
+            return
+        with self._lock:
+            if self._epoch is not None:
+                self._entries.clear()
+                self._clears += 1
+            self._epoch = epoch
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = sorted(set(self._hits) | set(self._misses))
+            return {
+                "enabled": self.enabled,
+                "users": len(self._entries),
+                "epoch_clears": self._clears,
+                "kinds": {
+                    kind: {
+                        "hits": self._hits[kind],
+                        "misses": self._misses[kind],
+                        "hit_rate": round(self._hits[kind] / max(1, self._hits[kind] + self._misses[kind]), 3),
+                        "stale_puts": self._stale[kind],
+                    }
+                    for kind in kinds
+                },
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+            self._stale.clear()
+            self._clears = 0
+
+
+# ------------------------------------------------------------
+# LOCAL ROUTER (front process of `python -m app.serve --affinity`)
+# ------------------------------------------------------------
+def affinity_key(headers: dict, body: bytes) -> str | None:
+    """X-User-Id, else "user_id" of a JSON object body."""
+    key = headers.get(USER_HEADER)
+    if key:
+        return key
+    if body[:1] != b"{":
+        return None
+    try:
+        user_id = json.loads(body).get("user_id")
+    except (ValueError, AttributeError):
+        return None
+    return str(user_id) if user_id not in (None, "") else None
+
+
+class AffinityRouter:
+    """
+    ASGI reverse proxy that sends every request of a user to the same
+    worker (consistent hash of the affinity key). Requests without a key
+    are spread round-robin.
+
+    A worker that refuses connections is skipped for `down_seconds` (its
+    users fail over to their next node on the ring); each membership
+    change bumps the epoch forwarded to workers in X-Affinity-Epoch.
+    Only connection failures are retried, so a request never runs twice.
+    """
+
+    def __init__(self, upstreams: dict, vnodes: int = 160, down_seconds: float = 5.0, timeout: float = 120.0):
+        self.upstreams = dict(upstreams)            # node name -> base URL
+        self.ring = HashRing(self.upstreams, vnodes=vnodes)
+        self.down_seconds = down_seconds
+        self.timeout = timeout
+
+        self.epoch = 1
+        self._down = {}                             # node -> retry after (monotonic)
+        self._rr = itertools.count()
+        self._client = None
+
+    # ------------------------------------------------------------
+    # MEMBERSHIP
+    # ------------------------------------------------------------
+    def _excluded(self) -> set:
+        now = time.monotonic()
+        back = [node for node, until in self._down.items() if until <= now]
+        for node in back:
+            del self._down[node]
+            self.epoch += 1
+            print(f"🔁 Worker {node} back in the ring (epoch {self.epoch})")
+        return set(self._down)
+
+    def _mark_down(self, node: str, error: Exception):
+        if node not in self._down:
+            self.epoch += 1
+            print(f"⚠️ Worker {node} unreachable, failing its users over (epoch {self.epoch}):", error)
+        self._down[node] = time.monotonic() + self.down_seconds
+
+    def pick(self, key: str | None, exclude: set) -> str | None:
+        if key is not None:
+            return self.ring.node_for(key, exclude=exclude)
+        alive = [n for n in self.ring.nodes if n not in exclude]
+        return alive[next(self._rr) % len(alive)] if alive else None
+
+    # ------------------------------------------------------------
+    # ASGI
+    # ------------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        import httpx
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        key = affinity_key(headers, body)
+        forward = {k: v for k, v in headers.items() if k not in _HOP_BY_HOP}
+        path = scope["raw_path"].decode("latin-1") if scope.get("raw_path") else scope["path"]
+        if scope.get("query_string"):
+            path += "?" + scope["query_string"].decode("latin-1")
+
+        tried = set()
+        while True:
+            node = self.pick(key, self._excluded() | tried)
+            if node is None:
+                await self._respond(send, 503, b'{"detail":"No worker available"}', {})
+                return
+            forward[EPOCH_HEADER] = str(self.epoch)
+            try:
+                resp = await self._client.request(
+                    scope["method"], self.upstreams[node] + path, headers=forward, content=body,
+                )
+            except httpx.ConnectError as e:
+                # nothing was sent: safe to try the next node on the ring
+                self._mark_down(node, e)
+                tried.add(node)
+                continue
+            except httpx.HTTPError as e:
+                await self._respond(send, 502, json.dumps({"detail": f"Worker error: {e}"}).encode(), {})
+                return
+            break
+
+        out = {k: v for k, v in resp.headers.items() if k.lower() not in _HOP_BY_HOP}
+        out[NODE_HEADER] = node
+        await self._respond(send, resp.status_code, resp.content, out)
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, headers: dict):
+        raw = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        if not any(k == b"content-type" for k, _ in raw):
+            raw.append((b"content-type", b"application/json"))
+        raw.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": raw})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        import httpx
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=None, max_keepalive_connections=256),
+                )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+# Singleton instance available everywhere (enabled by USER_CACHE_ENABLED)
+user_cache = UserStateCache(
+    max_users=settings.USER_CACHE_MAX_USERS,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    enabled=settings.USER_CACHE_ENABLED,
+)
@@ -10,9 +10,78 @@ class Settings(BaseSettings):
     # --- Gemini / LLM ---
     GEMINI_API_KEY: str = Field(..., description="Google Gemini API Key")
 
+    # --- Embeddings ---
+    EMBEDDING_BACKEND: str = Field(
+        default="gemini",
+        description="gemini | hash (local CPU)"
+    )
+    EMBEDDING_FALLBACK_KEYS: str = Field(
+        default="",
+        description="Comma-separated extra Gemini API keys tried in order when the primary embed call "
+                    "fails (same model, so the same vector space); 'KEY@host' also overrides the endpoint"
+    )
+    EMBEDDING_MODEL: str = Field(
+        default="models/text-embedding-004",
+        description="Gemini embedding model"
+    )
+    EMBEDDING_DIM: int = Field(
+        default=768,
+        description="Stored vector width; below 768 the model output is reduced "
+                    "(output_dimensionality, else truncated + renormalized). "
+                    "Changing it needs new collections: see scripts/reindex_embeddings.py"
+    )
+
+    # --- Admission control for Gemini (generation + embeddings) ---
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=8,
+        description="Max concurrent Gemini generate calls per process"
+    )
+    LLM_RATE_PER_MINUTE: float = Field(
+        default=300,
+        description="Gemini generate requests per minute (match the API quota / workers)"
+    )
+    LLM_RESERVED_INTERACTIVE: int = Field(
+        default=2,
+        description="Generate slots that background / bulk work may never use"
+    )
+    EMBED_MAX_CONCURRENCY: int = Field(
+        default=16,
+        description="Max concurrent embedding calls per process"
+    )
+    EMBED_RATE_PER_MINUTE: float = Field(
+        default=1500,
+        description="Embedding requests per minute (match the API quota / workers)"
+    )
+    EMBED_RESERVED_INTERACTIVE: int = Field(
+        default=4,
+        description="Embedding slots that background / bulk work may never use"
+    )
+    SCHEDULER_QUEUE_TIMEOUT_SECONDS: float = Field(
+        default=30.0,
+        description="Max time a call may wait for admission before failing"
+    )
+
     # --- SQL DB (Supabase / Neon / Postgres etc.) ---
     DATABASE_URL: str = Field(..., description="SQLAlchemy-compatible database URL")
 
+    # --- Durable turn archive (batched background writes to DATABASE_URL) ---
+    ARCHIVE_ENABLED: bool = Field(
+        default=True,
+        description="Archive conversation turns and extracted facts in SQL"
+    )
+    ARCHIVE_BATCH_SIZE: int = Field(
+        default=500,
+        description="Rows per flush (COPY on Postgres, multi-row INSERT elsewhere)"
+    )
+    ARCHIVE_FLUSH_SECONDS: float = Field(
+        default=2.0,
+        description="Max time a queued row waits before being flushed"
+    )
+    ARCHIVE_QUEUE_SIZE: int = Field(
+        default=10000,
+        description="Rows buffered in memory; beyond this new rows are dropped"
+    )
+
     # --- Qdrant Vector Database ---
     QDRANT_URL: str = Field(
         default="http://localhost:6333",
@@ -32,6 +101,167 @@ class Settings(BaseSettings):
         description="Collection storing long-term user memory"
     )
 
+    # --- user_history partitioning (applied when the collection is created) ---
+    USER_HISTORY_SHARDS: int = Field(
+        default=1,
+        description="Shards of user_history (per shard key when USER_HISTORY_SHARD_KEYS > 0)"
+    )
+    USER_HISTORY_REPLICATION: int = Field(
+        default=1,
+        description="Replication factor of user_history shards"
+    )
+    USER_HISTORY_SHARD_KEYS: int = Field(
+        default=0,
+        description="0: automatic sharding; N: custom sharding with N shard keys, each user routed to one of them"
+    )
+    USER_HISTORY_TENANT_HNSW: bool = Field(
+        default=True,
+        description="Build per-user HNSW graphs (payload_m) instead of one global graph; every user_history search is user-filtered"
+    )
+    SHARD_MAP_REFRESH_SECONDS: float = Field(
+        default=5.0,
+        description="How often workers re-read the user → shard key map from Redis"
+    )
+
+    PREDEFINED_TOP_K: int = Field(
+        default=5,
+        description="Number of predefined-context hits retrieved per request"
+    )
+    DEFAULT_DOMAIN: str = Field(
+        default="coach",
+        description="Predefined-context partition searched when a request names none"
+    )
+
+    # --- In-process predefined snapshot (memory-mapped) ---
+    PREDEFINED_SNAPSHOT_DIR: str = Field(
+        default="snapshots/predefined",
+        description="Directory of the memory-mapped predefined snapshot ('' disables it)"
+    )
+    SNAPSHOT_CHECK_SECONDS: float = Field(
+        default=5.0,
+        description="How often workers check the snapshot manifest for a new version"
+    )
+    SNAPSHOT_HNSW_MIN_POINTS: int = Field(
+        default=50000,
+        description="Build an HNSW graph (hnswlib) instead of exact scan above this corpus size"
+    )
+
+    # --- Hybrid (lexical + dense) retrieval ---
+    HYBRID_RETRIEVAL: bool = Field(
+        default=True,
+        description="Fuse BM25 hits with dense hits using reciprocal rank fusion"
+    )
+    LEXICAL_FAST_PATH_COVERAGE: float = Field(
+        default=0.99,
+        description="Skip dense search when the top lexical hit covers this fraction of query terms"
+    )
+    LEXICAL_FAST_PATH_MIN_HITS: int = Field(
+        default=2,
+        description="Min lexical hits required before the dense search can be skipped"
+    )
+    LEXICAL_REFRESH_SECONDS: int = Field(
+        default=300,
+        description="Rebuild interval of the in-process predefined BM25 index"
+    )
+    RRF_K: int = Field(
+        default=60,
+        description="Reciprocal rank fusion constant"
+    )
+
+    # --- Batched dense retrieval ---
+    BATCHED_RETRIEVAL: bool = Field(
+        default=True,
+        description="Send predefined + user-memory searches in one round trip (false: scroll + local scoring)"
+    )
+    USER_MEMORY_TOP_K: int = Field(
+        default=5,
+        description="User summaries returned by the user-filtered memory search"
+    )
+
+    # --- Retrieval gating ---
+    RETRIEVAL_GATING: bool = Field(
+        default=True,
+        description="Skip or reuse retrieval for trivial turns and short follow-ups"
+    )
+    RETRIEVAL_CACHE_TTL_SECONDS: int = Field(
+        default=900,
+        description="Expiry of the per-user cache of the last retrieved context"
+    )
+
+    # --- Reply + fact extraction ---
+    COMBINED_FACTS_MODE: bool = Field(
+        default=False,
+        description="Return the reply and extracted user facts from one LLM call instead of a second summarization call"
+    )
+
+    # --- Duplicate request suppression (single-flight) ---
+    SINGLE_FLIGHT_ENABLED: bool = Field(
+        default=True,
+        description="Collapse concurrent identical /rag requests into one execution"
+    )
+    SINGLE_FLIGHT_WINDOW_SECONDS: int = Field(
+        default=15,
+        description="How long a finished reply is replayed to duplicates of a message sent before it was recorded"
+    )
+    IDEMPOTENCY_TTL_SECONDS: int = Field(
+        default=3600,
+        description="How long a reply is replayed for a client-supplied Idempotency-Key"
+    )
+
+    # --- User memory compaction (scripts/compact_user_history.py) ---
+    COMPACTION_SUMMARY_SIMILARITY: float = Field(
+        default=0.92,
+        description="Cosine similarity at which two summaries of a user count as duplicates"
+    )
+    HISTORY_RETENTION_DAYS: float = Field(
+        default=30,
+        description="Raw type=history points older than this are deleted"
+    )
+    INACTIVE_USER_DAYS: float = Field(
+        default=180,
+        description="Users with no chat turn and no new memory for this long are deleted entirely"
+    )
+    COMPACTION_INTERVAL_SECONDS: int = Field(
+        default=86400,
+        description="Pause between runs of the compaction worker in --loop mode"
+    )
+
+    # --- Batch answering (/rag/batch, scripts/rag_batch.py) ---
+    RAG_BATCH_MAX_ITEMS: int = Field(
+        default=100,
+        description="Maximum items accepted by one /rag/batch request"
+    )
+    RAG_BATCH_SEARCH_CONCURRENCY: int = Field(
+        default=8,
+        description="Concurrent vector searches in a batch run"
+    )
+    RAG_BATCH_LLM_CONCURRENCY: int = Field(
+        default=4,
+        description="LLM calls a batch run keeps in flight (BULK priority)"
+    )
+
+    # --- Interview Generator ---
+    INTERVIEW_QUESTION_COLLECTION: str = Field(
+        default="interview_questions",
+        description="Collection storing the precomputed, embedded question bank"
+    )
+    INTERVIEW_CACHE_COLLECTION: str = Field(
+        default="interview_sets",
+        description="Collection caching generated question sets by job-description embedding"
+    )
+    INTERVIEW_CACHE_THRESHOLD: float = Field(
+        default=0.95,
+        description="Min cosine similarity for a cached question set to be reused"
+    )
+    INTERVIEW_QUESTIONS_PER_SESSION: int = Field(
+        default=5,
+        description="Number of questions served when an interview session starts"
+    )
+    INTERVIEW_SESSION_TTL_SECONDS: int = Field(
+        default=7200,
+        description="Expiry of interview session state in Redis"
+    )
+
     # --- Redis Short-Term Memory ---
     REDIS_HOST: str = Field(
         ...,
@@ -52,6 +282,138 @@ class Settings(BaseSettings):
         description="Short-term chat memory expiry time in seconds"
     )
 
+    # --- Profiling (per-request, opt-in via X-Profile header) ---
+    PROFILING_ENABLED: bool = Field(
+        default=False,
+        description="Allow per-request profiling when the X-Profile header is sent"
+    )
+    PROFILE_DIR: str = Field(
+        default="profiles",
+        description="Directory where per-request profiles are written"
+    )
+
+    # --- Serving (python -m app.serve) ---
+    SERVE_HOST: str = Field(
+        default="0.0.0.0",
+        description="Bind address"
+    )
+    PORT: int = Field(
+        default=8000,
+        description="Bind port (Render and most PaaS inject PORT)"
+    )
+    SERVE_WORKERS: int = Field(
+        default=0,
+        description="Worker processes; 0 derives them from CPU quota and memory"
+    )
+    SERVE_MAX_WORKERS: int = Field(
+        default=8,
+        description="Upper bound for the derived worker count"
+    )
+    SERVE_WORKER_MEMORY_MB: int = Field(
+        default=400,
+        description="Expected resident memory per worker, used to derive the worker count"
+    )
+    SERVE_MAX_REQUESTS: int = Field(
+        default=5000,
+        description="Recycle a worker after this many requests (0: never)"
+    )
+    SERVE_MAX_REQUESTS_JITTER: int = Field(
+        default=500,
+        description="Random extra requests per worker so workers do not recycle together"
+    )
+    SERVE_KEEPALIVE_SECONDS: int = Field(
+        default=75,
+        description="Idle keep-alive; keep above the load balancer's idle timeout (often 60s)"
+    )
+    SERVE_BACKLOG: int = Field(
+        default=2048,
+        description="Listen backlog (pending connections during bursts / worker restarts)"
+    )
+    SERVE_GRACEFUL_TIMEOUT: int = Field(
+        default=30,
+        description="Seconds a recycled / stopping worker may finish in-flight requests"
+    )
+    SERVE_SPLIT_QUOTAS: bool = Field(
+        default=True,
+        description="Treat LLM/EMBED_RATE_PER_MINUTE as the API quota and divide it among workers"
+    )
+    WARMUP_ON_STARTUP: bool = Field(
+        default=True,
+        description="Touch Redis, Qdrant and the in-process indexes before a worker accepts traffic"
+    )
+
+    # --- User affinity (python -m app.serve --affinity) + per-user cache ---
+    SERVE_AFFINITY: bool = Field(
+        default=False,
+        description="Run a consistent-hash router in front of the workers so each user sticks to one"
+    )
+    AFFINITY_VNODES: int = Field(
+        default=160,
+        description="Virtual nodes per worker on the hash ring"
+    )
+    AFFINITY_NODE_DOWN_SECONDS: float = Field(
+        default=5.0,
+        description="How long the router skips a worker that refused a connection"
+    )
+    AFFINITY_BASE_PORT: int = Field(
+        default=0,
+        description="First loopback port for affinity workers (0: PORT + 1)"
+    )
+    USER_CACHE_ENABLED: bool = Field(
+        default=False,
+        description="In-process per-user state cache; only with affinity (local router or an LB hashing X-User-Id)"
+    )
+    USER_CACHE_MAX_USERS: int = Field(
+        default=10000,
+        description="Users kept in the per-worker state cache (LRU)"
+    )
+    USER_CACHE_TTL_SECONDS: float = Field(
+        default=300.0,
+        description="Upper bound on how long a cached user state can be served"
+    )
+
+    # --- Usage accounting (per user / stage, flushed to Redis) ---
+    USAGE_ENABLED: bool = Field(
+        default=True,
+        description="Attribute LLM tokens, embedding calls, Qdrant / Redis ops and wall time to users"
+    )
+    USAGE_TOP_K: int = Field(
+        default=1000,
+        description="Users tracked individually per worker (heavy hitters); the rest count as _other"
+    )
+    USAGE_FLUSH_SECONDS: float = Field(
+        default=10.0,
+        description="How often each worker adds its usage deltas to Redis"
+    )
+    USAGE_RETENTION_DAYS: int = Field(
+        default=35,
+        description="Expiry of the daily usage keys in Redis"
+    )
+    USAGE_PRICE_INPUT_PER_MTOK: float = Field(
+        default=0.30,
+        description="USD per 1M uncached input tokens (gemini-2.5-flash list price; set your contract rate)"
+    )
+    USAGE_PRICE_CACHED_PER_MTOK: float = Field(
+        default=0.03,
+        description="USD per 1M cached input tokens"
+    )
+    USAGE_PRICE_OUTPUT_PER_MTOK: float = Field(
+        default=2.50,
+        description="USD per 1M output tokens"
+    )
+    USAGE_PRICE_EMBED_PER_MTOK: float = Field(
+        default=0.0,
+        description="USD per 1M embedding tokens (estimated from characters; 0: not priced)"
+    )
+    USAGE_DAILY_BUDGET_USD: float = Field(
+        default=0.0,
+        description="Per-user daily cost budget; /rag answers 429 once it is spent (0: no budget)"
+    )
+    ADMIN_TOKEN: str = Field(
+        default="",
+        description="X-Admin-Token required by /metrics and /admin endpoints (empty: those endpoints answer 404)"
+    )
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
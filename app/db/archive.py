@@ -0,0 +1,202 @@
+# app/db/archive.py
+
+import io
+import csv
+import time
+import queue
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.metrics import metrics
+
+
+# Column order used by both the COPY and the INSERT path
+_COLUMNS = {
+    "conversation_turns": ("user_id", "role", "content", "created_at"),
+    "memory_facts": ("user_id", "fact", "created_at"),
+}
+
+
+class TurnArchive:
+    """
+    Durable Postgres archive of conversation turns and extracted facts.
+
+    The request path only does `queue.put_nowait` (never waits on Postgres).
+    One daemon thread drains the queue and flushes when `batch_size` rows
+    are pending or `flush_seconds` have passed:
+      - Postgres: COPY ... FROM STDIN (one round trip per table)
+      - other dialects: one multi-row INSERT per table
+
+    A full queue drops rows (counted as archive.dropped) instead of adding
+    latency; failed flushes are retried on the next cycle up to `queue_size`
+    pending rows.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_seconds: float = 2.0,
+        queue_size: int = 10000,
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._engine = None
+        self._tables = {}
+
+    # ------------------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------------------
+    def start(self) -> bool:
+        """Create tables and start the writer thread. Returns False if the DB is unusable."""
+        try:
+            from app.db.connection import engine, Base
+            from app.db.models import ConversationTurn, MemoryFact
+
+            Base.metadata.create_all(engine, tables=[ConversationTurn.__table__, MemoryFact.__table__])
+            self._engine = engine
+            self._tables = {
+                "conversation_turns": ConversationTurn.__table__,
+                "memory_facts": MemoryFact.__table__,
+            }
+        except Exception as e:
+            print("⚠️ Turn archive disabled:", e)
+            return False
+
+        self._thread = threading.Thread(target=self._run, name="turn-archive", daemon=True)
+        self._thread.start()
+        print(f"🗄 Turn archive writing to {self._engine.dialect.name} "
+              f"(batch {self.batch_size}, every {self.flush_seconds}s)")
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is queued and stop the writer (call on shutdown)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    # ------------------------------------------------------------
+    # ENQUEUE (request path)
+    # ------------------------------------------------------------
+    def _put(self, table: str, row: dict):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            metrics.incr("archive.dropped")
+
+    def add_turn(self, user_id: str, role: str, content: str):
+        self._put("conversation_turns", {
+            "user_id": str(user_id),
+            "role": role,
+            "content": content or "",
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    def add_fact(self, user_id: str, fact: str):
+        self._put("memory_facts", {
+            "user_id": str(user_id),
+            "fact": fact,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    # ------------------------------------------------------------
+    # WRITER THREAD
+    # ------------------------------------------------------------
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            timeout = max(0.0, self.flush_seconds - (time.monotonic() - last_flush))
+            try:
+                self._pending.append(self._queue.get(timeout=timeout))
+                while len(self._pending) < self.batch_size:
+                    self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if len(self._pending) >= self.batch_size or time.monotonic() - last_flush >= self.flush_seconds:
+                self._flush()
+                last_flush = time.monotonic()
+
+        # drain on shutdown
+        while True:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        rows, self._pending = self._pending, []
+        by_table = {}
+        for table, row in rows:
+            by_table.setdefault(table, []).append(row)
+
+        try:
+            with metrics.timed("archive.flush"):
+                if self._engine.dialect.name == "postgresql":
+                    self._copy(by_table)
+                else:
+                    self._insert(by_table)
+            metrics.incr("archive.rows", len(rows))
+            metrics.record("archive.batch_rows", len(rows))
+        except Exception as e:
+            print("❌ Turn archive flush failed:", e)
+            metrics.incr("archive.flush_errors")
+            keep = rows[-self.queue_size:]
+            metrics.incr("archive.dropped", len(rows) - len(keep))
+            self._pending = keep + self._pending
+            self._stop.wait(self.flush_seconds)     # back off while the DB is down
+
+    def _insert(self, by_table: dict):
+        with self._engine.begin() as conn:
+            for table, rows in by_table.items():
+                conn.execute(insert(self._tables[table]), rows)
+
+    def _copy(self, by_table: dict):
+        raw = self._engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            for table, rows in by_table.items():
+                cols = _COLUMNS[table]
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for row in rows:
+                    writer.writerow([
+                        row[c].isoformat() if isinstance(row[c], datetime) else row[c]
+                        for c in cols
+                    ])
+                buf.seek(0)
+                cur.copy_expert(f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv)", buf)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+
+def create_turn_archive() -> TurnArchive | None:
+    """Started archive, or None when disabled / the database is unreachable."""
+    if not settings.ARCHIVE_ENABLED:
+        return None
+
+    archive = TurnArchive(
+        batch_size=settings.ARCHIVE_BATCH_SIZE,
+        flush_seconds=settings.ARCHIVE_FLUSH_SECONDS,
+        queue_size=settings.ARCHIVE_QUEUE_SIZE,
+    )
+    return archive if archive.start() else None
@@ -0,0 +1,40 @@
+# app/db/models.py
+
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Index
+from app.db.connection import Base
+
+
+# ---------------------------------------------------
+# Durable conversation archive
+# ---------------------------------------------------
+# Rows are append-only and written in batches by app.db.archive.TurnArchive.
+# (user_id, created_at) indexes serve per-user time-range reads and exports
+# without touching Redis or Qdrant.
+
+class ConversationTurn(Base):
+    __tablename__ = "conversation_turns"
+
+    # Integer variant lets SQLite (local runs) autoincrement the key
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(String(128), nullable=False)
+    role = Column(String(16), nullable=False)          # "user" | "assistant"
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_conversation_turns_user_created", "user_id", "created_at"),
+        Index("ix_conversation_turns_created", "created_at"),
+    )
+
+
+class MemoryFact(Base):
+    __tablename__ = "memory_facts"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(String(128), nullable=False)
+    fact = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_memory_facts_user_created", "user_id", "created_at"),
+    )
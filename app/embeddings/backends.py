@@ -0,0 +1,227 @@
+# app/embeddings/backends.py
+
+import re
+import zlib
+from typing import List, Protocol, runtime_checkable
+
+import numpy as np
+import google.generativeai as genai
+
+from app.config import settings
+from app.llm.scheduler import embed_scheduler, Priority, is_quota_error
+
+
+# Width text-embedding-004 returns when no output_dimensionality is requested
+NATIVE_DIM = 768
+
+
+class EmbeddingError(Exception):
+    """A backend could not produce vectors for a batch."""
+
+
+def fit_dimension(vector, dim: int) -> list:
+    """
+    Truncate a vector to `dim` and renormalize it (Matryoshka-style prefix).
+    Vectors already at or below `dim` are returned unchanged.
+    """
+    if vector is None or len(vector) <= dim:
+        return list(vector or [])
+    v = np.asarray(vector[:dim], dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return (v / norm).tolist() if norm > 0 else v.tolist()
+
+
+@runtime_checkable
+class EmbeddingBackend(Protocol):
+    """
+    One vector space. `identity` ("<model>@<dim>") is stamped on stored
+    points and snapshots so vectors from different spaces never mix.
+    `embed` returns one vector per text or raises EmbeddingError.
+    """
+    model: str
+    dim: int
+
+    @property
+    def identity(self) -> str: ...
+
+    def embed(self, texts: List[str], priority: Priority = Priority.INTERACTIVE,
+              user_id: str | None = None) -> List[List[float]]: ...
+
+
+class _IdentityMixin:
+    @property
+    def identity(self) -> str:
+        return f"{self.model}@{self.dim}"
+
+
+# ------------------------------------------------------------
+# GEMINI (remote, admission-controlled)
+# ------------------------------------------------------------
+class GeminiBackend(_IdentityMixin):
+    """
+    `api_key` / `endpoint` give this backend its own API client (a fallback
+    key or region); by default the process-wide genai configuration is used.
+    `report_quota` pauses the shared embed bucket on quota errors — off for
+    members of a fallback chain that are not the last resort.
+    """
+
+    def __init__(self, model: str = "models/text-embedding-004", dim: int = NATIVE_DIM,
+                 api_key: str | None = None, endpoint: str | None = None, report_quota: bool = True):
+        self.model = model
+        self.dim = dim
+        self.report_quota = report_quota
+        self._client = None
+        if api_key is None and endpoint is None:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+        else:
+            from google.ai import generativelanguage as glm
+
+            options = {"api_key": api_key or settings.GEMINI_API_KEY}
+            if endpoint:
+                options["api_endpoint"] = endpoint
+            self._client = glm.GenerativeServiceClient(client_options=options)
+
+    def _request_kwargs(self) -> dict:
+        # Ask the API for the reduced width; fit_dimension() still guards the result
+        kwargs = {"output_dimensionality": self.dim} if self.dim < NATIVE_DIM else {}
+        if self._client is not None:
+            kwargs["client"] = self._client
+        return kwargs
+
+    def embed(self, texts, priority=Priority.INTERACTIVE, user_id=None):
+        try:
+            with embed_scheduler.slot(priority, user_id):
+                resp = genai.embed_content(
+                    model=self.model,
+                    content=list(texts),
+                    task_type="retrieval_document",
+                    **self._request_kwargs()
+                )
+        except Exception as e:
+            if self.report_quota and is_quota_error(e):
+                embed_scheduler.report_quota_error()
+            raise EmbeddingError(str(e)) from e
+
+        # FIX: Gemini returns {"embedding": [[...vector...], ...]} for list content
+        vectors = resp.get("embedding", [])
+        if len(vectors) != len(texts) or any(not v for v in vectors):
+            raise EmbeddingError(f"expected {len(texts)} vectors, got {len(vectors)}")
+        return [fit_dimension(v, self.dim) for v in vectors]
+
+
+# ------------------------------------------------------------
+# LOCAL HASHING (in-process CPU, deterministic, no network)
+# ------------------------------------------------------------
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9.+#-]*")
+
+
+class HashingBackend(_IdentityMixin):
+    """
+    Signed feature hashing of word unigrams + bigrams into `dim` buckets.
+
+    Lexical rather than semantic, but free, deterministic and fast: meant
+    for tests, benchmarks and deployments that must embed in-process.
+    A whole batch is accumulated with one np.add.at and normalized at once.
+    """
+
+    DEFAULT_MODEL = "local-hash-v1"
+
+    def __init__(self, dim: int = NATIVE_DIM, model: str = DEFAULT_MODEL):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts, priority=Priority.INTERACTIVE, user_id=None):
+        rows, cols, signs = [], [], []
+        for i, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall((text or "").lower())
+            for feat in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                h = zlib.crc32(feat.encode("utf-8"))
+                rows.append(i)
+                cols.append(h % self.dim)
+                signs.append(1.0 if (h >> 31) & 1 else -1.0)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+
+        norms = np.linalg.norm(matrix, axis=1)
+        empty = norms == 0.0
+        matrix[empty, 0] = 1.0          # never hand out a zero vector
+        norms[empty] = 1.0
+        return (matrix / norms[:, None]).tolist()
+
+
+# ------------------------------------------------------------
+# FALLBACK CHAIN
+# ------------------------------------------------------------
+class FallbackBackend(_IdentityMixin):
+    """
+    Try backends in order. Members must share one vector space (same
+    identity: the same model behind different keys / regions, see
+    EMBEDDING_FALLBACK_KEYS), so a fallback answer is still comparable with
+    stored vectors. Mixing spaces is rejected up front.
+    """
+
+    def __init__(self, backends: List[EmbeddingBackend]):
+        if not backends:
+            raise ValueError("FallbackBackend needs at least one backend")
+        identities = {b.identity for b in backends}
+        if len(identities) > 1:
+            raise ValueError(f"Fallback chain mixes vector spaces: {sorted(identities)}")
+
+        self.backends = backends
+        self.model = backends[0].model
+        self.dim = backends[0].dim
+
+    def embed(self, texts, priority=Priority.INTERACTIVE, user_id=None):
+        errors = []
+        for backend in self.backends:
+            try:
+                return backend.embed(texts, priority=priority, user_id=user_id)
+            except EmbeddingError as e:
+                errors.append(f"{type(backend).__name__}: {e}")
+        raise EmbeddingError("; ".join(errors))
+
+
+# name -> model stamped in the identity
+_MODELS = {
+    "gemini": lambda: settings.EMBEDDING_MODEL,
+    "hash": lambda: HashingBackend.DEFAULT_MODEL,
+}
+
+
+def _backend_name(spec: str | None) -> str:
+    name = (spec or settings.EMBEDDING_BACKEND).strip().lower()
+    if name not in _MODELS:
+        hint = "; fallbacks are extra keys of the same model (EMBEDDING_FALLBACK_KEYS)" if "," in name else ""
+        raise ValueError(f"Unknown embedding backend {name!r}; choose from {sorted(_MODELS)}{hint}")
+    return name
+
+
+def backend_identity(spec: str | None = None, dim: int | None = None) -> str:
+    """Identity create_backend(spec, dim) reports, without building it (no API client setup)."""
+    return f"{_MODELS[_backend_name(spec)]()}@{dim or settings.EMBEDDING_DIM}"
+
+
+def _gemini_chain(dim: int) -> EmbeddingBackend:
+    extras = [k.strip() for k in settings.EMBEDDING_FALLBACK_KEYS.split(",") if k.strip()]
+    primary = GeminiBackend(model=settings.EMBEDDING_MODEL, dim=dim, report_quota=not extras)
+    if not extras:
+        return primary
+
+    backends = [primary]
+    for i, entry in enumerate(extras):
+        key, _, endpoint = entry.partition("@")
+        backends.append(GeminiBackend(
+            model=settings.EMBEDDING_MODEL, dim=dim, api_key=key, endpoint=endpoint or None,
+            report_quota=i == len(extras) - 1,
+        ))
+    return FallbackBackend(backends)
+
+
+def create_backend(spec: str | None = None, dim: int | None = None) -> EmbeddingBackend:
+    """Build the backend named by EMBEDDING_BACKEND ("gemini" + EMBEDDING_FALLBACK_KEYS, or "hash")."""
+    dim = dim or settings.EMBEDDING_DIM
+    if _backend_name(spec) == "hash":
+        return HashingBackend(dim=dim)
+    return _gemini_chain(dim)
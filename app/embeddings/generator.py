@@ -1,39 +1,89 @@
 # app/embeddings/generator.py
 
-import google.generativeai as genai
 from app.config import settings
-
-
-# Configure Gemini globally
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from app.metrics import metrics
+from app.usage import usage
+from app.llm.scheduler import Priority
+from app.embeddings.backends import (
+    EmbeddingBackend,
+    EmbeddingError,
+    GeminiBackend,
+    create_backend,
+)
 
 
 class EmbeddingGenerator:
     """
-    Wrapper for Google's embedding model.
-    Produces vector embeddings for search + memory systems.
+    Produces vector embeddings for search + memory systems through a
+    pluggable backend (EMBEDDING_BACKEND: gemini | hash; EMBEDDING_FALLBACK_KEYS for Gemini).
+
+    Failures never produce a partial vector: callers get [] and must skip
+    the write / dense search (every caller checks `if not vector`).
     """
 
-    def __init__(self, model: str = "models/text-embedding-004"):
-        self.model = model
+    def __init__(self, model: str | None = None, dim: int | None = None, backend: EmbeddingBackend | None = None):
+        if backend is None:
+            backend = GeminiBackend(model=model, dim=dim or settings.EMBEDDING_DIM) if model \
+                else create_backend(dim=dim)
+        self.backend = backend
+        self.model = backend.model
+        self.dim = backend.dim
+
+    @property
+    def identity(self) -> str:
+        """"<model>@<dim>" recorded on stored points and snapshots."""
+        return self.backend.identity
+
+    @staticmethod
+    def _account(texts: list, user_id: str | None):
+        """One backend call: process counters + per-user usage (tokens estimated at ~4 chars)."""
+        metrics.incr("embed.calls")
+        metrics.incr("embed.texts", len(texts))
+        usage.add(
+            user_id=user_id,
+            embed_calls=1,
+            embed_texts=len(texts),
+            embed_tokens=sum((len(t) + 3) // 4 for t in texts),
+        )
 
-    def create_embedding(self, text: str):
+    def create_embedding(self, text: str, priority: Priority = Priority.INTERACTIVE, user_id: str | None = None):
         """
         Generate an embedding vector from text.
-        Returns [] if invalid text or API error.
+        Returns [] if invalid text or backend error.
         """
         if not text or not text.strip():
             return []
 
+        self._account([text], user_id)
         try:
-            resp = genai.embed_content(
-                model=self.model,
-                content=text,
-                task_type="retrieval_document"
-            )
-        except Exception as e:
+            return self.backend.embed([text], priority=priority, user_id=user_id)[0]
+        except EmbeddingError as e:
             print(f"[Embedding ERROR] {e}")
             return []
 
-        # FIX: Gemini returns {"embedding": [...vector...]}
-        return resp.get("embedding", [])
+    def create_embeddings(
+        self,
+        texts: list,
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: str | None = None,
+        batch_size: int = 100,
+    ) -> list:
+        """
+        Embed many texts with one backend call per `batch_size` texts.
+        Result is aligned with `texts`; blank inputs and failed batches yield [].
+        """
+        out = [[] for _ in texts]
+        todo = [(i, t) for i, t in enumerate(texts) if t and t.strip()]
+
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            self._account([t for _, t in batch], user_id)
+            try:
+                vectors = self.backend.embed([t for _, t in batch], priority=priority, user_id=user_id)
+            except EmbeddingError as e:
+                print(f"[Embedding ERROR] {e}")
+                continue
+            for (i, _), vec in zip(batch, vectors):
+                out[i] = vec
+
+        return out
@@ -0,0 +1,184 @@
+# app/interview/interview_service.py
+
+import json
+import uuid
+from typing import List, Dict
+
+from app.config import settings
+from app.metrics import metrics
+from app.schemas import InterviewStartRequest, InterviewStartResponse, InterviewQuestion
+from app.vector_db.orm import VectorORM
+from app.vector_db.chat_memory import create_redis_client
+from app.embeddings.generator import EmbeddingGenerator
+from app.llm.gemini_client import GeminiClient
+from app.rag.prompt_builder import PromptBuilder
+from app.interview.question_bank import (
+    QuestionBank,
+    CACHE_INDEX_FIELDS,
+    split_job_description,
+    normalize_difficulty,
+    normalize_skill,
+    experience_level,
+)
+
+
+class InterviewService:
+    """
+    Starts text interview sessions.
+
+    Serving path:
+      1) normalize + embed the job description
+      2) reuse a cached question set for a near-identical JD (cosine >= threshold)
+      3) otherwise: filtered vector lookup in the question bank
+         + one light LLM call that personalizes the picked questions
+      4) cache the generated set, store the session in Redis
+    """
+
+    def __init__(self, db: VectorORM | None = None, redis_client=None):
+        self.db = db or VectorORM()
+        self.bank = QuestionBank(self.db)
+        self.embed = EmbeddingGenerator()
+        self.llm = GeminiClient()
+        self.r = redis_client or create_redis_client()
+
+        self.cache_collection = settings.INTERVIEW_CACHE_COLLECTION
+        self.db._ensure_collection(self.cache_collection)
+        self.db._ensure_payload_index(self.cache_collection, CACHE_INDEX_FIELDS)
+
+    # ------------------------------------------------------------
+    # CACHE KEY
+    # ------------------------------------------------------------
+    @staticmethod
+    def normalized_jd(role: str, job_description: str) -> str:
+        """Order/case/whitespace-insensitive representation of a JD."""
+        return f"{normalize_skill(role)} | {', '.join(split_job_description(job_description))}"
+
+    def _cache_scope(self, req: InterviewStartRequest) -> dict:
+        return {
+            "role": normalize_skill(req.role),
+            "difficulty": normalize_difficulty(req.difficulty),
+            "level": experience_level(req.experience),
+        }
+
+    def _cache_get(self, embedding, scope: dict) -> List[Dict] | None:
+        try:
+            hits = self.db.query(self.cache_collection, embedding, limit=1, where=scope)
+        except Exception as e:
+            print("⚠️ Interview cache lookup failed:", e)
+            return None
+
+        if hits and hits[0]["score"] >= settings.INTERVIEW_CACHE_THRESHOLD:
+            try:
+                return json.loads(hits[0]["metadata"].get("questions", "[]"))
+            except Exception:
+                return None
+        return None
+
+    def _cache_put(self, key_text: str, embedding, scope: dict, questions: List[Dict]):
+        try:
+            self.db.insert_many(self.cache_collection, [{
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{key_text}|{scope['difficulty']}|{scope['level']}")),
+                "text": key_text,
+                "embedding": embedding,
+                "metadata": {**scope, "questions": json.dumps(questions)},
+            }])
+        except Exception as e:
+            print("⚠️ Interview cache write failed:", e)
+
+    # ------------------------------------------------------------
+    # SELECTION + PERSONALIZATION
+    # ------------------------------------------------------------
+    @staticmethod
+    def _pick(candidates: List[Dict], n: int, per_skill: int = 2) -> List[Dict]:
+        """Take the best-scoring questions while spreading them across skills."""
+        picked, per = [], {}
+        for c in candidates:
+            if per.get(c["skill"], 0) >= per_skill:
+                continue
+            picked.append(c)
+            per[c["skill"]] = per.get(c["skill"], 0) + 1
+            if len(picked) >= n:
+                return picked
+
+        # not enough distinct skills: fill with the remaining best ones
+        for c in candidates:
+            if len(picked) >= n:
+                break
+            if c not in picked:
+                picked.append(c)
+        return picked
+
+    def _personalize(self, req: InterviewStartRequest, picked: List[Dict]) -> List[Dict]:
+        prompt = PromptBuilder.build_interview_prompt(
+            role=req.role,
+            experience=req.experience,
+            job_description=req.job_description,
+            questions=picked,
+        )
+
+        try:
+            with metrics.timed("interview.personalize"):
+                out = self.llm.extract_text(self.llm.generate_raw(prompt, max_output_tokens=768, user_id=req.user_id))
+            start, end = out.find("["), out.rfind("]")
+            rewritten = json.loads(out[start:end + 1]) if start != -1 and end > start else []
+        except Exception as e:
+            print("⚠️ Interview personalization failed, serving bank questions:", e)
+            rewritten = []
+
+        if len(rewritten) != len(picked):
+            return picked
+
+        return [
+            {**q, "question": str(text).strip() or q["question"]}
+            for q, text in zip(picked, rewritten)
+        ]
+
+    # ------------------------------------------------------------
+    # SESSION START
+    # ------------------------------------------------------------
+    def start(self, req: InterviewStartRequest) -> InterviewStartResponse:
+        n = settings.INTERVIEW_QUESTIONS_PER_SESSION
+        scope = self._cache_scope(req)
+        key_text = self.normalized_jd(req.role, req.job_description)
+
+        with metrics.timed("interview.embed"):
+            emb = self.embed.create_embedding(key_text, user_id=req.user_id)
+
+        with metrics.timed("interview.cache_lookup"):
+            questions = self._cache_get(emb, scope) if emb else None
+
+        cached = questions is not None
+        metrics.incr("interview.cache_hit" if cached else "interview.cache_miss")
+
+        if not cached:
+            with metrics.timed("interview.bank_lookup"):
+                candidates = self.bank.lookup(
+                    emb,
+                    difficulty=scope["difficulty"],
+                    skills=split_job_description(req.job_description),
+                    limit=n * 3,
+                ) if emb else []
+
+            questions = self._personalize(req, self._pick(candidates, n)) if candidates else []
+            questions = [
+                {"question": q["question"], "skill": q["skill"], "difficulty": q["difficulty"]}
+                for q in questions
+            ]
+            if questions and emb:
+                self._cache_put(key_text, emb, scope, questions)
+
+        session_id = str(uuid.uuid4())
+        try:
+            self.r.set(
+                f"interview_session:{session_id}",
+                json.dumps({"user_id": req.user_id, **scope, "questions": questions, "index": 0}),
+                ex=settings.INTERVIEW_SESSION_TTL_SECONDS,
+            )
+        except Exception as e:
+            print("❌ Redis write failed:", e)
+
+        return InterviewStartResponse(
+            session_id=session_id,
+            questions=[InterviewQuestion(**q) for q in questions],
+            cached=cached,
+        )
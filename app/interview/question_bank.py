@@ -0,0 +1,104 @@
+# app/interview/question_bank.py
+
+import re
+import uuid
+from typing import List, Dict
+
+from app.config import settings
+from app.vector_db.orm import VectorORM
+
+
+QUESTION_INDEX_FIELDS = ("skill", "difficulty", "role")
+CACHE_INDEX_FIELDS = ("role", "difficulty", "level")
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+# ------------------------- UTIL -------------------------
+
+def normalize_skill(skill: str) -> str:
+    """'Node.js ' -> 'node.js', 'REST  APIs' -> 'rest apis'."""
+    return " ".join((skill or "").lower().split())
+
+
+def split_job_description(job_description: str) -> List[str]:
+    """Split a JD / skills list into normalized, de-duplicated, sorted items."""
+    items = re.split(r"[,;/|\n]+|\band\b", (job_description or "").lower())
+    return sorted({normalize_skill(i) for i in items if normalize_skill(i)})
+
+
+def normalize_difficulty(difficulty: str) -> str:
+    d = (difficulty or "medium").strip().lower()
+    return d if d in DIFFICULTIES else "medium"
+
+
+def experience_level(years: int) -> str:
+    if years < 2:
+        return "junior"
+    if years < 5:
+        return "mid"
+    return "senior"
+
+
+# ----------------------- QUESTION BANK ------------------------
+
+class QuestionBank:
+    """
+    Offline-generated, embedded interview questions in Qdrant.
+    Points are indexed by skill, difficulty and role so a session start
+    is a single filtered vector lookup.
+    """
+
+    def __init__(self, db: VectorORM | None = None):
+        self.db = db or VectorORM()
+        self.collection = settings.INTERVIEW_QUESTION_COLLECTION
+
+        self.db._ensure_collection(self.collection)
+        self.db._ensure_payload_index(self.collection, QUESTION_INDEX_FIELDS)
+
+    @staticmethod
+    def question_id(skill: str, difficulty: str, question: str) -> str:
+        """Stable id so re-running the offline build is idempotent."""
+        key = f"{normalize_skill(skill)}|{difficulty}|{' '.join(question.lower().split())}"
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+    def add_questions(self, items: List[Dict]):
+        """items: {"question", "skill", "difficulty", "roles", "embedding"}"""
+        self.db.insert_many(
+            self.collection,
+            (
+                {
+                    "id": self.question_id(i["skill"], i["difficulty"], i["question"]),
+                    "text": i["question"],
+                    "embedding": i["embedding"],
+                    "metadata": {
+                        "skill": normalize_skill(i["skill"]),
+                        "difficulty": normalize_difficulty(i["difficulty"]),
+                        "role": [normalize_skill(r) for r in (i.get("roles") or ["general"])],
+                    },
+                }
+                for i in items
+            ),
+        )
+
+    def lookup(self, embedding, difficulty: str, skills: List[str] | None = None, limit: int = 15) -> List[Dict]:
+        """Nearest questions for a JD embedding, restricted to difficulty (+ skills)."""
+        where = {"difficulty": normalize_difficulty(difficulty)}
+        if skills:
+            where["skill"] = [normalize_skill(s) for s in skills]
+
+        hits = self.db.query(self.collection, embedding, limit=limit, where=where)
+
+        # Not enough skill matches -> widen to the whole difficulty partition
+        if skills and len(hits) < limit // 3:
+            hits = self.db.query(self.collection, embedding, limit=limit, where={"difficulty": where["difficulty"]})
+
+        return [
+            {
+                "question": h["text"],
+                "skill": h["metadata"].get("skill", "general"),
+                "difficulty": h["metadata"].get("difficulty", where["difficulty"]),
+                "score": h["score"],
+            }
+            for h in hits
+        ]
@@ -1,16 +1,25 @@
 # app/llm/gemini_client.py
 
+import re
 import time
 import json
 import google.generativeai as genai
-from google.api_core.exceptions import ServiceUnavailable
+from google.api_core.exceptions import ServiceUnavailable, ResourceExhausted
 
 from app.config import settings
+from app.metrics import metrics
+from app.usage import usage
+from app.llm.scheduler import llm_scheduler, Priority, SchedulerTimeout, is_quota_error
+from app.rag.prompt_builder import PromptParts
 
 
 # Configure API key once
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+# Combined-mode output that is (broken) JSON rather than plain text
+_JSON_START = re.compile(r'^\s*(?:```(?:json)?\s*)?\{')
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+
 
 class GeminiClient:
     """
@@ -18,8 +27,12 @@ class GeminiClient:
 
     Exposes:
       - generate_raw(prompt)
+      - generate_reply_with_facts(prompt)
       - extract_text(response)
+      - join_parts(parts)
       - summarize_to_facts(text)
+      - parse_facts(output)
+      - summarize_conversation(previous_summary, turns)
     """
 
     MODEL_NAME = "models/gemini-2.5-flash"
@@ -28,35 +41,71 @@ class GeminiClient:
         print(f"🧠 Using Gemini Model: {self.MODEL_NAME}")
         self.model = genai.GenerativeModel(self.MODEL_NAME)
 
+        # Flipped off if the API rejects response_mime_type (JSON mode)
+        self.json_mode = True
+
     # ------------------------------------------------------------
     # RAW GENERATION (with retries)
     # ------------------------------------------------------------
-    def generate_raw(self, prompt: str, max_output_tokens: int = 1024):
+    def generate_raw(
+        self,
+        prompt: str | PromptParts,
+        max_output_tokens: int = 1024,
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: str | None = None,
+        response_mime_type: str | None = None,
+        purpose: str = "reply",
+    ):
+        """
+        Admission-controlled generation: every attempt waits for a slot in
+        the shared llm_scheduler (priority class + per-user fairness + quota).
+
+        Latency and token usage are exported per `purpose` (llm.<purpose>,
+        llm.<purpose>.input_tokens / output_tokens) to compare call modes.
+        A PromptParts prompt is sent joined (PromptParts.full).
+        """
         last_exc = None
+        generation_config = {
+            "temperature": 0.6,
+            "max_output_tokens": max_output_tokens,
+        }
+        if response_mime_type:
+            generation_config["response_mime_type"] = response_mime_type
+
+        contents = prompt.full if isinstance(prompt, PromptParts) else prompt
 
         for attempt in range(3):
             try:
                 print("\n================ LLM PROMPT ================")
-                print(prompt)
+                print(contents)
                 print("============================================\n")
 
                 print(f"🧠 Gemini call attempt {attempt + 1}")
 
-                resp = self.model.generate_content(
-                    prompt,
-                    generation_config={
-                        "temperature": 0.6,
-                        "max_output_tokens": max_output_tokens,
-                    }
-                )
+                with llm_scheduler.slot(priority, user_id), metrics.timed(f"llm.{purpose}"):
+                    resp = self.model.generate_content(
+                        contents,
+                        generation_config=generation_config
+                    )
 
                 print("🔍 RAW GEMINI RESPONSE:", resp)
+                self._record_usage(purpose, resp, user_id)
                 return resp
 
+            except SchedulerTimeout:
+                raise
+
             except Exception as e:
                 last_exc = e
                 msg = str(e).lower()
 
+                # Quota exhausted: pause the shared bucket, then retry
+                if isinstance(e, ResourceExhausted) or is_quota_error(e):
+                    wait = (attempt + 1) * 5
+                    llm_scheduler.report_quota_error(wait)
+                    print(f"⚠️ Gemini quota exhausted. Backing off {wait}s...")
+                    continue
+
                 # Retry only if model overloaded
                 if "overloaded" in msg or "503" in msg or isinstance(e, ServiceUnavailable):
                     wait = (attempt + 1) * 2
@@ -69,6 +118,143 @@ class GeminiClient:
 
         raise Exception(f"[LLM ERROR] All attempts failed — last error: {last_exc}")
 
+    @staticmethod
+    def _record_usage(purpose: str, resp, user_id: str | None = None):
+        """Per-purpose distributions + per-user / stage accounting (app.usage)."""
+        meta = getattr(resp, "usage_metadata", None)
+        metrics.incr(f"llm.{purpose}.calls")
+        tokens = {
+            "input_tokens": getattr(meta, "prompt_token_count", 0) or 0,
+            "output_tokens": getattr(meta, "candidates_token_count", 0) or 0,
+            "cached_tokens": getattr(meta, "cached_content_token_count", 0) or 0,
+        }
+        usage.add(user_id=user_id, llm_calls=1, **tokens)
+        if meta is None:
+            return
+        for name, value in tokens.items():
+            metrics.record(f"llm.{purpose}.{name}", value)
+
+    # ------------------------------------------------------------
+    # COMBINED MODE: reply + user facts in one call
+    # ------------------------------------------------------------
+    def generate_reply_with_facts(
+        self,
+        prompt: str | PromptParts,
+        max_facts: int = 6,
+        max_output_tokens: int = 1280,
+        user_id: str | None = None,
+    ):
+        """
+        One generation returning the coach reply and the user facts it
+        revealed, as {"reply": str, "facts": [str]} (JSON mode when the API
+        supports it). Returns (resp, reply, facts); facts is None when the
+        output could not be parsed, so callers can fall back to
+        summarize_to_facts. The reply is then recovered from the broken JSON
+        (e.g. cut at max_output_tokens) or, if none is readable, comes from
+        one plain generate_raw call.
+        """
+        instructions = f"""
+
+Return STRICT JSON only, no markdown: {{"reply": "<your reply to the user>", "facts": ["fact1", ...]}}
+- "reply": your full answer, exactly as you would write it to the user
+- "facts": up to {max_facts} short durable facts about the USER from their new message
+  (goals, skills, constraints, preferences); [] if there are none
+"""
+        # Instructions go in the per-request part so the prefix is the same as for plain replies
+        if isinstance(prompt, PromptParts):
+            combined = prompt._replace(suffix=prompt.suffix + instructions)
+        else:
+            combined = prompt + instructions
+        try:
+            resp = self.generate_raw(
+                combined,
+                max_output_tokens=max_output_tokens,
+                user_id=user_id,
+                response_mime_type="application/json" if self.json_mode else None,
+                purpose="reply_facts",
+            )
+        except SchedulerTimeout:
+            raise
+        except Exception as e:
+            if not (self.json_mode and "mime" in str(e).lower()):
+                raise
+            print("⚠️ JSON mode rejected, retrying with prompt-only JSON:", e)
+            self.json_mode = False
+            resp = self.generate_raw(combined, max_output_tokens=max_output_tokens, user_id=user_id,
+                                     purpose="reply_facts")
+
+        out = self.extract_text(resp)
+        reply, facts = self.parse_reply_with_facts(out, max_facts)
+        if facts is not None:
+            metrics.incr("llm.reply_facts.parsed")
+            return resp, reply, facts
+
+        truncated = self.finish_reason(resp) == "MAX_TOKENS"
+        metrics.incr("llm.reply_facts.truncated" if truncated else "llm.reply_facts.unparsed")
+        if out and not reply:
+            # Nothing readable to show: ask again for a plain reply (never surface raw JSON)
+            print("⚠️ Combined reply unreadable" + (" (hit max_output_tokens)" if truncated else "")
+                  + ", falling back to a plain reply")
+            resp = self.generate_raw(prompt, max_output_tokens=max_output_tokens, user_id=user_id)
+            reply = self.extract_text(resp)
+        return resp, reply, None
+
+    @staticmethod
+    def parse_reply_with_facts(out: str, max_facts: int = 6):
+        """
+        (reply, facts) from combined-mode output. facts is None when it is not
+        the expected JSON; reply is then the "reply" string recovered from the
+        broken JSON (e.g. cut at max_output_tokens), the text itself if it is
+        not JSON at all, or "" — never the raw JSON.
+        """
+        text = (out or "").strip()
+        start, end = text.find("{"), text.rfind("}")
+        if start != -1 and end > start:
+            try:
+                obj = json.loads(text[start:end + 1])
+                reply = obj.get("reply") if isinstance(obj, dict) else None
+                if isinstance(reply, str) and reply.strip():
+                    facts = obj.get("facts") or []
+                    facts = [str(f).strip() for f in facts if isinstance(f, str) and f.strip()] \
+                        if isinstance(facts, list) else []
+                    return reply.strip(), facts[:max_facts]
+            except Exception:
+                pass
+        if not (_JSON_START.match(text) or _REPLY_KEY.search(text)):
+            return text, None
+        return GeminiClient._partial_reply(text), None
+
+    @staticmethod
+    def _partial_reply(text: str) -> str:
+        """The (possibly unterminated) "reply" JSON string in `text`, decoded; "" if there is none."""
+        m = _REPLY_KEY.search(text)
+        if not m:
+            return ""
+        body, i, escape = text[m.end():], 0, 0
+        while i < len(body) and body[i] != '"':
+            if body[i] == "\\":
+                escape, i = i, i + (6 if body[i + 1:i + 2] == "u" else 2)
+            else:
+                i += 1
+        # an escape cut in half ("\" or "\u00") is dropped
+        body = body[:escape] if i > len(body) else body[:i]
+        try:
+            reply = json.loads(f'"{body}"', strict=False)
+        except ValueError:
+            return ""
+        if reply and "\ud800" <= reply[-1] <= "\udbff":     # half of a surrogate pair
+            reply = reply[:-1]
+        return reply.strip()
+
+    @staticmethod
+    def finish_reason(resp) -> str:
+        """Name of the first candidate's finish reason ("STOP", "MAX_TOKENS", ...); "" if unknown."""
+        try:
+            reason = resp.candidates[0].finish_reason
+        except Exception:
+            return ""
+        return getattr(reason, "name", str(reason or ""))
+
     # ------------------------------------------------------------
     # SAFE TEXT EXTRACTION
     # ------------------------------------------------------------
@@ -81,20 +267,23 @@ class GeminiClient:
             if not parts:
                 return ""
 
-            text = "".join(
-                part.text for part in parts
-                if hasattr(part, "text") and part.text
-            ).strip()
-
-            return text
+            return self.join_parts(parts)
 
         except Exception:
             return ""
 
+    @staticmethod
+    def join_parts(parts) -> str:
+        """Concatenate the text of candidate parts (hot path on every reply)."""
+        return "".join(
+            part.text for part in parts
+            if hasattr(part, "text") and part.text
+        ).strip()
+
     # ------------------------------------------------------------
     # SUMMARIZE TO SHORT FACTS (for long-term memory)
     # ------------------------------------------------------------
-    def summarize_to_facts(self, text: str, max_facts: int = 8):
+    def summarize_to_facts(self, text: str, max_facts: int = 8, user_id: str | None = None):
         if not text or len(text.strip()) < 10:
             return []
 
@@ -112,12 +301,18 @@ Text:
 \"\"\"{text}\"\"\"
 """
 
-        resp = self.generate_raw(prompt, max_output_tokens=512)
+        resp = self.generate_raw(prompt, max_output_tokens=512, priority=Priority.BACKGROUND, user_id=user_id,
+                                 purpose="facts")
         out = self.extract_text(resp)
 
         if not out:
             return []
 
+        return self.parse_facts(out, max_facts)
+
+    @staticmethod
+    def parse_facts(out: str, max_facts: int = 8):
+        """Parse model output as a JSON list, falling back to bullets/lines."""
         # Attempt strict JSON parse
         try:
             if out.strip().startswith("["):
@@ -137,3 +332,39 @@ Text:
                 break
 
         return facts[:max_facts]
+
+    # ------------------------------------------------------------
+    # ROLLING SUMMARY OF EVICTED TURNS (short-term memory)
+    # ------------------------------------------------------------
+    def summarize_conversation(self, previous_summary: str, turns: list, max_chars: int = 700, user_id: str | None = None) -> str:
+        """Fold turns that left the recent window into the running summary."""
+        lines = []
+        for t in turns or []:
+            txt = (t.get("text") or "").strip()
+            if not txt:
+                continue
+            prefix = "User:" if t.get("role") == "user" else "Assistant:"
+            lines.append(f"{prefix} {txt[:800]}")
+
+        if not lines:
+            return previous_summary or ""
+
+        prompt = f"""
+Update the running summary of a coaching conversation.
+
+Current summary:
+{previous_summary or "(empty)"}
+
+Older turns to fold in:
+{chr(10).join(lines)}
+
+Rules:
+- Keep the user's goals, constraints, decisions and open questions
+- Drop greetings, filler and repeated advice
+- Max {max_chars} characters, plain text, no bullets
+"""
+        resp = self.generate_raw(prompt.strip(), max_output_tokens=256, priority=Priority.BACKGROUND, user_id=user_id,
+                                 purpose="conversation_summary")
+        summary = self.extract_text(resp)
+
+        return summary[:max_chars] if summary else (previous_summary or "")
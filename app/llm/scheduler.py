@@ -0,0 +1,216 @@
+# app/llm/scheduler.py
+
+import time
+import threading
+from enum import IntEnum
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from app.config import settings
+from app.metrics import metrics
+
+
+class Priority(IntEnum):
+    """Lower value = served first."""
+    INTERACTIVE = 0     # coach replies, interview starts
+    BACKGROUND = 1      # fact extraction, rolling summaries
+    BULK = 2            # ingestion, backfills, batch jobs
+
+
+class SchedulerTimeout(Exception):
+    """Raised when work waits longer than its queue timeout (or the queue is full)."""
+
+
+# ------------------------------------------------------------
+# TOKEN BUCKET (matched to the API quota)
+# ------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Take one token. Returns 0.0 on success, else seconds to wait."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def pause(self, seconds: float):
+        """Back off after a quota error (429 / RESOURCE_EXHAUSTED)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+# ------------------------------------------------------------
+# SCHEDULER
+# ------------------------------------------------------------
+class LLMScheduler:
+    """
+    Admission control for calls to a rate-limited API.
+
+    - strict priority between classes: queued interactive work is always
+      dispatched before background / bulk work
+    - `reserved_interactive` slots are never handed to lower classes, so a
+      burst of background work cannot starve replies already in flight
+    - round-robin between users inside a class (per-user fairness)
+    - token bucket at the API quota; quota errors pause the bucket
+    - queue time per class is exported as scheduler.<name>.queue.<class>
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        rate_per_minute: float,
+        burst: int | None = None,
+        reserved_interactive: int = 0,
+        max_queue: int = 1000,
+        queue_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive = min(reserved_interactive, self.max_concurrency - 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._bucket = TokenBucket(rate_per_minute, burst or self.max_concurrency)
+        self._cond = threading.Condition()
+        self._queues = {p: OrderedDict() for p in Priority}     # user -> deque[ticket]
+        self._queued = {p: 0 for p in Priority}
+        self._in_flight = 0
+
+    # ------------------------------------------------------------
+    # INTERNAL (call with self._cond held)
+    # ------------------------------------------------------------
+    def _limit_for(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_interactive
+
+    def _head(self):
+        """(priority, user, ticket) that should run next."""
+        for p in Priority:
+            q = self._queues[p]
+            if q:
+                user, tickets = next(iter(q.items()))
+                return p, user, tickets[0]
+        return None, None, None
+
+    def _pop_head(self, priority: Priority, user):
+        q = self._queues[priority]
+        tickets = q.pop(user)
+        tickets.popleft()
+        if tickets:
+            q[user] = tickets           # re-append: next turn goes to another user
+        self._queued[priority] -= 1
+
+    def _remove(self, priority: Priority, user, ticket):
+        q = self._queues[priority]
+        tickets = q.get(user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del q[user]
+            self._queued[priority] -= 1
+
+    # ------------------------------------------------------------
+    # PUBLIC
+    # ------------------------------------------------------------
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE, user_id: str | None = None, timeout: float | None = None):
+        """Block until this call may run, then hold a concurrency slot."""
+        priority = Priority(priority)
+        user = str(user_id or "_anon")
+        ticket = object()
+        timeout = self.queue_timeout if timeout is None else timeout
+        label = priority.name.lower()
+
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            if self._queued[priority] >= self.max_queue:
+                metrics.incr(f"scheduler.{self.name}.rejected.{label}")
+                raise SchedulerTimeout(f"{self.name} queue full for {label} work")
+
+            self._queues[priority].setdefault(user, deque()).append(ticket)
+            self._queued[priority] += 1
+
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._remove(priority, user, ticket)
+                    self._cond.notify_all()
+                    metrics.incr(f"scheduler.{self.name}.timeout.{label}")
+                    raise SchedulerTimeout(f"{self.name}: {label} work waited {timeout:.0f}s")
+
+                head_p, head_user, head_ticket = self._head()
+                wait = deadline - now
+
+                if head_ticket is ticket and self._in_flight < self._limit_for(priority):
+                    bucket_wait = self._bucket.try_take()
+                    if bucket_wait == 0.0:
+                        self._pop_head(priority, user)
+                        self._in_flight += 1
+                        self._cond.notify_all()      # next head re-checks
+                        break
+                    wait = min(wait, bucket_wait)
+
+                self._cond.wait(timeout=wait)
+
+        metrics.observe(f"scheduler.{self.name}.queue.{label}", (time.monotonic() - start) * 1000.0)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def report_quota_error(self, backoff_seconds: float = 5.0):
+        with self._cond:
+            self._bucket.pause(backoff_seconds)
+        metrics.incr(f"scheduler.{self.name}.quota_errors")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": {p.name.lower(): n for p, n in self._queued.items()},
+            }
+
+
+# Shared schedulers (one per upstream quota)
+llm_scheduler = LLMScheduler(
+    "llm",
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rate_per_minute=settings.LLM_RATE_PER_MINUTE,
+    reserved_interactive=settings.LLM_RESERVED_INTERACTIVE,
+    queue_timeout=settings.SCHEDULER_QUEUE_TIMEOUT_SECONDS,
+)
+
+embed_scheduler = LLMScheduler(
+    "embed",
+    max_concurrency=settings.EMBED_MAX_CONCURRENCY,
+    rate_per_minute=settings.EMBED_RATE_PER_MINUTE,
+    reserved_interactive=settings.EMBED_RESERVED_INTERACTIVE,
+    queue_timeout=settings.SCHEDULER_QUEUE_TIMEOUT_SECONDS,
+)
+
+
+def is_quota_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "429" in msg or "resource_exhausted" in msg or "resource exhausted" in msg or "quota" in msg
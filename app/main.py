@@ -1,15 +1,28 @@
 # app/main.py
 
-from fastapi import FastAPI, HTTPException
-from app.schemas import RAGRequest, RAGResponse
+from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
+import time
+import hmac
+
+from app.schemas import RAGRequest, RAGResponse, RAGBatchRequest, RAGBatchResponse
 from app.router import router as app_router
 
 from app.vector_db.search_engine import VectorSearchEngine
 from app.rag.prompt_builder import PromptBuilder
+from app.rag.context_selector import ContextSelector
 from app.llm.gemini_client import GeminiClient
 from app.response.formatter import ResponseFormatter
 from app.vector_db.user_history import UserHistoryManager
 from app.vector_db.chat_memory import ChatMemory
+from app.metrics import metrics
+from app.usage import usage
+from app.affinity import user_cache
+from app.config import settings
+from app.profiling import profile_request
+from app.llm.scheduler import llm_scheduler, embed_scheduler, SchedulerTimeout
+from app.rag.single_flight import SingleFlight, DoNotCache
+from app.rag.rag_service import RAGService
+from app.db.archive import create_turn_archive
 
 
 # ----------------------------------------------------
@@ -28,9 +41,76 @@ app.include_router(app_router)
 # SERVICE INITIALIZATION
 # ----------------------------------------------------
 history_manager = UserHistoryManager()
-chat_memory = ChatMemory(max_turns=6)
-engine = VectorSearchEngine()
 llm_client = GeminiClient()
+chat_memory = ChatMemory(max_turns=6, summarizer=llm_client.summarize_conversation)
+engine = VectorSearchEngine()
+context_selector = ContextSelector(engine, chat_memory.r)
+turn_archive = create_turn_archive()
+rag_service = RAGService(embedder=engine.embed, searcher=engine, llm=llm_client, memory_mgr=history_manager)
+single_flight = SingleFlight(
+    chat_memory.r,
+    window_seconds=settings.SINGLE_FLIGHT_WINDOW_SECONDS,
+    idempotency_ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+)
+usage.start(chat_memory.r)
+
+
+@app.on_event("startup")
+def _warmup():
+    """
+    Runs in every worker before it accepts traffic: opens the Redis and
+    Qdrant connections and faults in the snapshot / BM25 index, so the
+    first user request of a fresh (or recycled) worker is not a cold one.
+    No Gemini calls (they would spend quota per worker start).
+    """
+    if not settings.WARMUP_ON_STARTUP:
+        return
+
+    probe = [1.0] + [0.0] * (engine.embed.dim - 1)
+    steps = {
+        "redis": lambda: chat_memory.r.ping(),
+        "qdrant": lambda: engine.db.client.get_collections(),
+        "snapshot": lambda: engine._search_snapshot(probe, engine.predefined_scope()),
+        "lexical": lambda: engine.lexical.search("plan learning career", limit=1),
+        "prompt": lambda: PromptBuilder.build_prompt_parts("warmup", [], []),
+    }
+
+    with metrics.timed("warmup"):
+        for name, step in steps.items():
+            try:
+                step()
+            except Exception as e:
+                print(f"⚠️ Warmup step {name} failed:", e)
+    print(f"🔥 Worker warm ({', '.join(steps)})")
+
+
+@app.on_event("shutdown")
+def _flush_archive():
+    if turn_archive is not None:
+        turn_archive.close()
+    usage.close()
+
+
+# ----------------------------------------------------
+# HELPER: record a turn (Redis window + durable archive)
+# ----------------------------------------------------
+def _record_turn(user_id: str, role: str, text: str):
+    if role == "user":
+        chat_memory.add_user(user_id, text)
+    else:
+        chat_memory.add_assistant(user_id, text)
+
+    if turn_archive is not None:
+        turn_archive.add_turn(user_id, role, text)
+
+
+class ErrorReply(RAGResponse):
+    """Error text sent back as the reply: kept in chat memory, never cached or replayed."""
+
+
+def _error_reply(user_id: str, ai_text: str) -> ErrorReply:
+    _record_turn(user_id, "assistant", ai_text)
+    return ErrorReply(ai_text=ai_text)
 
 
 # ----------------------------------------------------
@@ -54,80 +134,171 @@ def _should_summarize(user_msg: str, ai_text: str) -> bool:
     return True
 
 
+# ----------------------------------------------------
+# BACKGROUND: extract facts into long-term memory
+# ----------------------------------------------------
+def _write_long_term_memory(user_id: str, user_msg: str, ai_text: str):
+    """Runs after the reply is sent; LLM + embedding calls use BACKGROUND priority."""
+    try:
+        with metrics.timed("memory_write"), usage.scope(user_id, "memory_write", count_request=False):
+            combined = f"User: {user_msg}\nAssistant: {ai_text}"
+            facts = llm_client.summarize_to_facts(combined, max_facts=6, user_id=user_id)
+            _store_facts(user_id, facts)
+
+    except Exception as e:
+        print("⚠️ Summarization error:", e)
+
+
+def _store_facts(user_id: str, facts):
+    """Clean extracted facts and upsert them into long-term memory (+ archive)."""
+    try:
+        with metrics.timed("memory_store_facts"), usage.scope(user_id, "memory_store_facts", count_request=False):
+            for f in (facts or []):
+                f_clean = f.strip().strip('"').rstrip(",")
+                if len(f_clean) < 8:
+                    continue
+                if f_clean.lower().startswith(("is named", "named ")):
+                    continue
+
+                history_manager.upsert_summary(user_id, f_clean)
+                if turn_archive is not None:
+                    turn_archive.add_fact(user_id, f_clean)
+
+    except Exception as e:
+        print("⚠️ Fact storage error:", e)
+
+
 # ----------------------------------------------------
 # PERSONAL COACH / RAG ENDPOINT
 # ----------------------------------------------------
 @app.post("/rag", response_model=RAGResponse)
-def run_rag(request: RAGRequest):
+def run_rag(
+    request: RAGRequest,
+    background_tasks: BackgroundTasks,
+    x_profile: str | None = Header(default=None),
+    idempotency_key: str | None = Header(default=None),
+    x_user_id: str | None = Header(default=None),
+    x_affinity_epoch: str | None = Header(default=None),
+):
+    # X-User-Id is what affinity routing hashes on: it must name the same user
+    if x_user_id is not None and x_user_id != request.user_id:
+        raise HTTPException(status_code=400, detail="X-User-Id does not match user_id")
+    user_cache.observe_epoch(x_affinity_epoch)
+
+    if usage.over_budget(request.user_id):
+        raise HTTPException(status_code=429, detail="Daily usage budget reached, please try again tomorrow")
+
+    with metrics.timed("rag_total"), usage.scope(request.user_id), profile_request(x_profile):
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return _run_rag(request, background_tasks)
+
+        # Double-clicks sent while a reply is in flight, and retries under the same
+        # Idempotency-Key, share one pipeline run (and one set of memory writes);
+        # only the leader's background tasks are scheduled.
+        def _once():
+            result = _run_rag(request, background_tasks)
+            if isinstance(result, ErrorReply):
+                raise DoNotCache(result.model_dump())        # a retry must run the pipeline again
+            return result.model_dump() if isinstance(result, RAGResponse) else result
+
+        key = SingleFlight.key_for(
+            request.user_id,
+            request.message,
+            idempotency_key,
+            domain=request.domain,
+            role=request.role,
+            window_version=None if idempotency_key else chat_memory.get_version(request.user_id),
+        )
+        return single_flight.do(key, _once)
+
+
+def _run_rag(request: RAGRequest, background_tasks: BackgroundTasks):
     user_id = request.user_id
     user_msg = (request.message or "").strip()
 
     if not user_msg:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    # 1) Add user turn to short-term memory
-    chat_memory.add_user(user_id, user_msg)
-
-    # 2) Get long-term memory from vector DB
-    chunks = engine.search_relevant_chunks(query=user_msg, user_id=user_id)
+    # 1) Get long-term memory from vector DB (gated: none / reuse / full)
+    with metrics.timed("retrieval"), usage.stage("retrieval"):
+        if settings.RETRIEVAL_GATING:
+            chunks, _ = context_selector.get_context_chunks(
+                user_id=user_id,
+                message=user_msg,
+                domain=request.domain,
+                role=request.role,
+            )
+        else:
+            chunks = engine.search_relevant_chunks(
+                query=user_msg,
+                user_id=user_id,
+                domain=request.domain,
+                role=request.role,
+            )
 
-    # 3) Get short-term memory window
-    recent_turns = chat_memory.get_recent(user_id)
+    # 2) Get short-term memory window + running summary of older turns
+    with metrics.timed("chat_memory_read"), usage.stage("chat_memory_read"):
+        recent_turns, conversation_summary = chat_memory.get_context(user_id)
 
-    # 4) Build LLM prompt
-    prompt = PromptBuilder.build_prompt(
-        user_query=user_msg,
-        context_chunks=chunks,
-        recent_conversation=recent_turns
-    )
+    # 3) Build LLM prompt
+    with metrics.timed("prompt_build"):
+        prompt = PromptBuilder.build_prompt_parts(
+            user_query=user_msg,
+            context_chunks=chunks,
+            recent_conversation=recent_turns,
+            conversation_summary=conversation_summary,
+        )
+    metrics.record("prompt_tokens", PromptBuilder.estimate_tokens(prompt.full))
 
-    # 5) Call Gemini LLM
+    # 4) Call Gemini LLM (combined mode: reply + user facts in the same call)
+    reply, facts, llm_error = None, None, None
     try:
-        resp = llm_client.generate_raw(prompt)
+        with metrics.timed("llm_generate"), usage.stage("llm_generate"):
+            if settings.COMBINED_FACTS_MODE:
+                resp, reply, facts = llm_client.generate_reply_with_facts(prompt, max_facts=6, user_id=user_id)
+            else:
+                resp = llm_client.generate_raw(prompt, user_id=user_id)
+    except SchedulerTimeout:
+        # Overloaded: tell the client to retry; nothing was stored, so the retry starts clean
+        raise HTTPException(status_code=503, detail="Coach is busy, please retry shortly")
     except Exception as e:
-        ai_text = f"[LLM ERROR] {str(e)}"
-        chat_memory.add_assistant(user_id, ai_text)
-        return RAGResponse(ai_text=ai_text)
+        llm_error = e
+
+    # 5) Add user turn to short-term memory (only once admitted: a 503 retry must not store it twice;
+    #    the prompt builder already left the new message out of the recent window)
+    with metrics.timed("chat_memory_write"), usage.stage("chat_memory_write"):
+        _record_turn(user_id, "user", user_msg)
+
+    if llm_error is not None:
+        return _error_reply(user_id, f"[LLM ERROR] {str(llm_error)}")
 
     # 6) Extract text
     try:
         candidate = resp.candidates[0]
     except Exception:
-        ai_text = "[ERROR] No candidates returned."
-        chat_memory.add_assistant(user_id, ai_text)
-        return RAGResponse(ai_text=ai_text)
+        return _error_reply(user_id, "[ERROR] No candidates returned.")
 
     if not candidate.content or not getattr(candidate.content, "parts", []):
         safety = getattr(candidate, "safety_ratings", None)
-        ai_text = f"[BLOCKED OR EMPTY RESPONSE] Safety: {safety}"
-        chat_memory.add_assistant(user_id, ai_text)
-        return RAGResponse(ai_text=ai_text)
+        return _error_reply(user_id, f"[BLOCKED OR EMPTY RESPONSE] Safety: {safety}")
 
     parts = candidate.content.parts or []
-    ai_text = "".join(
-        p.text for p in parts if hasattr(p, "text") and p.text
-    ).strip() or "[LLM ERROR] empty text"
+    ai_text = reply or GeminiClient.join_parts(parts)
+    if not ai_text:
+        return _error_reply(user_id, "[LLM ERROR] empty text")
 
     # 7) Save assistant reply to short-term memory
-    chat_memory.add_assistant(user_id, ai_text)
-
-    # 8) Summarize into long-term memory (if meaningful)
-    try:
-        if _should_summarize(user_msg, ai_text):
-            combined = f"User: {user_msg}\nAssistant: {ai_text}"
-            facts = llm_client.summarize_to_facts(combined, max_facts=6)
-
-            for f in (facts or []):
-                f_clean = f.strip().strip('"').rstrip(",")
-                if len(f_clean) < 8:
-                    continue
-                if f_clean.lower().startswith(("is named", "named ")):
-                    continue
+    with usage.stage("chat_memory_write"):
+        _record_turn(user_id, "assistant", ai_text)
 
-                history_manager.upsert_summary(user_id, f_clean)
-
-    except Exception as e:
-        print("⚠️ Summarization error:", e)
+    # 8) Long-term memory (if meaningful) — after the response is sent.
+    #    Combined mode already has the facts; otherwise (or if its JSON did
+    #    not parse) a second BACKGROUND call extracts them.
+    if _should_summarize(user_msg, ai_text):
+        if facts is not None:
+            background_tasks.add_task(_store_facts, user_id, facts)
+        else:
+            background_tasks.add_task(_write_long_term_memory, user_id, user_msg, ai_text)
 
     # 9) Format response
     try:
@@ -136,3 +307,77 @@ def run_rag(request: RAGRequest):
         output = {"ai_text": ai_text}
 
     return output
+
+
+# ----------------------------------------------------
+# BATCH RAG ENDPOINT (evaluation / backfills, BULK priority)
+# ----------------------------------------------------
+@app.post("/rag/batch", response_model=RAGBatchResponse)
+def run_rag_batch(request: RAGBatchRequest):
+    if len(request.items) > settings.RAG_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.RAG_BATCH_MAX_ITEMS} items per batch; use scripts/rag_batch.py for larger runs",
+        )
+
+    start = time.perf_counter()
+    with metrics.timed("rag_batch_total"):
+        results = list(rag_service.answer_batch(
+            (item.model_dump() for item in request.items),
+            store_memory=request.store_memory,
+        ))
+
+    return RAGBatchResponse(results=results, elapsed_ms=round((time.perf_counter() - start) * 1000.0, 1))
+
+
+# ----------------------------------------------------
+# ADMIN AUTH (/metrics, /admin/*)
+# ----------------------------------------------------
+def _require_admin(x_admin_token: str | None):
+    """Fail closed: without ADMIN_TOKEN configured the endpoints do not exist."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+# ----------------------------------------------------
+# METRICS (per-stage latency + counters)
+# ----------------------------------------------------
+@app.get("/metrics")
+def get_metrics(x_admin_token: str | None = Header(default=None)):
+    _require_admin(x_admin_token)
+    return {
+        **metrics.snapshot(),
+        "schedulers": {
+            "llm": llm_scheduler.stats(),
+            "embed": embed_scheduler.stats(),
+        },
+        "user_cache": user_cache.stats(),
+    }
+
+
+# ----------------------------------------------------
+# ADMIN: per-user / per-stage usage
+# ----------------------------------------------------
+@app.get("/admin/usage")
+def get_usage(top: int = 20, day: str | None = None, x_admin_token: str | None = Header(default=None)):
+    """
+    Top users by estimated cost and per-stage totals for a UTC day (all
+    workers, flushed every USAGE_FLUSH_SECONDS), plus this worker's
+    unflushed view with SpaceSaving error bounds.
+    """
+    _require_admin(x_admin_token)
+
+    top = max(1, min(top, settings.USAGE_TOP_K))
+    try:
+        report = usage.report(top=top, day=day)
+    except Exception as e:
+        print("⚠️ Usage report failed:", e)
+        report = {"day": day, "error": str(e)}
+
+    return {
+        **report,
+        "budget_usd": settings.USAGE_DAILY_BUDGET_USD or None,
+        "process": usage.process_snapshot(top=top),
+    }
@@ -0,0 +1,104 @@
+# app/metrics.py
+
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+class Metrics:
+    """
+    In-process latency + counter registry.
+
+    Stage timings are kept in bounded windows so percentiles stay cheap,
+    while call counts and totals are tracked for the whole process lifetime.
+    """
+
+    def __init__(self, window: int = 4096):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(float)
+        self._counters = defaultdict(int)
+        self._values = defaultdict(lambda: deque(maxlen=self.window))
+
+    # ------------------------------------------------------------
+    # RECORDING
+    # ------------------------------------------------------------
+    def observe(self, stage: str, ms: float):
+        with self._lock:
+            self._samples[stage].append(ms)
+            self._counts[stage] += 1
+            self._totals[stage] += ms
+
+    def record(self, name: str, value: float):
+        """Non-latency distribution (e.g. prompt tokens per request)."""
+        with self._lock:
+            self._values[name].append(value)
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000.0)
+
+    # ------------------------------------------------------------
+    # READING
+    # ------------------------------------------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            counts = dict(self._counts)
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+            dists = {k: sorted(v) for k, v in self._values.items()}
+
+        stages = {}
+        for stage, values in samples.items():
+            stages[stage] = {
+                "count": counts.get(stage, 0),
+                "mean_ms": round(totals[stage] / counts[stage], 3) if counts.get(stage) else 0.0,
+                "p50_ms": round(_percentile(values, 50), 3),
+                "p95_ms": round(_percentile(values, 95), 3),
+                "p99_ms": round(_percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3) if values else 0.0,
+            }
+
+        distributions = {
+            name: {
+                "count": len(vals),
+                "p50": _percentile(vals, 50),
+                "p95": _percentile(vals, 95),
+                "max": vals[-1] if vals else 0,
+            }
+            for name, vals in dists.items()
+        }
+
+        return {"stages": stages, "counters": counters, "values": distributions}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._totals.clear()
+            self._counters.clear()
+            self._values.clear()
+
+
+# Singleton instance available everywhere
+metrics = Metrics()
@@ -0,0 +1,63 @@
+# app/profiling.py
+
+import io
+import os
+import time
+import itertools
+import pstats
+import cProfile
+from contextlib import contextmanager
+
+from app.config import settings
+
+
+# dumps from the same second / pid (concurrent requests) get distinct names
+_seq = itertools.count(1)
+
+
+@contextmanager
+def profile_request(mode: str | None, label: str = "rag"):
+    """
+    Profile the wrapped block when profiling is enabled and requested.
+
+    mode (value of the X-Profile header):
+      - None / ""      -> no profiling
+      - "pyinstrument" -> pyinstrument HTML report (if installed)
+      - anything else  -> cProfile .prof dump + top functions printed
+    """
+    if not settings.PROFILING_ENABLED or not mode:
+        yield
+        return
+
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(settings.PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_seq)}")
+
+    if mode.strip().lower() == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ pyinstrument not installed, falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(f"{stem}.html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                print(f"🧪 Profile written: {stem}.html")
+            return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{stem}.prof")
+
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(20)
+        print(f"🧪 Profile written: {stem}.prof")
+        print(buf.getvalue())
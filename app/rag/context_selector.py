@@ -0,0 +1,149 @@
+# app/rag/context_selector.py
+
+import re
+import json
+from typing import List, Dict
+
+from app.config import settings
+from app.metrics import metrics
+from app.affinity import user_cache
+from app.vector_db.user_history import _normalize_text
+from app.vector_db.lexical_index import tokenize
+
+
+# Turns that never need memory
+_SOCIAL = {
+    "hi", "hello", "hey", "hii", "thanks", "thank you", "thanks a lot", "thank you so much",
+    "thx", "ty", "cool", "great", "nice", "awesome", "bye", "good night", "see you",
+}
+
+# Short answers that only make sense against the previous turn
+_ACKS = {"ok", "okay", "k", "sure", "yes", "yeah", "yep", "no", "nope", "got it", "makes sense", "done"}
+
+# Openers of short follow-ups on the same topic
+_FOLLOW_UP = re.compile(
+    r"^(and|also|then|but|why|how come|what about|how about|what if|more|"
+    r"example|examples|elaborate|continue|go on|tell me more|which one|like what)\b"
+)
+_ANAPHORA = re.compile(r"\b(it|that|this|those|these|them|they)\b")
+
+# Follow-up filler that is not a new topic (on top of lexical_index stopwords)
+_FILLER = {
+    "why", "come", "more", "example", "examples", "elaborate", "continue", "tell", "like",
+    "else", "again", "please", "explain", "mean", "detail", "details", "further", "give",
+    "show", "one", "ones", "them", "they", "really", "ok", "okay", "k", "sure", "yeah",
+    "yep", "nope", "got", "makes", "sense", "done",
+}
+
+
+def _content_terms(text: str) -> set:
+    return {t for t in tokenize(text) if t not in _FILLER}
+
+
+class ContextSelector:
+    """
+    Query-intent gate in front of VectorSearchEngine.
+
+    Decisions (computed locally, no network):
+      - "none"  : greetings / thanks / acks  -> no retrieval
+      - "reuse" : short follow-ups            -> previous turn's context (worker cache, else Redis),
+                                                 unless the message brings content words the
+                                                 cached query did not have (then "full")
+      - "full"  : everything else             -> embed + search, then cache
+
+    Per-decision counters are exported through app.metrics; "none" + "reuse"
+    is the number of retrievals skipped. What one retrieval costs depends on
+    the path the engine takes (lexical fast path, snapshot, batched search,
+    cached summaries), so see its retrieval.* stages for calls actually made.
+    """
+
+    def __init__(self, engine, redis_client, max_follow_up_words: int = 7):
+        self.engine = engine
+        self.r = redis_client
+        self.max_follow_up_words = max_follow_up_words
+        self.ttl_seconds = settings.RETRIEVAL_CACHE_TTL_SECONDS
+
+    # ------------------------------------------------------------
+    # CLASSIFICATION
+    # ------------------------------------------------------------
+    def classify(self, message: str) -> str:
+        msg = _normalize_text(message).lower()
+        msg = re.sub(r"[!.?,]+$", "", msg).strip()
+
+        if not msg or msg in _SOCIAL:
+            return "none"
+        if msg in _ACKS:
+            return "reuse"
+
+        words = msg.split()
+        if len(words) <= self.max_follow_up_words and (_FOLLOW_UP.match(msg) or _ANAPHORA.search(msg)):
+            return "reuse"
+
+        return "full"
+
+    # ------------------------------------------------------------
+    # PER-USER RETRIEVAL CACHE
+    # ------------------------------------------------------------
+    def _key(self, user_id: str, domain: str | None, role: str | None) -> str:
+        return f"retrieval_cache:{user_id}:{domain or ''}:{role or ''}"
+
+    def _cache_get(self, user_id: str, key: str) -> Dict | None:
+        """{"terms": content terms of the query that was searched, "chunks": [...]}"""
+        local = user_cache.get("retrieval", user_id)
+        if local is not None and local[0] == key:
+            return local[1]
+
+        try:
+            raw = self.r.get(key)
+        except Exception as e:
+            print("❌ Redis read failed:", e)
+            return None
+        if not raw:
+            return None
+        try:
+            entry = json.loads(raw)
+        except Exception:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def _cache_put(self, user_id: str, key: str, query: str, chunks: List[Dict]):
+        entry = {
+            "terms": sorted(_content_terms(query)),
+            "chunks": [
+                {"text": c.get("text", ""), "source": c.get("source"), "score": c.get("score"),
+                 "final_score": c.get("final_score")}
+                for c in chunks
+            ],
+        }
+        user_cache.put("retrieval", user_id, (key, entry))
+        try:
+            self.r.set(key, json.dumps(entry), ex=self.ttl_seconds)
+        except Exception as e:
+            print("❌ Redis write failed:", e)
+
+    # ------------------------------------------------------------
+    # ENTRY POINT
+    # ------------------------------------------------------------
+    def get_context_chunks(self, user_id: str, message: str, domain: str | None = None, role: str | None = None):
+        decision = self.classify(message)
+        key = self._key(user_id, domain, role)
+
+        if decision == "reuse":
+            cached = self._cache_get(user_id, key)
+            if cached is None:
+                decision = "full"
+            elif _content_terms(message) - set(cached.get("terms", ())):
+                metrics.incr("gating.reuse_new_terms")      # new topic behind a follow-up opener
+                decision = "full"
+            else:
+                chunks = cached.get("chunks", [])
+
+        if decision == "none":
+            chunks = []
+
+        if decision == "full":
+            chunks = self.engine.search_relevant_chunks(query=message, user_id=user_id, domain=domain, role=role)
+            self._cache_put(user_id, key, message, chunks)
+
+        metrics.incr(f"gating.{decision}")
+        return chunks, decision
@@ -1,13 +1,72 @@
 # app/rag/prompt_builder.py
 
+from typing import NamedTuple
+
+from app.config import settings
+
+
+class PromptParts(NamedTuple):
+    """
+    A prompt split into a stable prefix (`system` + `context`, which never
+    depend on the user) and a `suffix` that changes every request.
+    """
+    system: str
+    context: str
+    suffix: str
+
+    @property
+    def prefix(self) -> str:
+        return "\n\n".join(p for p in (self.system, self.context) if p)
+
+    @property
+    def full(self) -> str:
+        return f"{self.prefix}\n\n{self.suffix}"
+
+
 class PromptBuilder:
+    # Per-turn cap for the raw recent window (long assistant replies bloat prompts)
+    MAX_TURN_CHARS = 500
+
+    # Chunks from the shared predefined collection go into the stable prefix
+    SHARED_SOURCE = settings.PREDEFINED_COLLECTION.upper()
+
+    # Persona + rules: identical for every /rag call
+    COACH_INSTRUCTIONS = """
+You are a friendly personal coach. Help the user with planning, learning, productivity, and career growth, practical next steps.
+Use the reference material, long-term memories and recent conversation provided to personalize answers, but do not invent facts.
+
+Rules:
+- Reply in 4–7 short lines.
+- Keep tone supportive and practical.
+- Give 1-3 actionable steps and 1 short follow-up question. if needed for clarity.
+""".strip()
+
     @staticmethod
-    def build_prompt(user_query: str, context_chunks: list, recent_conversation: list):
+    def estimate_tokens(text: str) -> int:
+        """Cheap token estimate (~4 chars/token for English Gemini input)."""
+        return (len(text or "") + 3) // 4
+
+    @staticmethod
+    def build_prompt(user_query: str, context_chunks: list, recent_conversation: list, conversation_summary: str = ""):
+        """Single-string prompt (stable prefix + per-request suffix)."""
+        return PromptBuilder.build_prompt_parts(
+            user_query, context_chunks, recent_conversation, conversation_summary
+        ).full
+
+    @staticmethod
+    def build_prompt_parts(user_query: str, context_chunks: list, recent_conversation: list,
+                           conversation_summary: str = "") -> PromptParts:
         """
         Build coaching prompt using:
           - relevant long-term memory
+          - running summary of older turns
           - short-term memory (recent turns)
           - current user message
+
+        Split into PromptParts: coach instructions + predefined reference
+        chunks form the stable prefix (the same for every user who gets those
+        chunks); user memories, conversation and the new message form the
+        per-request suffix. Both chunk lists keep retrieval (relevance) order.
         """
         # ------ Long-term memory ------
         filtered_chunks = []
@@ -21,13 +80,13 @@ class PromptBuilder:
                 continue
 
             snippet = txt if len(txt) < 450 else txt[:450] + "..."
-            filtered_chunks.append(f"[{src}] {snippet}")
+            filtered_chunks.append((src, f"[{src}] {snippet}"))
 
-        context_text = (
-            "\n".join(filtered_chunks[:4])
-            if filtered_chunks else
-            "No long-term memories available."
-        )
+        kept = filtered_chunks[:4]
+        reference = [line for src, line in kept if src == PromptBuilder.SHARED_SOURCE]
+        personal = [line for src, line in kept if src != PromptBuilder.SHARED_SOURCE]
+
+        context_text = "\n".join(personal) if personal else "No long-term memories available."
 
         # ------ Recent conversation ------
         recent_lines = []
@@ -43,6 +102,8 @@ class PromptBuilder:
                 txt = (t.get("text") or "").strip()
                 if len(txt) < 6:
                     continue
+                if len(txt) > PromptBuilder.MAX_TURN_CHARS:
+                    txt = txt[:PromptBuilder.MAX_TURN_CHARS] + "..."
                 prefix = "User:" if t.get("role") == "user" else "Assistant:"
                 recent_lines.append(f"{prefix} {txt}")
 
@@ -53,24 +114,49 @@ class PromptBuilder:
         )
 
         # ------ Final prompt ------
-        prompt = f"""
-You are a friendly personal coach. Help the user with planning, learning, productivity, and career growth, practical next steps.
-Use the long-term memories and recent conversation below to personalize answers, but do not invent facts.
+        stable_context = (
+            "Reference material:\n" + "\n".join(reference)
+            if reference else ""
+        )
 
+        suffix = f"""
 Long-term memory:
 {context_text}
 
+Earlier in this conversation (summary):
+{(conversation_summary or "").strip() or "Nothing earlier."}
+
 Recent conversation:
 {recent_text}
 
 User's new message:
 {user_query}
 
-Rules:
-- Reply in 4–7 short lines.
-- Keep tone supportive and practical.
-- Give 1-3 actionable steps and 1 short follow-up question. if needed for clarity.
-
 Now respond as the user's personal coach.
+"""
+        return PromptParts(PromptBuilder.COACH_INSTRUCTIONS, stable_context, suffix.strip())
+
+    @staticmethod
+    def build_interview_prompt(role: str, experience: int, job_description: str, questions: list):
+        """
+        Light personalization prompt for bank questions:
+        rephrase (not regenerate) each question for the candidate.
+        """
+        numbered = "\n".join(
+            f"{i + 1}. [{q.get('skill', 'general')}] {q['question']}"
+            for i, q in enumerate(questions)
+        )
+
+        prompt = f"""
+You are preparing a text interview for a {role} candidate with {experience} year(s) of experience.
+Job description: {job_description or "Not provided."}
+
+Rephrase each question below so it fits this role and job description.
+Keep the same order, the same skill and roughly the same difficulty.
+
+Questions:
+{numbered}
+
+Return STRICT JSON: ["question 1", "question 2", ...] with exactly {len(questions)} items.
 """
         return prompt.strip()
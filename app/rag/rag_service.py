@@ -1,53 +1,190 @@
 # app/rag/rag_service.py
 
-from typing import Dict, Any
-from embeddings.generator import EmbeddingGenerator
-from vector_db.search_engine import VectorSearchEngine
-from rag.prompt_builder import PromptBuilder
-from llm.gemini_client import GeminiClient
-from rag.memory_extractor import MemoryExtractor
-from vector_db.user_history import UserHistoryManager
+import time
+import threading
+from typing import Dict, Any, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.metrics import metrics
+from app.usage import usage
+from app.embeddings.generator import EmbeddingGenerator
+from app.vector_db.search_engine import VectorSearchEngine
+from app.rag.prompt_builder import PromptBuilder
+from app.llm.gemini_client import GeminiClient
+from app.llm.scheduler import Priority
+from app.rag.memory_extractor import MemoryExtractor
+from app.vector_db.user_history import UserHistoryManager
 
 
 class RAGService:
     """
-    Standalone RAG engine (NOT used in main coach pipeline right now).
-    Useful if you want a separate RAG endpoint later.
+    Standalone RAG engine (no short-term memory), used by /rag/batch and
+    scripts/rag_batch.py for evaluation runs and backfills.
+
+    Pass existing clients to share them with the main coach pipeline.
     """
 
-    def __init__(self):
-        self.embedder = EmbeddingGenerator()
-        self.searcher = VectorSearchEngine()
-        self.llm = GeminiClient()
-        self.memory_mgr = UserHistoryManager()
+    def __init__(
+        self,
+        embedder: EmbeddingGenerator | None = None,
+        searcher: VectorSearchEngine | None = None,
+        llm: GeminiClient | None = None,
+        memory_mgr: UserHistoryManager | None = None,
+    ):
+        self.embedder = embedder or EmbeddingGenerator()
+        self.searcher = searcher or VectorSearchEngine()
+        self.llm = llm or GeminiClient()
+        self.memory_mgr = memory_mgr or UserHistoryManager()
         self.extractor = MemoryExtractor()
 
-    def answer(self, user_id: str, user_message: str) -> Dict[str, Any]:
+    # ------------------------------------------------------------
+    # SINGLE MESSAGE
+    # ------------------------------------------------------------
+    def answer(
+        self,
+        user_id: str,
+        user_message: str,
+        domain: str | None = None,
+        role: str | None = None,
+        query_embedding: list | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+        store_memory: bool = True,
+    ) -> Dict[str, Any]:
         # 1) Retrieve context
         context = self.searcher.search_relevant_chunks(
             query=user_message,
-            user_id=user_id
+            user_id=user_id,
+            domain=domain,
+            role=role,
+            query_embedding=query_embedding,
         )
 
         # 2) Build prompt
-        prompt = PromptBuilder.build_prompt(
+        prompt = PromptBuilder.build_prompt_parts(
             user_query=user_message,
             context_chunks=context,
             recent_conversation=[]  # standalone mode
         )
 
         # 3) Call LLM
-        raw = self.llm.generate_raw(prompt)
+        raw = self.llm.generate_raw(prompt, priority=priority, user_id=user_id)
         ai_text = self.llm.extract_text(raw)
 
         # 4) Heuristic memory extraction
         candidates = self.extractor.extract_candidates(user_message)
-        if self.extractor.should_store(candidates):
+        stored = store_memory and self.extractor.should_store(candidates)
+        if stored:
             self.memory_mgr.save_message(user_id, user_message)
 
         # 5) Return structured result
         return {
             "answer": ai_text,
             "used_context": context,
-            "stored_memory": candidates if self.extractor.should_store(candidates) else None,
+            "stored_memory": candidates if stored else None,
         }
+
+    # ------------------------------------------------------------
+    # BATCH
+    # ------------------------------------------------------------
+    def answer_batch(
+        self,
+        items: Iterable[Dict[str, Any]],
+        chunk_size: int = 64,
+        search_concurrency: int | None = None,
+        llm_concurrency: int | None = None,
+        priority: Priority = Priority.BULK,
+        store_memory: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a stream of {"user_id", "message", "domain"?, "role"?, ...} items.
+
+        Per chunk of `chunk_size` items:
+          1) one batched embedding call for all queries
+          2) filtered searches run concurrently (`search_concurrency` threads)
+          3) LLM calls capped at `llm_concurrency` in flight, on top of the
+             shared scheduler's priority / quota control
+        Results are yielded in input order, one dict per item; failures are
+        reported in "error" instead of aborting the run.
+        """
+        search_concurrency = search_concurrency or settings.RAG_BATCH_SEARCH_CONCURRENCY
+        llm_concurrency = llm_concurrency or settings.RAG_BATCH_LLM_CONCURRENCY
+        search_gate = threading.Semaphore(search_concurrency)
+        llm_gate = threading.Semaphore(llm_concurrency)
+
+        def run_one(item: Dict[str, Any], emb: list) -> Dict[str, Any]:
+            user_id = str(item.get("user_id", ""))
+            message = (item.get("message") or "").strip()
+            out = {k: v for k, v in item.items() if k not in ("domain", "role")}
+            start = time.perf_counter()
+
+            try:
+                if not user_id or not message:
+                    raise ValueError("user_id and message are required")
+
+                with search_gate, metrics.timed("rag_batch.search"):
+                    context = self.searcher.search_relevant_chunks(
+                        query=message,
+                        user_id=user_id,
+                        domain=item.get("domain"),
+                        role=item.get("role"),
+                        query_embedding=emb,
+                    )
+
+                prompt = PromptBuilder.build_prompt_parts(
+                    user_query=message,
+                    context_chunks=context,
+                    recent_conversation=[],
+                )
+
+                with llm_gate, metrics.timed("rag_batch.llm"):
+                    ai_text = self.llm.extract_text(
+                        self.llm.generate_raw(prompt, priority=priority, user_id=user_id)
+                    )
+                if not ai_text:
+                    raise RuntimeError("empty LLM response")
+
+                if store_memory and self.extractor.should_store(self.extractor.extract_candidates(message)):
+                    self.memory_mgr.save_message(user_id, message)
+
+                out.update(
+                    answer=ai_text,
+                    sources=[
+                        {"source": c.get("source"), "text": c.get("text", ""), "score": c.get("final_score")}
+                        for c in context
+                    ],
+                    error=None,
+                )
+                metrics.incr("rag_batch.items")
+            except Exception as e:
+                out.update(answer=None, sources=[], error=str(e))
+                metrics.incr("rag_batch.errors")
+
+            out["latency_ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+            return out
+
+        def run_scoped(item: Dict[str, Any], emb: list) -> Dict[str, Any]:
+            # pool threads do not inherit the caller's context: attribute usage per item
+            with usage.scope(str(item.get("user_id", "")), "rag_batch"):
+                return run_one(item, emb)
+
+        workers = max(search_concurrency, llm_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for chunk in _chunks(items, chunk_size):
+                with metrics.timed("rag_batch.embed"):
+                    embeddings = self.embedder.create_embeddings(
+                        [(it.get("message") or "").strip() for it in chunk],
+                        priority=priority,
+                    )
+                yield from pool.map(run_scoped, chunk, embeddings)
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,196 @@
+# app/rag/single_flight.py
+
+import json
+import time
+import hashlib
+import threading
+from typing import Callable, Any
+
+from app.metrics import metrics
+
+
+class DoNotCache(Exception):
+    """Raised by the wrapped function to hand back `result` without caching it (error replies)."""
+
+    def __init__(self, result):
+        super().__init__("result must not be cached")
+        self.result = result
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical requests into one execution.
+
+    Layer 1 (in-process): followers in the same worker wait on the
+    leader's Event (at most `lock_ttl`, then run themselves) and share its
+    result object.
+
+    Layer 2 (Redis, across workers):
+      singleflight:lock:{key}    SET NX EX — one leader cluster-wide
+      singleflight:result:{key}  JSON result, kept for `window_seconds`
+                                 (or `idempotency_ttl` for client keys)
+    Followers in other workers poll the result key. If the leader's lock
+    disappears without a result (crash / error), the follower runs itself.
+
+    Only successful results are shared after completion; errors are
+    re-raised to in-process followers but never cached. Error replies that
+    still go back to the client (fn raises DoNotCache(result)) reach the
+    caller and its concurrent in-process followers, but are not written to
+    Redis: a retry runs the pipeline again.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        window_seconds: int = 15,
+        idempotency_ttl: int = 3600,
+        lock_ttl: int = 120,
+        poll_interval: float = 0.05,
+    ):
+        self.r = redis_client
+        self.window_seconds = window_seconds
+        self.idempotency_ttl = idempotency_ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # KEYS
+    # ------------------------------------------------------------
+    @staticmethod
+    def key_for(
+        user_id: str,
+        message: str,
+        idempotency_key: str | None = None,
+        domain: str | None = None,
+        role: str | None = None,
+        window_version: int | None = None,
+    ) -> str:
+        """
+        A client Idempotency-Key names the request itself. Otherwise the key
+        is the message plus the chat window version the request saw: the
+        leader records its turns only after the LLM call, so duplicates sent
+        while it runs share the key, and the same text sent after the reply
+        (another "yes") is a new request.
+        """
+        if idempotency_key:
+            return f"idem:{user_id}:{idempotency_key.strip()}"
+        norm = " ".join((message or "").lower().split())
+        scope = f"{user_id}\0{domain or ''}\0{role or ''}\0{window_version or 0}"
+        digest = hashlib.sha256(f"{scope}\0{norm}".encode("utf-8")).hexdigest()[:32]
+        return f"msg:{digest}"
+
+    def _result_key(self, key: str) -> str:
+        return f"singleflight:result:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"singleflight:lock:{key}"
+
+    def _ttl_for(self, key: str) -> int:
+        return self.idempotency_ttl if key.startswith("idem:") else self.window_seconds
+
+    # ------------------------------------------------------------
+    # REDIS LAYER
+    # ------------------------------------------------------------
+    def _get_result(self, key: str):
+        try:
+            raw = self.r.get(self._result_key(key))
+        except Exception as e:
+            print("❌ Redis read failed:", e)
+            return None
+        return json.loads(raw) if raw else None
+
+    @staticmethod
+    def _call(fn: Callable[[], Any]):
+        """(result, cacheable)"""
+        try:
+            return fn(), True
+        except DoNotCache as e:
+            metrics.incr("single_flight.not_cached")
+            return e.result, False
+
+    def _run_distributed(self, key: str, fn: Callable[[], Any]):
+        cached = self._get_result(key)
+        if cached is not None:
+            metrics.incr("single_flight.replayed")
+            return cached
+
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            try:
+                acquired = self.r.set(self._lock_key(key), "1", nx=True, ex=self.lock_ttl)
+            except Exception as e:
+                print("❌ Redis lock failed, running without dedup:", e)
+                return self._call(fn)[0]
+
+            if acquired:
+                try:
+                    result, cacheable = self._call(fn)
+                    if cacheable:
+                        try:
+                            self.r.set(self._result_key(key), json.dumps(result), ex=self._ttl_for(key))
+                        except Exception as e:
+                            print("❌ Redis write failed:", e)
+                    metrics.incr("single_flight.leader")
+                    return result
+                finally:
+                    try:
+                        self.r.delete(self._lock_key(key))
+                    except Exception:
+                        pass
+
+            # Another worker leads: wait for its result (or for its lock to vanish)
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                cached = self._get_result(key)
+                if cached is not None:
+                    metrics.incr("single_flight.shared_redis")
+                    return cached
+                try:
+                    if not self.r.exists(self._lock_key(key)):
+                        break           # leader failed: retry acquiring the lock
+                except Exception:
+                    break
+            else:
+                return self._call(fn)[0]
+
+    # ------------------------------------------------------------
+    # ENTRY POINT
+    # ------------------------------------------------------------
+    def do(self, key: str, fn: Callable[[], Any]):
+        """Run fn once per key; concurrent / retried duplicates share its result."""
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[key] = call
+
+        if not leader:
+            if not call.event.wait(self.lock_ttl):
+                metrics.incr("single_flight.wait_timeout")      # leader stuck: run it ourselves
+                return self._call(fn)[0]
+            metrics.incr("single_flight.shared_local")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_distributed(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -1,11 +1,20 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
-# Create an empty router that can be extended with routes later
+from app.schemas import InterviewStartRequest, InterviewStartResponse
+from app.interview.interview_service import InterviewService
+
+# Global/base router mounted by app.main
 router = APIRouter()
 
-# Routes can be added here in the future
-# Example:
-# @router.get("/example")
-# def example():
-#     return {"message": "example"}
+interview_service = InterviewService()
+
+
+# ----------------------------------------------------
+# INTERVIEW GENERATOR
+# ----------------------------------------------------
+@router.post("/interview_text/start", response_model=InterviewStartResponse)
+def start_interview(request: InterviewStartRequest):
+    if not request.role.strip():
+        raise HTTPException(status_code=400, detail="Role cannot be empty")
 
+    return interview_service.start(request)
@@ -7,8 +7,69 @@ class RAGRequest(BaseModel):
     """Incoming request for the Personal Coach (RAG) endpoint."""
     message: str = Field(..., description="User message")
     user_id: str = Field(..., description="Unique user identifier")
+    domain: str | None = Field(
+        default=None,
+        description="Predefined-context partition to search (e.g. 'coach', 'interview')"
+    )
+    role: str | None = Field(
+        default=None,
+        description="Optional role narrowing the predefined context (e.g. 'Backend Developer')"
+    )
 
 
 class RAGResponse(BaseModel):
     """Response returned by the Personal Coach."""
     ai_text: str = Field(..., description="Generated AI response")
+
+
+class RAGBatchItem(BaseModel):
+    """One message in a batch run."""
+    user_id: str = Field(..., description="Unique user identifier")
+    message: str = Field(..., description="User message")
+    domain: str | None = Field(default=None, description="Predefined-context partition")
+    role: str | None = Field(default=None, description="Optional role narrowing the predefined context")
+
+
+class RAGBatchRequest(BaseModel):
+    """Incoming request for the batch RAG endpoint."""
+    items: list[RAGBatchItem] = Field(..., description="Messages to answer")
+    store_memory: bool = Field(default=False, description="Store extracted memories while answering")
+
+
+class RAGBatchResult(BaseModel):
+    """Answer (or error) for one batch item, in input order."""
+    user_id: str
+    message: str
+    answer: str | None = None
+    sources: list[dict] = Field(default_factory=list)
+    error: str | None = None
+    latency_ms: float = 0.0
+
+
+class RAGBatchResponse(BaseModel):
+    """Response returned by the batch RAG endpoint."""
+    results: list[RAGBatchResult]
+    elapsed_ms: float = Field(..., description="Wall time for the whole batch")
+
+
+class InterviewStartRequest(BaseModel):
+    """Incoming request to start a text interview session."""
+    user_id: str = Field(..., description="Unique user identifier")
+    role: str = Field(..., description="Target role, e.g. 'Backend Developer'")
+    experience: int = Field(default=0, ge=0, description="Years of experience")
+    job_description: str = Field(default="", description="Job description or comma-separated skills")
+    difficulty: str = Field(default="medium", description="easy | medium | hard")
+
+
+class InterviewQuestion(BaseModel):
+    """A single interview question."""
+    question: str = Field(..., description="Question text")
+    skill: str = Field(default="general", description="Skill the question targets")
+    difficulty: str = Field(default="medium", description="easy | medium | hard")
+
+
+class InterviewStartResponse(BaseModel):
+    """Questions served when an interview session starts."""
+    session_id: str = Field(..., description="Interview session identifier")
+    questions: list[InterviewQuestion] = Field(default_factory=list, description="Personalized questions")
+    cached: bool = Field(default=False, description="True if served from the question-set cache")
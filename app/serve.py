@@ -0,0 +1,355 @@
+# app/serve.py
+"""
+Production server:  python -m app.serve
+
+  - worker count from the CPU quota (cgroup aware) and the memory limit
+    (SERVE_WORKERS overrides it)
+  - gunicorn master + uvicorn workers on uvloop / httptools
+  - each worker builds its own clients and runs the warmup hook
+    (app.main._warmup) before it accepts connections
+  - workers recycle after SERVE_MAX_REQUESTS (+ random jitter so they do
+    not restart together): the worker stops accepting, finishes in-flight
+    requests (SERVE_GRACEFUL_TIMEOUT) and exits, and gunicorn forks a
+    fresh one while the others keep serving. With a single worker
+    recycling is off, since nothing would serve during the restart
+  - LLM / embedding rate limits are per process, so with
+    SERVE_SPLIT_QUOTAS they are divided among the workers
+
+With --affinity (SERVE_AFFINITY) the workers are uvicorn processes on
+loopback ports behind a consistent-hash router (app.affinity) on the
+public port: every request of a user goes to the same worker, so its
+per-user state cache (USER_CACHE_ENABLED, switched on here) serves most
+reads without Redis / Qdrant round trips. Dead or recycled workers are
+restarted on the same port; their users fail over meanwhile. The router
+is one process: it adds a loopback hop and caps throughput at what one
+core can proxy.
+
+    python -m app.serve --print-plan      # show the derived settings and exit
+    python -m app.serve --workers 4
+    python -m app.serve --workers 4 --affinity
+
+Without gunicorn (e.g. on Windows) it falls back to a single uvicorn
+process.
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import socket
+import argparse
+import threading
+import importlib.util
+import multiprocessing
+
+from app.config import settings
+
+APP_PATH = "app.main:app"
+
+
+# ------------------------------------------------------------
+# RESOURCE DETECTION
+# ------------------------------------------------------------
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_quota() -> float:
+    """CPUs this process may use: cgroup v2 / v1 quota, else the affinity mask."""
+    raw = _read("/sys/fs/cgroup/cpu.max")
+    if raw and not raw.startswith("max"):
+        quota, period = raw.split()[:2]
+        return int(quota) / int(period)
+
+    quota, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+
+    try:
+        return float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return float(os.cpu_count() or 1)
+
+
+def memory_limit_mb() -> int | None:
+    """cgroup memory limit, else physical memory (MB)."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        raw = _read(path)
+        if raw and raw.isdigit() and int(raw) < 1 << 50:        # v1 reports ~2^63 for "unlimited"
+            return int(raw) // (1024 * 1024)
+
+    meminfo = _read("/proc/meminfo")
+    if meminfo:
+        for line in meminfo.splitlines():
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) // 1024
+    return None
+
+
+def plan_workers(requested: int | None = None) -> dict:
+    """
+    Two workers per CPU (handlers mostly wait on Gemini / Qdrant / Redis,
+    but prompt building, JSON and NumPy scoring hold the GIL), bounded by
+    80% of memory / SERVE_WORKER_MEMORY_MB and SERVE_MAX_WORKERS.
+    """
+    cpus = cpu_quota()
+    mem = memory_limit_mb()
+    requested = requested if requested is not None else settings.SERVE_WORKERS
+
+    if requested > 0:
+        return {"workers": requested, "cpus": cpus, "memory_mb": mem, "reason": "SERVE_WORKERS"}
+
+    by_cpu = max(1, math.ceil(cpus * 2))
+    by_mem = max(1, int(mem * 0.8) // settings.SERVE_WORKER_MEMORY_MB) if mem else by_cpu
+    workers = max(1, min(by_cpu, by_mem, settings.SERVE_MAX_WORKERS))
+
+    reason = "cpu" if workers == by_cpu else "memory" if workers == by_mem else "SERVE_MAX_WORKERS"
+    return {"workers": workers, "cpus": cpus, "memory_mb": mem, "reason": reason}
+
+
+def split_quotas(workers: int) -> dict:
+    """Per-worker rate limits; set before workers import the schedulers."""
+    if not settings.SERVE_SPLIT_QUOTAS or workers <= 1:
+        return {}
+
+    per_worker = {
+        "LLM_RATE_PER_MINUTE": settings.LLM_RATE_PER_MINUTE / workers,
+        "EMBED_RATE_PER_MINUTE": settings.EMBED_RATE_PER_MINUTE / workers,
+    }
+    for name, value in per_worker.items():
+        setattr(settings, name, value)          # forked workers inherit the settings object
+        os.environ[name] = str(value)           # and anything that re-reads the environment
+    return per_worker
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options(plan: dict, host: str, port: int) -> dict:
+    max_requests = settings.SERVE_MAX_REQUESTS if plan["workers"] > 1 else 0
+    return {
+        "bind": f"{host}:{port}",
+        "workers": plan["workers"],
+        "worker_class": "app.serve.TunedUvicornWorker",
+        "backlog": settings.SERVE_BACKLOG,
+        "keepalive": settings.SERVE_KEEPALIVE_SECONDS,
+        "max_requests": max_requests,
+        "max_requests_jitter": settings.SERVE_MAX_REQUESTS_JITTER if max_requests else 0,
+        "graceful_timeout": settings.SERVE_GRACEFUL_TIMEOUT,
+        # long Gemini calls are normal; the scheduler's queue timeout bounds them
+        "timeout": max(120, int(settings.SCHEDULER_QUEUE_TIMEOUT_SECONDS) * 4),
+        # app imported per worker, after fork: each gets its own sockets / threads
+        "preload_app": False,
+        "accesslog": None,
+        "errorlog": "-",
+    }
+
+
+# ------------------------------------------------------------
+# GUNICORN
+# ------------------------------------------------------------
+if _available("gunicorn"):
+    from uvicorn.workers import UvicornWorker
+
+    class TunedUvicornWorker(UvicornWorker):
+        # uvloop / httptools when installed (uvicorn[standard]), else the pure-Python ones
+        CONFIG_KWARGS = {
+            "loop": "uvloop" if _available("uvloop") else "asyncio",
+            "http": "httptools" if _available("httptools") else "h11",
+            "lifespan": "on",               # warmup runs before the worker accepts
+        }
+
+
+def _run_gunicorn(options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    class _Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.main import app
+            return app
+
+    _Server().run()
+
+
+def _run_uvicorn(options: dict):
+    import uvicorn
+
+    host, port = options["bind"].rsplit(":", 1)
+    uvicorn.run(
+        APP_PATH,
+        host=host,
+        port=int(port),
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        backlog=options["backlog"],
+        timeout_keep_alive=options["keepalive"],
+        timeout_graceful_shutdown=options["graceful_timeout"],
+    )
+
+
+# ------------------------------------------------------------
+# AFFINITY (router + one uvicorn process per worker)
+# ------------------------------------------------------------
+def _serve_worker(port: int, max_requests: int):
+    import uvicorn
+
+    uvicorn.run(
+        APP_PATH,
+        host="127.0.0.1",
+        port=port,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        lifespan="on",
+        timeout_keep_alive=settings.SERVE_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVE_GRACEFUL_TIMEOUT,
+        limit_max_requests=max_requests or None,
+        access_log=False,
+    )
+
+
+def _wait_port(port: int, timeout: float = 120.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class _Workers:
+    """Forked uvicorn workers on fixed loopback ports, restarted when they exit."""
+
+    def __init__(self, ports: list):
+        self.ports = ports
+        self.ctx = multiprocessing.get_context("fork")      # inherit settings / patched modules like gunicorn
+        self.procs = {}
+        self._stop = threading.Event()
+
+    def _max_requests(self) -> int:
+        if not settings.SERVE_MAX_REQUESTS or len(self.ports) == 1:
+            return 0
+        return settings.SERVE_MAX_REQUESTS + random.randint(0, settings.SERVE_MAX_REQUESTS_JITTER)
+
+    def spawn(self, port: int):
+        proc = self.ctx.Process(target=_serve_worker, args=(port, self._max_requests()), name=f"worker-{port}")
+        proc.start()
+        self.procs[port] = proc
+
+    def start(self):
+        for port in self.ports:
+            self.spawn(port)
+        threading.Thread(target=self._watch, name="worker-watch", daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(1.0):
+            for port, proc in list(self.procs.items()):
+                if not proc.is_alive():
+                    print(f"♻️ Worker on :{port} exited ({proc.exitcode}), restarting")
+                    self.spawn(port)
+
+    def stop(self):
+        self._stop.set()
+        for proc in self.procs.values():
+            proc.terminate()
+        for proc in self.procs.values():
+            proc.join(timeout=settings.SERVE_GRACEFUL_TIMEOUT)
+
+
+def _run_affinity(options: dict):
+    import uvicorn
+
+    # workers own their users: the per-user cache is safe (set before forking)
+    settings.USER_CACHE_ENABLED = True
+    os.environ["USER_CACHE_ENABLED"] = "true"
+    from app.affinity import AffinityRouter, user_cache
+    user_cache.enabled = True
+
+    host, port = options["bind"].rsplit(":", 1)
+    base = settings.AFFINITY_BASE_PORT or int(port) + 1
+    ports = [base + i for i in range(options["workers"])]
+
+    workers = _Workers(ports)
+    workers.start()
+    try:
+        for p in ports:
+            if not _wait_port(p):
+                raise RuntimeError(f"worker on :{p} did not start")
+        print(f"🧭 Affinity router on {options['bind']} → {len(ports)} workers on :{ports[0]}-{ports[-1]}")
+
+        router = AffinityRouter(
+            {f"w{i}": f"http://127.0.0.1:{p}" for i, p in enumerate(ports)},
+            vnodes=settings.AFFINITY_VNODES,
+            down_seconds=settings.AFFINITY_NODE_DOWN_SECONDS,
+            timeout=options["timeout"],
+        )
+        uvicorn.run(
+            router,
+            host=host,
+            port=int(port),
+            loop="uvloop" if _available("uvloop") else "asyncio",
+            http="httptools" if _available("httptools") else "h11",
+            lifespan="on",
+            backlog=options["backlog"],
+            timeout_keep_alive=options["keepalive"],
+            access_log=False,
+        )
+    finally:
+        workers.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with the production server profile")
+    parser.add_argument("--workers", type=int, default=None, help="Override SERVE_WORKERS")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--affinity", action="store_true", default=settings.SERVE_AFFINITY,
+                        help="Route each user to one worker (consistent hash) and cache per-user state")
+    parser.add_argument("--print-plan", action="store_true", help="Print the derived settings and exit")
+    args = parser.parse_args(argv)
+
+    plan = plan_workers(args.workers)
+    options = server_options(plan, args.host, args.port)
+    use_gunicorn = _available("gunicorn") and sys.platform != "win32" and not args.affinity
+    if args.affinity and sys.platform == "win32":
+        print("⚠️ --affinity needs fork: serving with one uvicorn process")
+        args.affinity = False
+    if settings.USER_CACHE_ENABLED and not args.affinity and plan["workers"] > 1:
+        print("⚠️ USER_CACHE_ENABLED without --affinity: only safe if the load balancer hashes on X-User-Id")
+    if not use_gunicorn and not args.affinity and plan["workers"] > 1:
+        print("⚠️ gunicorn not available: serving with one uvicorn process (no recycling)")
+        plan["workers"] = options["workers"] = 1
+    quotas = split_quotas(plan["workers"])
+
+    server = "affinity router" if args.affinity else "gunicorn" if use_gunicorn else "uvicorn"
+    print(f"🚀 {plan['workers']} worker(s) [{plan['reason']}; {plan['cpus']:g} CPU, "
+          f"{plan['memory_mb']} MB] on {options['bind']} via {server}")
+    if quotas:
+        print("   per-worker quotas: " + ", ".join(f"{k}={v:g}" for k, v in quotas.items()))
+    if args.print_plan:
+        for key, value in options.items():
+            print(f"   {key} = {value}")
+        return 0
+
+    if args.affinity:
+        _run_affinity(options)
+    elif use_gunicorn:
+        _run_gunicorn(options)
+    else:
+        _run_uvicorn(options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
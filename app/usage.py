@@ -0,0 +1,374 @@
+# app/usage.py
+
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.metrics import metrics
+
+
+SYSTEM_USER = "_system"     # work outside any request (warmup, compaction, flushes)
+OTHER_USER = "_other"       # users evicted from the top-K sketch
+
+FIELDS = (
+    "requests", "wall_ms",
+    "llm_calls", "input_tokens", "output_tokens", "cached_tokens",
+    "embed_calls", "embed_texts", "embed_tokens",
+    "qdrant_ops", "redis_ops",
+    "cost_usd",
+)
+
+# (user_id, stage) of the code running in this thread / task
+_scope: ContextVar = ContextVar("usage_scope", default=(SYSTEM_USER, "background"))
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def cost_of(counters: dict) -> float:
+    """Estimated USD from token counts (USAGE_PRICE_* per 1M tokens)."""
+    cached = counters.get("cached_tokens", 0)
+    uncached = max(0, counters.get("input_tokens", 0) - cached)     # prompt_token_count includes cached
+    return (
+        uncached * settings.USAGE_PRICE_INPUT_PER_MTOK
+        + cached * settings.USAGE_PRICE_CACHED_PER_MTOK
+        + counters.get("output_tokens", 0) * settings.USAGE_PRICE_OUTPUT_PER_MTOK
+        + counters.get("embed_tokens", 0) * settings.USAGE_PRICE_EMBED_PER_MTOK
+    ) / 1_000_000
+
+
+# ------------------------------------------------------------
+# HEAVY HITTERS
+# ------------------------------------------------------------
+class SpaceSaving:
+    """
+    Weighted Space-Saving sketch: keeps at most `capacity` keys.
+
+    A new key arriving when full replaces the lightest one and inherits its
+    weight as `error` (its true weight is between weight - error and
+    weight), so every key heavier than total / capacity is guaranteed to be
+    tracked. Counters of evicted keys are folded into `other`, so totals
+    stay exact.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.entries = {}           # key -> [weight, error, Counter]
+        self.other = Counter()
+
+    def add(self, key: str, weight: float, counters: dict):
+        entry = self.entries.get(key)
+        if entry is None:
+            floor = 0.0
+            if len(self.entries) >= self.capacity:
+                victim = min(self.entries, key=lambda k: self.entries[k][0])
+                floor, _, evicted = self.entries.pop(victim)
+                self.other.update(evicted)
+            entry = self.entries[key] = [floor, floor, Counter()]
+        entry[0] += weight
+        entry[2].update(counters)
+
+    def top(self, n: int) -> list:
+        ranked = sorted(self.entries.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [(key, weight, error, counters) for key, (weight, error, counters) in ranked]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# ------------------------------------------------------------
+# TRACKER
+# ------------------------------------------------------------
+class UsageTracker:
+    """
+    Per-user / per-stage accounting of LLM tokens, embedding calls, Qdrant
+    and Redis operations and wall time.
+
+    Callers never pass the user around: `scope(user_id)` / `stage(name)`
+    set a context variable and every `add()` below them (Gemini client,
+    embedding generator, counted Qdrant / Redis clients) is attributed to
+    it. Thread pools must submit with `contextvars.copy_context().run`.
+
+    In memory, users are bounded by a top-K SpaceSaving sketch (ranked by
+    estimated cost) and stages are code constants. A daemon thread adds
+    the deltas to Redis every `flush_seconds`, one set of keys per UTC day:
+      - usage:{day}:user:{user_id}  hash of counters (also the budget ledger)
+      - usage:{day}:top             zset user_id -> cost, trimmed to top_k
+      - usage:{day}:stages          hash "{stage}.{field}" -> value
+    """
+
+    def __init__(self, top_k: int = 1000, flush_seconds: float = 10.0, retention_days: int = 35):
+        self.top_k = top_k
+        self.flush_seconds = flush_seconds
+        self.retention_seconds = retention_days * 86400
+        self.enabled = settings.USAGE_ENABLED
+
+        self._lock = threading.Lock()
+        self._users = SpaceSaving(top_k)            # process lifetime
+        self._stages = defaultdict(Counter)
+        self._pending_users = SpaceSaving(top_k)    # since the last flush
+        self._pending_stages = defaultdict(Counter)
+        self._spent = {}                            # user -> (flushed cost today, read at)
+
+        self.r = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------
+    # ATTRIBUTION
+    # ------------------------------------------------------------
+    @staticmethod
+    def current() -> tuple:
+        return _scope.get()
+
+    @contextmanager
+    def scope(self, user_id: str, stage: str = "request", count_request: bool = True):
+        """Attribute everything inside to `user_id`; records the request and its wall time."""
+        token = _scope.set((str(user_id), stage))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+            wall_ms = (time.perf_counter() - start) * 1000.0
+            self.add(user_id=user_id, stage=stage, requests=1 if count_request else 0, wall_ms=wall_ms)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Pipeline stage inside a scope; its wall time counts for the stage only."""
+        user_id, _ = _scope.get()
+        token = _scope.set((user_id, name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+            self._add_stage(name, {"wall_ms": (time.perf_counter() - start) * 1000.0})
+
+    # ------------------------------------------------------------
+    # RECORDING
+    # ------------------------------------------------------------
+    def add(self, user_id: str | None = None, stage: str | None = None, **counters):
+        """Add counters to the current (or given) user and stage."""
+        if not self.enabled:
+            return
+        scope_user, scope_stage = _scope.get()
+        user_id = str(user_id) if user_id else scope_user
+        stage = stage or scope_stage
+
+        counters = {k: v for k, v in counters.items() if v}
+        if not counters:
+            return
+        cost = cost_of(counters)
+        if cost:
+            counters["cost_usd"] = cost
+
+        with self._lock:
+            self._users.add(user_id, cost, counters)
+            self._pending_users.add(user_id, cost, counters)
+            self._stages[stage].update(counters)
+            self._pending_stages[stage].update(counters)
+
+    def _add_stage(self, stage: str, counters: dict):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._stages[stage].update(counters)
+            self._pending_stages[stage].update(counters)
+
+    # ------------------------------------------------------------
+    # BUDGETS
+    # ------------------------------------------------------------
+    def spent_today(self, user_id: str) -> float:
+        """Flushed cost (re-read at most every flush_seconds) + this worker's unflushed cost."""
+        user_id = str(user_id)
+        now = time.monotonic()
+        cached = self._spent.get(user_id)
+        if cached is None or now - cached[1] > self.flush_seconds:
+            flushed = 0.0
+            if self.r is not None:
+                try:
+                    flushed = float(self.r.hget(self._user_key(self._day(), user_id), "cost_usd") or 0.0)
+                except Exception as e:
+                    print("⚠️ Usage budget read failed:", e)
+            cached = self._spent[user_id] = (flushed, now)
+
+        with self._lock:
+            entry = self._pending_users.entries.get(user_id)
+            pending = entry[2].get("cost_usd", 0.0) if entry else 0.0
+        return cached[0] + pending
+
+    def over_budget(self, user_id: str) -> bool:
+        budget = settings.USAGE_DAILY_BUDGET_USD
+        if not self.enabled or budget <= 0:
+            return False
+        if self.spent_today(user_id) < budget:
+            return False
+        metrics.incr("usage.budget_rejected")
+        return True
+
+    # ------------------------------------------------------------
+    # FLUSH (daemon thread)
+    # ------------------------------------------------------------
+    @staticmethod
+    def _day() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _user_key(day: str, user_id: str) -> str:
+        return f"usage:{day}:user:{user_id}"
+
+    def start(self, redis_client) -> bool:
+        if not self.enabled or self._thread is not None:
+            return False
+        self.r = redis_client
+        self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+        self._thread.start()
+        print(f"🧾 Usage accounting on (top {self.top_k} users, flush every {self.flush_seconds:g}s)")
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Final flush (call on shutdown)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            users, self._pending_users = self._pending_users, SpaceSaving(self.top_k)
+            stages, self._pending_stages = self._pending_stages, defaultdict(Counter)
+        if self.r is None or (not users and not users.other and not stages):
+            return
+
+        day = self._day()
+        rows = [(user_id, counters) for user_id, _, _, counters in users.top(len(users))]
+        if users.other:
+            rows.append((OTHER_USER, users.other))
+
+        try:
+            with metrics.timed("usage.flush"):
+                pipe = self.r.pipeline(transaction=False)
+                for user_id, counters in rows:
+                    key = self._user_key(day, user_id)
+                    for field, value in counters.items():
+                        pipe.hincrbyfloat(key, field, value)
+                    pipe.expire(key, self.retention_seconds)
+                    if counters.get("cost_usd"):
+                        pipe.zincrby(f"usage:{day}:top", counters["cost_usd"], user_id)
+                pipe.zremrangebyrank(f"usage:{day}:top", 0, -(self.top_k + 1))
+                pipe.expire(f"usage:{day}:top", self.retention_seconds)
+                for stage, counters in stages.items():
+                    for field, value in counters.items():
+                        pipe.hincrbyfloat(f"usage:{day}:stages", f"{stage}.{field}", value)
+                pipe.expire(f"usage:{day}:stages", self.retention_seconds)
+                pipe.execute()
+            self._spent.clear()
+            metrics.incr("usage.flushes")
+        except Exception as e:
+            print("⚠️ Usage flush failed, keeping deltas for the next cycle:", e)
+            metrics.incr("usage.flush_errors")
+            with self._lock:
+                for user_id, counters in rows:
+                    self._pending_users.add(user_id, counters.get("cost_usd", 0.0), counters)
+                for stage, counters in stages.items():
+                    self._pending_stages[stage].update(counters)
+
+    # ------------------------------------------------------------
+    # READING
+    # ------------------------------------------------------------
+    @staticmethod
+    def _row(user_id: str, counters: dict, **extra) -> dict:
+        row = {"user_id": user_id, **extra}
+        row.update({f: round(float(counters.get(f, 0)), 6 if f == "cost_usd" else 1) for f in FIELDS})
+        return row
+
+    def process_snapshot(self, top: int = 20) -> dict:
+        """This worker since start: top users (with SpaceSaving error bound) and stages."""
+        with self._lock:
+            users = [
+                self._row(user_id, counters, error_usd=round(error, 6))
+                for user_id, _, error, counters in self._users.top(top)
+            ]
+            other = dict(self._users.other)
+            stages = {name: dict(c) for name, c in self._stages.items()}
+        return {
+            "top_users": users,
+            "other": self._row(OTHER_USER, other),
+            "stages": {name: {k: round(v, 3) for k, v in c.items()} for name, c in stages.items()},
+        }
+
+    def report(self, top: int = 20, day: str | None = None) -> dict:
+        """All workers, from Redis (flushed data only)."""
+        day = day or self._day()
+        out = {"day": day, "top_users": [], "stages": {}}
+        if self.r is None:
+            return out
+
+        ranked = [_text(u) for u in self.r.zrevrange(f"usage:{day}:top", 0, top - 1)]
+        pipe = self.r.pipeline(transaction=False)
+        for user_id in ranked:
+            pipe.hgetall(self._user_key(day, user_id))
+        pipe.hgetall(f"usage:{day}:stages")
+        *user_rows, stage_rows = pipe.execute()
+
+        out["top_users"] = [
+            self._row(user_id, {_text(k): float(v) for k, v in row.items()})
+            for user_id, row in zip(ranked, user_rows)
+        ]
+        for name, value in (stage_rows or {}).items():
+            stage, field = _text(name).rsplit(".", 1)
+            out["stages"].setdefault(stage, {})[field] = round(float(value), 3)
+        return out
+
+
+# ------------------------------------------------------------
+# COUNTED CLIENTS
+# ------------------------------------------------------------
+class CountedClient:
+    """
+    Proxy that adds one `field` (e.g. qdrant_ops) to the current usage
+    scope per method call. A Redis pipeline counts once, when created
+    (one round trip on execute).
+    """
+
+    def __init__(self, target, field: str, tracker: "UsageTracker"):
+        self._target = target
+        self._field = field
+        self._tracker = tracker
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        field, tracker = self._field, self._tracker
+
+        def call(*args, **kwargs):
+            tracker.add(**{field: 1})
+            return attr(*args, **kwargs)
+
+        self.__dict__[name] = call          # next lookup skips __getattr__
+        return call
+
+
+def count_ops(client, field: str):
+    return CountedClient(client, field, usage) if settings.USAGE_ENABLED else client
+
+
+# Singleton instance available everywhere
+usage = UsageTracker(
+    top_k=settings.USAGE_TOP_K,
+    flush_seconds=settings.USAGE_FLUSH_SECONDS,
+    retention_days=settings.USAGE_RETENTION_DAYS,
+)
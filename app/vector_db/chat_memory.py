@@ -1,57 +1,231 @@
 # app/vector_db/chat_memory.py
 
 import json
+import time
 import redis
-from typing import List, Dict
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Protocol
 from app.config import settings
+from app.metrics import metrics
+from app.usage import count_ops
+from app.affinity import user_cache
+
+
+def create_redis_client():
+    """Shared Redis connection factory (Redis Cloud, TLS-compatible)."""
+    try:
+        r = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            ssl_cert_reqs=None,        # Works for Redis Cloud TLS
+            decode_responses=True
+        )
+        r.ping()
+        print("🔌 Connected to Redis Cloud!")
+    except Exception as e:
+        print("❌ Redis connection error:", e)
+        raise e
+
+    # every call is attributed to the current user / stage (app.usage)
+    return count_ops(r, "redis_ops")
+
+
+# user_id -> time of the user's last chat turn (sorted set, no TTL); the
+# compaction worker reads it to tell inactive users from quiet ones
+ACTIVITY_KEY = "chat_activity"
+
+
+def last_active(r, user_ids, chunk: int = 1000) -> dict:
+    """{user_id: epoch seconds of the last chat turn} for users that have one."""
+    user_ids = list(user_ids)
+    out = {}
+    for i in range(0, len(user_ids), chunk):
+        part = user_ids[i:i + chunk]
+        for user_id, score in zip(part, r.zmscore(ACTIVITY_KEY, part)):
+            if score is not None:
+                out[user_id] = int(score)
+    return out
+
+
+class Summarizer(Protocol):
+    """Folds evicted turns into the previous summary (GeminiClient.summarize_conversation)."""
+
+    def __call__(self, previous_summary: str, turns: List[Dict], user_id: str | None = None) -> str: ...
 
 
 class ChatMemory:
     """
     Short-term conversation memory stored in Redis with TTL.
     Uses Redis Cloud (TLS-compatible).
+
+    Tiered window:
+      - chat_memory:{user}   last `max_turns` raw turns (newest first)
+      - chat_summary:{user}  running summary of turns evicted from the window
+      - chat_evicted:{user}  evicted turns waiting to be folded into the summary
+      - chat_version:{user}  bumped with every window / summary write
+      - chat_activity        last turn time per user (ACTIVITY_KEY, same pipeline)
+
+    Eviction never blocks the request: evicted turns are queued and a
+    background worker folds them into the summary with `summarizer`.
+
+    With user affinity (USER_CACHE_ENABLED) reads are served from the
+    worker's user_cache "window" entry. Every write here re-reads the window
+    in its own transaction and caches it with the new chat_version, and a
+    read caches what it saw with the version it saw, so an older window
+    never replaces a newer one whichever finishes first.
     """
 
-    def __init__(self, max_turns: int = 6):
-        self.max_turns = max_turns
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
 
-        try:
-            self.r = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                password=settings.REDIS_PASSWORD,
-                ssl_cert_reqs=None,        # Works for Redis Cloud TLS
-                decode_responses=True
-            )
-            self.r.ping()
-            print("🔌 Connected to Redis Cloud!")
-        except Exception as e:
-            print("❌ Redis connection error:", e)
-            raise e
+    def __init__(self, max_turns: int = 6, summarizer: Summarizer | None = None):
+        self.max_turns = max_turns
+        self.summarizer = summarizer
+        self.r = create_redis_client()
 
         self.ttl_seconds = getattr(settings, "CHAT_TTL_SECONDS", 3600)
 
     def _key(self, user_id: str):
         return f"chat_memory:{user_id}"
 
+    def _summary_key(self, user_id: str):
+        return f"chat_summary:{user_id}"
+
+    def _evicted_key(self, user_id: str):
+        return f"chat_evicted:{user_id}"
+
+    def _lock_key(self, user_id: str):
+        return f"chat_summary_lock:{user_id}"
+
+    def _version_key(self, user_id: str):
+        return f"chat_version:{user_id}"
+
+    def _cache_window(self, user_id: str, raw, summary, version) -> Tuple[List[Dict], str]:
+        turns, summary = self._decode(raw), summary or ""
+        user_cache.put("window", user_id, (turns, summary), version=int(version or 0))
+        return turns, summary
+
     def _push(self, user_id: str, role: str, text: str):
         key = self._key(user_id)
         data = json.dumps({"role": role, "text": text})
 
         try:
-            self.r.lpush(key, data)
-            self.r.ltrim(key, 0, self.max_turns - 1)
-            self.r.expire(key, self.ttl_seconds)
+            pipe = self.r.pipeline()
+            pipe.lpush(key, data)
+            pipe.lrange(key, self.max_turns, -1)        # turns about to fall out
+            pipe.ltrim(key, 0, self.max_turns - 1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.expire(self._summary_key(user_id), self.ttl_seconds)
+            pipe.zadd(ACTIVITY_KEY, {str(user_id): int(time.time())})
+            pipe.incr(self._version_key(user_id))
+            pipe.expire(self._version_key(user_id), self.ttl_seconds)
+            pipe.lrange(key, 0, self.max_turns - 1)
+            pipe.get(self._summary_key(user_id))
+            _, evicted, *_, version, _, window, summary = pipe.execute()
         except Exception as e:
             print("❌ Redis write failed:", e)
+            user_cache.invalidate(user_id, "window")
+            return
+
+        self._cache_window(user_id, window, summary, version)
+
+        if evicted and self.summarizer:
+            self._queue_eviction(user_id, list(reversed(evicted)))
+
+    # ------------------------------------------------------------
+    # ROLLING SUMMARY (async)
+    # ------------------------------------------------------------
+    def _queue_eviction(self, user_id: str, evicted: List[str]):
+        key = self._evicted_key(user_id)
+        try:
+            pipe = self.r.pipeline()
+            pipe.rpush(key, *evicted)                   # oldest first
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            print("❌ Redis write failed:", e)
+            return
+
+        self._executor.submit(copy_context().run, self._compress, user_id)
+
+    def _compress(self, user_id: str):
+        """Fold queued evicted turns into the running summary (one worker per user)."""
+        lock = self._lock_key(user_id)
+        if not self.r.set(lock, "1", nx=True, ex=60):
+            return          # the current holder drains the queue
+
+        failed = False
+        try:
+            while True:
+                pipe = self.r.pipeline()
+                pipe.lrange(self._evicted_key(user_id), 0, -1)
+                pipe.delete(self._evicted_key(user_id))
+                pending, _ = pipe.execute()
+                if not pending:
+                    break
+
+                turns = []
+                for item in pending:
+                    try:
+                        turns.append(json.loads(item))
+                    except Exception:
+                        pass
 
+                previous = self.r.get(self._summary_key(user_id)) or ""
+                try:
+                    with metrics.timed("chat_memory.compress"):
+                        summary = self.summarizer(previous, turns, user_id=user_id)
+                except Exception as e:
+                    print("⚠️ Rolling summary failed:", e)
+                    # put the turns back (oldest first) so the next eviction retries them
+                    self.r.lpush(self._evicted_key(user_id), *reversed(pending))
+                    failed = True
+                    break
+
+                if summary:
+                    pipe = self.r.pipeline()
+                    pipe.set(self._summary_key(user_id), summary, ex=self.ttl_seconds)
+                    pipe.incr(self._version_key(user_id))
+                    pipe.expire(self._version_key(user_id), self.ttl_seconds)
+                    pipe.lrange(self._key(user_id), 0, self.max_turns - 1)
+                    _, version, _, window = pipe.execute()
+                    self._cache_window(user_id, window, summary, version)
+                    metrics.incr("chat_memory.turns_compressed", len(turns))
+        except Exception as e:
+            print("❌ Rolling summary error:", e)
+            failed = True
+        finally:
+            self.r.delete(lock)
+
+        # turns queued while we were releasing the lock would otherwise wait for the next eviction
+        if not failed and self.r.llen(self._evicted_key(user_id)):
+            self._executor.submit(copy_context().run, self._compress, user_id)
+
+    # ------------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------------
     def add_user(self, user_id: str, message: str):
         self._push(user_id, "user", message)
 
     def add_assistant(self, user_id: str, message: str):
         self._push(user_id, "assistant", message)
 
+    @staticmethod
+    def _decode(raw) -> List[Dict]:
+        out = []
+        for item in reversed(raw or []):
+            try:
+                out.append(json.loads(item))
+            except:
+                pass
+        return out
+
     def get_recent(self, user_id: str) -> List[Dict]:
+        cached = user_cache.get("window", user_id)
+        if cached is not None:
+            return list(cached[0])
+
         key = self._key(user_id)
 
         try:
@@ -60,17 +234,54 @@ class ChatMemory:
             print("❌ Redis read failed:", e)
             return []
 
-        out = []
-        for item in reversed(raw):
-            try:
-                out.append(json.loads(item))
-            except:
-                pass
+        return self._decode(raw)
 
-        return out
+    def get_summary(self, user_id: str) -> str:
+        cached = user_cache.get("window", user_id)
+        if cached is not None:
+            return cached[1]
+
+        try:
+            return self.r.get(self._summary_key(user_id)) or ""
+        except Exception as e:
+            print("❌ Redis read failed:", e)
+            return ""
+
+    def get_context(self, user_id: str) -> Tuple[List[Dict], str]:
+        """Recent raw window + running summary in a single round trip (or none, when cached)."""
+        cached = user_cache.get("window", user_id)
+        if cached is not None:
+            return list(cached[0]), cached[1]
+
+        try:
+            pipe = self.r.pipeline()
+            pipe.lrange(self._key(user_id), 0, self.max_turns - 1)
+            pipe.get(self._summary_key(user_id))
+            pipe.get(self._version_key(user_id))
+            raw, summary, version = pipe.execute()
+        except Exception as e:
+            print("❌ Redis read failed:", e)
+            return [], ""
+
+        turns, summary = self._cache_window(user_id, raw, summary, version)
+        return list(turns), summary
+
+    def get_version(self, user_id: str) -> int:
+        """chat_version: changes whenever the window or summary is written."""
+        try:
+            return int(self.r.get(self._version_key(user_id)) or 0)
+        except Exception as e:
+            print("❌ Redis read failed:", e)
+            return 0
 
     def clear(self, user_id: str):
+        user_cache.invalidate(user_id, "window")
         try:
-            self.r.delete(self._key(user_id))
+            # chat_version is kept so versions keep increasing
+            self.r.delete(
+                self._key(user_id),
+                self._summary_key(user_id),
+                self._evicted_key(user_id),
+            )
         except Exception as e:
             print("❌ Redis delete failed:", e)
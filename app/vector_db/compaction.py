@@ -0,0 +1,216 @@
+# app/vector_db/compaction.py
+
+import time
+from collections import defaultdict
+from typing import List, Dict
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import metrics, _percentile
+from app.vector_db.orm import VectorORM
+from app.vector_db.user_history import UserHistoryManager
+from app.vector_db.chat_memory import ACTIVITY_KEY, create_redis_client, last_active
+
+
+DAY = 86400
+
+
+class MemoryCompactor:
+    """
+    Offline compaction of the user_history collection.
+
+    One pass per run:
+      1) scan payloads (no vectors) and group point ids per user
+      2) stamp legacy points that have no `created_at` with "now", so
+         they age out from the first compaction instead of living forever
+      3) delete every point of users inactive for `inactive_days`: no chat
+         turn (chat_memory's activity set) and no new memory point for that
+         long. Users keep chatting without producing new facts (duplicates
+         are skipped), so points alone would delete active users. Without
+         the activity set (Redis down) this step is skipped.
+      4) expire raw `type=history` points older than `history_days`
+      5) per remaining user: cluster summary vectors (greedy, cosine >=
+         `similarity`) and keep the longest text of each cluster
+
+    Deletes are batched (VectorORM.delete_many). With dry_run nothing is
+    written; the report shows what would be removed.
+    """
+
+    def __init__(
+        self,
+        history: UserHistoryManager | None = None,
+        similarity: float | None = None,
+        history_days: float | None = None,
+        inactive_days: float | None = None,
+        dry_run: bool = False,
+        redis_client=None,
+    ):
+        self.history = history or UserHistoryManager()
+        self.db: VectorORM = self.history.db
+        self.collection = self.db.user_history
+        self.similarity = similarity if similarity is not None else settings.COMPACTION_SUMMARY_SIMILARITY
+        self.history_days = history_days if history_days is not None else settings.HISTORY_RETENTION_DAYS
+        self.inactive_days = inactive_days if inactive_days is not None else settings.INACTIVE_USER_DAYS
+        self.dry_run = dry_run
+        self.r = redis_client
+
+    # ------------------------------------------------------------
+    # SCAN
+    # ------------------------------------------------------------
+    def _scan(self) -> Dict[str, List[dict]]:
+        users = defaultdict(list)
+        for p in self.db.iter_points(self.collection, with_vectors=False):
+            payload = p.payload or {}
+            users[str(payload.get("user_id", ""))].append({
+                "id": p.id,
+                "type": payload.get("type"),
+                "created_at": payload.get("created_at"),
+            })
+        return users
+
+    def _stamp_legacy(self, users: Dict[str, List[dict]], now: int) -> int:
+        legacy = [pt for pts in users.values() for pt in pts if pt["created_at"] is None]
+        for pt in legacy:
+            pt["created_at"] = now
+        if legacy and not self.dry_run:
+            self.db.set_payload(self.collection, {"created_at": now}, [pt["id"] for pt in legacy])
+        return len(legacy)
+
+    def _activity(self, user_ids) -> Dict[str, int] | None:
+        """Last chat turn per user; None when it cannot be read."""
+        try:
+            if self.r is None:
+                self.r = create_redis_client()
+            return last_active(self.r, user_ids)
+        except Exception as e:
+            print("⚠️ Chat activity unavailable, not deleting inactive users this run:", e)
+            return None
+
+    # ------------------------------------------------------------
+    # SUMMARY DEDUP
+    # ------------------------------------------------------------
+    @staticmethod
+    def cluster_duplicates(summaries: List[Dict], similarity: float) -> List[List[Dict]]:
+        """Greedy clustering: each summary joins the first cluster whose seed it matches."""
+        clusters, seeds = [], []
+        for s in summaries:
+            vec = np.asarray(s.get("vector") or [], dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            if norm == 0.0:
+                clusters.append([s])
+                seeds.append(None)
+                continue
+            vec = vec / norm
+
+            for i, seed in enumerate(seeds):
+                if seed is not None and seed.shape == vec.shape and float(seed @ vec) >= similarity:
+                    clusters[i].append(s)
+                    break
+            else:
+                clusters.append([s])
+                seeds.append(vec)
+        return clusters
+
+    def _redundant_summaries(self, user_id: str) -> List:
+        summaries = [
+            {"id": p.id, "text": (p.payload or {}).get("text", ""), "vector": p.vector}
+            for p in self.db.iter_points(
+                self.collection, where={"user_id": user_id, "type": "summary"}, with_vectors=True
+            )
+        ]
+        drop = []
+        for cluster in self.cluster_duplicates(summaries, self.similarity):
+            if len(cluster) < 2:
+                continue
+            keep = max(cluster, key=lambda s: len(s["text"]))
+            drop.extend(s["id"] for s in cluster if s is not keep)
+        return drop
+
+    # ------------------------------------------------------------
+    # LATENCY PROBE
+    # ------------------------------------------------------------
+    def _probe_latency(self, user_ids: List[str], samples: int = 20) -> dict:
+        """get_summaries() latency (the per-request user-memory fetch) for a sample of users."""
+        timings = []
+        for user_id in user_ids[:samples]:
+            start = time.perf_counter()
+            self.history.get_summaries(user_id)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        timings.sort()
+        return {
+            "p50_ms": round(_percentile(timings, 50), 3),
+            "p95_ms": round(_percentile(timings, 95), 3),
+            "samples": len(timings),
+        }
+
+    # ------------------------------------------------------------
+    # ENTRY POINT
+    # ------------------------------------------------------------
+    def run(self) -> dict:
+        started = time.perf_counter()
+        now = int(time.time())
+
+        users = self._scan()
+        total_before = sum(len(pts) for pts in users.values())
+        probe_users = sorted(users, key=lambda u: -len(users[u]))
+        latency_before = self._probe_latency(probe_users)
+
+        stamped = self._stamp_legacy(users, now)
+
+        inactive_cutoff = now - self.inactive_days * DAY
+        history_cutoff = now - self.history_days * DAY
+
+        inactive_ids, expired_ids, duplicate_ids = [], [], []
+        inactive_users = set()
+        activity = self._activity(users)
+
+        for user_id, pts in users.items():
+            last_seen = max(pt["created_at"] for pt in pts)
+            if activity is not None and max(last_seen, activity.get(user_id, 0)) < inactive_cutoff:
+                inactive_users.add(user_id)
+                inactive_ids.extend(pt["id"] for pt in pts)
+                continue
+
+            expired_ids.extend(
+                pt["id"] for pt in pts
+                if pt["type"] == "history" and pt["created_at"] < history_cutoff
+            )
+
+            if sum(1 for pt in pts if pt["type"] == "summary") > 1:
+                duplicate_ids.extend(self._redundant_summaries(user_id))
+
+        if not self.dry_run:
+            for ids in (inactive_ids, expired_ids, duplicate_ids):
+                if ids:
+                    self.db.delete_many(self.collection, ids)
+            if activity is not None:
+                try:
+                    self.r.zremrangebyscore(ACTIVITY_KEY, 0, inactive_cutoff)
+                except Exception as e:
+                    print("⚠️ Chat activity cleanup failed:", e)
+
+        removed = len(inactive_ids) + len(expired_ids) + len(duplicate_ids)
+        metrics.incr("compaction.points_removed", 0 if self.dry_run else removed)
+
+        report = {
+            "dry_run": self.dry_run,
+            "users": len(users),
+            "points_before": total_before,
+            "points_after": total_before - (0 if self.dry_run else removed),
+            "removed": {
+                "inactive_users": len(inactive_users),
+                "inactive_user_points": len(inactive_ids),
+                "expired_history": len(expired_ids),
+                "duplicate_summaries": len(duplicate_ids),
+                "total": removed,
+            },
+            "legacy_points_stamped": stamped,
+            "activity_checked": activity is not None,
+            "summary_fetch_latency": {
+                "before": latency_before,
+                "after": self._probe_latency([u for u in probe_users if u not in inactive_users]),
+            },
+        }
+        report["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return report
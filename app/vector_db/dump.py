@@ -0,0 +1,231 @@
+# app/vector_db/dump.py
+
+import os
+import gzip
+import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict
+
+import numpy as np
+
+from app.vector_db.orm import PREDEFINED_PARTITION_FIELDS, TENANT_FIELD, USER_HISTORY_INDEX_FIELDS
+
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _open(path: str, mode: str, compress: bool):
+    return gzip.open(path, mode, compresslevel=1) if compress else open(path, mode)
+
+
+def _files(compress: bool) -> Dict[str, str]:
+    ext = ".gz" if compress else ""
+    return {
+        "vectors": f"vectors.f32{ext}",
+        "points": f"points.jsonl{ext}",
+        "payload_vectors": f"payload_vectors.f32{ext}",
+    }
+
+
+def _payload_vector_mode(payload: dict, row: np.ndarray):
+    """
+    How to store the payload copy of the vector without losing a bit:
+    "same" (equals the stored vector), "f32" (float32-exact: binary row in
+    payload_vectors), or None (left in the JSON payload).
+    """
+    value = payload.get("vector")
+    if not isinstance(value, list) or len(value) != row.shape[0]:
+        return None, None
+    copy = np.asarray(value, dtype=np.float32)
+    if copy.tolist() != value:
+        return None, None
+    return ("same", None) if np.array_equal(copy, row) else ("f32", copy)
+
+
+# ------------------------------------------------------------
+# EXPORT
+# ------------------------------------------------------------
+def export_collection(db, collection: str, directory: str, compress: bool = False, batch_size: int = 1024) -> Dict:
+    """
+    Stream a collection (vectors included) to `directory`:
+
+      vectors.f32[.gz]          float32 rows [count, dim], exactly as stored
+      points.jsonl[.gz]         one {"id", "payload"} per row, same order
+      payload_vectors.f32[.gz]  payload "vector" copies (user_history), see below
+      manifest.json             collection, count, dim, model, CRC32s — written last
+
+    Pages through the collection with scroll offsets (VectorORM.iter_points),
+    so memory stays at one page. The payload copy of the vector kept on
+    user_history points is not written as JSON text when it can be stored
+    exactly in binary (_payload_vector_mode); rows then carry
+    "payload_vector": "same" | "f32" and import restores it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = _files(compress)
+    count = skipped = 0
+    dim = model = None
+    crc = dict.fromkeys(files, 0)
+    start = time.perf_counter()
+
+    with _open(os.path.join(directory, files["vectors"]), "wb", compress) as vf, \
+            _open(os.path.join(directory, files["points"]), "wb", compress) as pf, \
+            _open(os.path.join(directory, files["payload_vectors"]), "wb", compress) as xf:
+        for p in db.iter_points(collection, with_vectors=True, batch_size=batch_size):
+            vector = p.vector
+            if isinstance(vector, dict):            # named vectors: the default one only
+                vector = vector.get("")
+            if not vector:
+                skipped += 1
+                continue
+
+            row = np.asarray(vector, dtype=np.float32)
+            if dim is None:
+                dim = int(row.shape[0])
+            if row.shape != (dim,):
+                skipped += 1
+                continue
+
+            payload = dict(p.payload or {})
+            model = model or payload.get("embedding_model")
+            record = {"id": p.id, "payload": payload}
+            mode, copy = _payload_vector_mode(payload, row)
+            if mode:
+                del payload["vector"]
+                record["payload_vector"] = mode
+            if copy is not None:
+                extra = copy.tobytes()
+                xf.write(extra)
+                crc["payload_vectors"] = zlib.crc32(extra, crc["payload_vectors"])
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+            blob = row.tobytes()
+            vf.write(blob)
+            pf.write(line)
+            crc["vectors"] = zlib.crc32(blob, crc["vectors"])
+            crc["points"] = zlib.crc32(line, crc["points"])
+            count += 1
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "collection": collection,
+        "count": count,
+        "skipped": skipped,
+        "dim": dim or 0,
+        "model": model,
+        "compressed": compress,
+        "files": files,
+        "crc32": crc,
+        "created_at": time.time(),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+    return manifest
+
+
+# ------------------------------------------------------------
+# IMPORT
+# ------------------------------------------------------------
+def read_manifest(directory: str) -> Dict:
+    with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported dump format {manifest.get('format')} in {directory}")
+    return manifest
+
+
+def iter_dump(directory: str, manifest: Dict | None = None):
+    """Yield {"id", "text", "embedding", "metadata"} rows (VectorORM.insert_many items), checking CRCs."""
+    manifest = manifest or read_manifest(directory)
+    files, compress, dim = manifest["files"], manifest["compressed"], manifest["dim"]
+    row_bytes = dim * 4
+    crc = dict.fromkeys(files, 0)
+
+    def read_row(f, name):
+        blob = f.read(row_bytes)
+        if len(blob) != row_bytes:
+            raise ValueError(f"{directory}: {files[name]} ends before {files['points']}")
+        crc[name] = zlib.crc32(blob, crc[name])
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    with _open(os.path.join(directory, files["vectors"]), "rb", compress) as vf, \
+            _open(os.path.join(directory, files["points"]), "rb", compress) as pf, \
+            _open(os.path.join(directory, files["payload_vectors"]), "rb", compress) as xf:
+        for line in pf:
+            crc["points"] = zlib.crc32(line, crc["points"])
+            vector = read_row(vf, "vectors")
+
+            record = json.loads(line)
+            payload = record["payload"]
+            mode = record.get("payload_vector")
+            if mode == "same":
+                payload["vector"] = vector
+            elif mode == "f32":
+                payload["vector"] = read_row(xf, "payload_vectors")
+            yield {"id": record["id"], "text": payload.get("text", ""), "embedding": vector, "metadata": payload}
+
+    if crc != manifest["crc32"]:
+        raise ValueError(f"{directory}: checksum mismatch, the dump is corrupt or truncated")
+
+
+def import_collection(
+    db,
+    directory: str,
+    collection: str | None = None,
+    batch_size: int = 512,
+    workers: int = 4,
+) -> Dict:
+    """
+    Re-upsert a dump into `collection` (default: the exported name) with
+    `workers` batches in flight. Point ids are kept, so re-running an
+    interrupted import is safe. Never calls the embedding API. CRCs are
+    checked as the stream ends: a corrupt dump raises after the batches
+    before it were written (re-run from a good dump).
+
+    The collection is created when missing (user_history gets its shard /
+    HNSW options) and otherwise must hold the same vector space; it gets
+    the payload indexes of the collection the dump came from.
+    """
+    manifest = read_manifest(directory)
+    collection = collection or manifest["collection"]
+    options = db._user_history_options() if collection == db.user_history else None
+    db._ensure_collection(collection, dim=manifest["dim"], model=manifest["model"], options=options)
+    if db.user_history in (collection, manifest["collection"]):
+        db._ensure_payload_index(collection, USER_HISTORY_INDEX_FIELDS, tenant_field=TENANT_FIELD)
+    else:
+        db._ensure_payload_index(collection, PREDEFINED_PARTITION_FIELDS)
+
+    start = time.perf_counter()
+    imported = 0
+    pending = set()
+
+    def flush(batch):
+        db.insert_many(collection, batch, batch_size=len(batch))
+        return len(batch)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dump-import") as pool:
+        batch = []
+        for item in iter_dump(directory, manifest):
+            batch.append(item)
+            if len(batch) < batch_size:
+                continue
+            pending.add(pool.submit(flush, batch))
+            batch = []
+            if len(pending) >= workers * 2:        # bounded read-ahead
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                imported += sum(f.result() for f in done)
+        if batch:
+            pending.add(pool.submit(flush, batch))
+        imported += sum(f.result() for f in pending)
+
+    return {
+        "collection": collection,
+        "imported": imported,
+        "expected": manifest["count"],
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
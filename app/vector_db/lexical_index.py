@@ -0,0 +1,196 @@
+# app/vector_db/lexical_index.py
+
+import re
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Iterable
+
+from app.vector_db.orm import payload_matches
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9.+#]*[a-z0-9+#]|[a-z0-9]")
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "so", "to", "of", "in",
+    "on", "for", "with", "at", "by", "from", "as", "is", "are", "was", "were",
+    "be", "been", "am", "i", "me", "my", "you", "your", "we", "our", "it", "its",
+    "this", "that", "these", "those", "do", "does", "did", "how", "what", "which",
+    "can", "could", "should", "would", "will", "want", "need", "about", "some",
+    "any", "into", "than", "too", "very", "just", "also", "not", "no", "yes",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens that keep tech names intact:
+    'Node.js' -> ['node.js', 'nodejs'], 'C++' -> ['c++'].
+    """
+    out = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if tok in _STOPWORDS:
+            continue
+        out.append(tok)
+        if "." in tok:
+            out.append(tok.replace(".", ""))
+    return out
+
+
+# ----------------------- BM25 INDEX ------------------------
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+    Documents carry their payload so results look like VectorORM hits.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)    # term -> {doc_idx: tf}
+        self._docs = []                       # [{"text", "metadata"}]
+        self._lengths = []
+        self._total_len = 0
+        self._avg_len = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[Dict]) -> "BM25Index":
+        idx = cls()
+        for d in docs:
+            idx.add(d.get("text", ""), d.get("metadata") or {})
+        return idx
+
+    def add(self, text: str, metadata: Dict):
+        terms = tokenize(text)
+        doc_idx = len(self._docs)
+
+        self._docs.append({"text": text, "metadata": metadata})
+        self._lengths.append(len(terms))
+        for term, tf in Counter(terms).items():
+            self._postings[term][doc_idx] = tf
+
+        # running total: building n documents stays O(total terms)
+        self._total_len += len(terms)
+        self._avg_len = self._total_len / len(self._lengths)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self._docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int = 5, where: Dict | None = None, source: str = "lexical") -> List[Dict]:
+        """
+        BM25 top-k. Each hit also reports 'coverage': the fraction of
+        distinct query terms present in the document.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._docs:
+            return []
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for doc_idx, tf in postings.items():
+                norm = 1 - self.b + self.b * self._lengths[doc_idx] / (self._avg_len or 1.0)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                matched[doc_idx] += 1
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+        out = []
+        for doc_idx, score in ranked:
+            doc = self._docs[doc_idx]
+            if not payload_matches(doc["metadata"], where):
+                continue
+            out.append({
+                "text": doc["text"],
+                "score": score,
+                "coverage": matched[doc_idx] / len(terms),
+                "source": source,
+                "metadata": doc["metadata"],
+            })
+            if len(out) >= limit:
+                break
+
+        return out
+
+
+# --------------- PREDEFINED CORPUS INDEX -------------------
+
+class PredefinedLexicalIndex:
+    """
+    BM25 index over the predefined collection, built from a paged scroll
+    at startup and rebuilt every `refresh_seconds` to pick up re-ingestion.
+
+    The periodic rebuild runs on a daemon thread (one at a time) and swaps
+    the index in when done; search() never scrolls or builds itself.
+    """
+
+    def __init__(self, db, refresh_seconds: int = 300):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._index = BM25Index()
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()
+
+    def refresh(self):
+        idx = BM25Index()
+        try:
+            for p in self.db.iter_points(self.db.predefined):
+                idx.add(p.payload.get("text", ""), p.payload)
+        except Exception as e:
+            print("⚠️ Lexical index build failed:", e)
+            self._built_at = time.monotonic()     # back off until next refresh window
+            return
+
+        # atomic swap — readers keep using the old index until here
+        self._index = idx
+        self._built_at = time.monotonic()
+        print(f"📚 Lexical index built over {len(idx)} predefined chunks")
+
+    def refresh_async(self) -> bool:
+        """Start a background rebuild unless one is already running."""
+        if not self._build_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name="lexical-refresh", daemon=True).start()
+        return True
+
+    def search(self, query: str, limit: int = 5, where: Dict | None = None) -> List[Dict]:
+        if time.monotonic() - self._built_at > self.refresh_seconds:
+            self.refresh_async()
+        return self._index.search(query, limit=limit, where=where, source=self.db.predefined)
+
+
+# ------------------ RECIPROCAL RANK FUSION -------------------
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Fuse ranked lists by text identity: score = sum(1 / (k + rank)).
+    The first occurrence of a document keeps its fields.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, item in enumerate(results, start=1):
+            key = " ".join((item.get("text") or "").lower().split())
+            if not key:
+                continue
+            if key not in fused:
+                fused[key] = {**item, "rrf_score": 0.0}
+            fused[key]["rrf_score"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda x: x["rrf_score"], reverse=True)
@@ -1,5 +1,10 @@
 import uuid
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 from app.config import settings
+from app.usage import count_ops
+from app.embeddings.backends import backend_identity
+from app.vector_db.sharding import ShardRouter
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
     VectorParams,
@@ -8,48 +13,306 @@ from qdrant_client.models import (
     Filter,
     FieldCondition,
     MatchValue,
+    MatchAny,
+    IsEmptyCondition,
+    PayloadField,
+    PayloadSchemaType,
+    PointIdsList,
+    SearchRequest,
+    HnswConfigDiff,
+    ShardingMethod,
 )
 
-EMBEDDING_DIM = 768
+try:
+    from qdrant_client.models import KeywordIndexParams     # is_tenant needs qdrant-client >= 1.11
+except ImportError:
+    KeywordIndexParams = None
+
+# Stored vector width (settings.EMBEDDING_DIM); collections are created with it
+EMBEDDING_DIM = settings.EMBEDDING_DIM
+
+# Payload fields used to route predefined-context searches
+PREDEFINED_PARTITION_FIELDS = ("domain", "role")
+
+# Payload fields used to filter user long-term memory
+USER_HISTORY_INDEX_FIELDS = ("user_id", "type")
+
+# Tenant field of user_history (per-user HNSW graphs, shard routing)
+TENANT_FIELD = "user_id"
+
+
+def payload_matches(payload: dict, where: dict | None) -> bool:
+    """In-process equivalent of VectorORM._build_filter for local indexes."""
+    if not where:
+        return True
+    for k, v in where.items():
+        if v is None:
+            continue
+        allowed = {str(x) for x in v if x is not None} if isinstance(v, (list, tuple, set)) else {str(v)}
+        actual = payload.get(k)
+        if actual in (None, []) and isinstance(v, (list, tuple, set)) and None in v:
+            continue
+        actual = {str(x) for x in actual} if isinstance(actual, list) else {str(actual)}
+        if not allowed & actual:
+            return False
+    return True
 
 
 class VectorORM:
     def __init__(self):
-        self.client = QdrantClient(
+        # every call is attributed to the current user / stage (app.usage)
+        self.client = count_ops(QdrantClient(
             url=settings.QDRANT_URL,
             api_key=settings.QDRANT_API_KEY,
             prefer_grpc=False
-        )
+        ), "qdrant_ops")
 
         self.predefined = settings.PREDEFINED_COLLECTION
         self.user_history = settings.USER_HISTORY_COLLECTION
 
+        # "<model>@<dim>" stamped on every point written through this ORM
+        self.embedding_model = backend_identity()
+
         self._ensure_collection(self.predefined)
-        self._ensure_collection(self.user_history)
+        self._ensure_collection(self.user_history, options=self._user_history_options())
+
+        # Predefined context is partitioned by domain / role; user memory is filtered per user
+        self._ensure_payload_index(self.predefined, PREDEFINED_PARTITION_FIELDS)
+        self._ensure_payload_index(self.user_history, USER_HISTORY_INDEX_FIELDS, tenant_field=TENANT_FIELD)
+
+        # user → shard key routing (None: not custom-sharded, Qdrant spreads points itself)
+        self.router = self._create_router()
 
     # ---------------------------------------------------------
-    # SIMPLE COLLECTION CREATION — NO INDEXES, NO SCHEMA
+    # SIMPLE COLLECTION CREATION
     # ---------------------------------------------------------
-    def _ensure_collection(self, name: str):
+    def _ensure_collection(self, name: str, dim: int | None = None, model: str | None = None,
+                           options: dict | None = None):
+        """
+        Create the collection, or verify an existing one holds the expected
+        vector space (size, and the embedding_model stamped on its points).
+        Explicit `dim` without `model` (reindex / eval targets) skips the model check.
+        `options` (shards, replication, HNSW) only apply when creating.
+        """
+        expected_dim = dim or EMBEDDING_DIM
+        expected_model = model or (self.embedding_model if dim is None else None)
+
         if not self.client.collection_exists(name):
             self.client.create_collection(
                 collection_name=name,
                 vectors_config=VectorParams(
-                    size=EMBEDDING_DIM,
+                    size=expected_dim,
                     distance=Distance.COSINE,
-                )
+                ),
+                **(options or {})
             )
+            return
+
+        self._check_vector_space(name, expected_dim, expected_model)
+
+    def _check_vector_space(self, name: str, dim: int, model: str | None):
+        try:
+            size = getattr(self.client.get_collection(name).config.params.vectors, "size", None)
+            points, _ = self.client.scroll(collection_name=name, limit=1, with_payload=["embedding_model"])
+        except Exception as e:
+            print(f"⚠️ Could not verify vector space of {name}:", e)
+            return
+
+        hint = "re-index with scripts/reindex_embeddings.py or point the settings at a matching collection"
+        if size is not None and size != dim:
+            raise RuntimeError(f"❌ {name} stores {size}-dim vectors but {dim} are configured; {hint}")
+
+        stored = (points[0].payload or {}).get("embedding_model") if points else None
+        if model and stored and stored != model:
+            raise RuntimeError(f"❌ {name} holds '{stored}' vectors but '{model}' is configured; {hint}")
+
+    # ---------------------------------------------------------
+    # USER_HISTORY PARTITIONING (tenant HNSW, shards, shard keys)
+    # ---------------------------------------------------------
+    @staticmethod
+    def _user_history_options() -> dict:
+        options = {
+            "shard_number": settings.USER_HISTORY_SHARDS,
+            "replication_factor": settings.USER_HISTORY_REPLICATION,
+        }
+        if settings.USER_HISTORY_TENANT_HNSW:
+            # per-user graphs via the user_id index; no global graph (searches are always per user)
+            options["hnsw_config"] = HnswConfigDiff(payload_m=16, m=0)
+        if settings.USER_HISTORY_SHARD_KEYS > 0:
+            options["sharding_method"] = ShardingMethod.CUSTOM
+        return options
+
+    def _create_router(self) -> ShardRouter | None:
+        if settings.USER_HISTORY_SHARD_KEYS <= 0:
+            return None
+
+        try:
+            method = self.client.get_collection(self.user_history).config.params.sharding_method
+        except Exception as e:
+            print(f"⚠️ Could not read sharding method of {self.user_history}:", e)
+            method = None
+        if method != ShardingMethod.CUSTOM:
+            print(f"⚠️ {self.user_history} is not custom-sharded (local Qdrant, or created before "
+                  f"USER_HISTORY_SHARD_KEYS was set); per-user routing disabled")
+            return None
+
+        keys = ShardRouter.keys_for("user_shard", settings.USER_HISTORY_SHARD_KEYS)
+        for key in keys:
+            try:
+                self.client.create_shard_key(
+                    collection_name=self.user_history,
+                    shard_key=key,
+                    shards_number=settings.USER_HISTORY_SHARDS,
+                    replication_factor=settings.USER_HISTORY_REPLICATION,
+                )
+            except Exception as e:
+                if "already exists" not in str(e).lower():
+                    print(f"⚠️ Shard key {key} on {self.user_history} failed:", e)
+
+        from app.vector_db.chat_memory import create_redis_client
+        router = ShardRouter(
+            create_redis_client(),
+            self.user_history,
+            keys,
+            refresh_seconds=settings.SHARD_MAP_REFRESH_SECONDS,
+        )
+        print(f"🧩 {self.user_history}: {len(keys)} shard keys, routed per user")
+        return router
+
+    def _shard_key(self, collection, user_id=None, write: bool = False):
+        """
+        shard_key_selector for a call: the user's shard key when known;
+        otherwise every key for writes (deletes by id) and None (= all
+        shards) for reads. None for collections without routing.
+        """
+        if self.router is None or collection != self.user_history:
+            return None
+        if user_id is not None:
+            return self.router.shard_for(user_id)
+        return list(self.router.shard_keys) if write else None
+
+    @staticmethod
+    def _user_of(where):
+        """Single user_id a filter pins down, if any."""
+        value = (where or {}).get(TENANT_FIELD)
+        return None if value is None or isinstance(value, (list, tuple, set)) else value
+
+    # ---------------------------------------------------------
+    # KEYWORD PAYLOAD INDEXES (for filtered search)
+    # ---------------------------------------------------------
+    def _ensure_payload_index(self, collection: str, fields, tenant_field: str | None = None):
+        try:
+            existing = self.client.get_collection(collection).payload_schema or {}
+        except Exception as e:
+            print(f"⚠️ Could not read payload schema for {collection}:", e)
+            existing = {}
+
+        for field in fields:
+            if field in existing:
+                continue
+            schema = PayloadSchemaType.KEYWORD
+            if field == tenant_field and KeywordIndexParams is not None:
+                schema = KeywordIndexParams(type="keyword", is_tenant=True)
+            try:
+                self.client.create_payload_index(
+                    collection_name=collection,
+                    field_name=field,
+                    field_schema=schema,
+                )
+            except Exception as e:
+                print(f"⚠️ Payload index on {collection}.{field} failed:", e)
+
+    @staticmethod
+    def _build_filter(where):
+        """
+        {"field": value} -> Filter; list/tuple values match ANY of them, and a
+        None among them also matches points without the field (legacy points).
+        """
+        if not where:
+            return None
+
+        conditions = []
+        for k, v in where.items():
+            if v is None:
+                continue
+            if isinstance(v, (list, tuple, set)):
+                condition = FieldCondition(key=k, match=MatchAny(any=[str(x) for x in v if x is not None]))
+                if None in v:
+                    condition = Filter(should=[condition, IsEmptyCondition(is_empty=PayloadField(key=k))])
+            else:
+                condition = FieldCondition(key=k, match=MatchValue(value=str(v)))
+            conditions.append(condition)
+
+        return Filter(must=conditions) if conditions else None
 
     # ---------------------------------------------------------
     # INSERT VECTOR
     # ---------------------------------------------------------
     def insert(self, collection, text, embedding, metadata):
+        if not embedding:
+            raise ValueError(f"refusing to insert an empty vector into {collection}")
+
         point = PointStruct(
             id=str(uuid.uuid4()),
             vector=embedding,
-            payload={"text": text, **metadata}
+            payload={"text": text, "embedding_model": self.embedding_model, **metadata}
         )
-        self.client.upsert(collection, [point])
+        self.client.upsert(collection, [point], shard_key_selector=self._upsert_key(collection, metadata))
+
+    def _upsert_key(self, collection, payload: dict):
+        if self.router is None or collection != self.user_history:
+            return None
+        if payload.get(TENANT_FIELD) is None:
+            raise ValueError(f"{collection} is sharded per user; points need a {TENANT_FIELD}")
+        return self.router.shard_for(payload[TENANT_FIELD])
+
+    # ---------------------------------------------------------
+    # INSERT MANY VECTORS (one upsert per batch)
+    # ---------------------------------------------------------
+    def insert_many(self, collection, items, batch_size: int = 128):
+        """
+        items: iterable of {"text", "embedding", "metadata", optional "id"}.
+        Passing a stable "id" makes re-ingestion idempotent.
+        """
+        batches, skipped = {}, 0        # shard key (None: unrouted) -> points
+        for item in items:
+            if not item.get("embedding"):
+                skipped += 1
+                continue
+            payload = {"text": item["text"], "embedding_model": self.embedding_model, **(item.get("metadata") or {})}
+            key = self._upsert_key(collection, payload)
+            batch = batches.setdefault(key, [])
+            batch.append(PointStruct(
+                id=item.get("id") or str(uuid.uuid4()),
+                vector=item["embedding"],
+                payload=payload
+            ))
+            if len(batch) >= batch_size:
+                self.client.upsert(collection, batch, shard_key_selector=key)
+                batches[key] = []
+
+        for key, batch in batches.items():
+            if batch:
+                self.client.upsert(collection, batch, shard_key_selector=key)
+        if skipped:
+            print(f"⚠️ Skipped {skipped} items without an embedding for {collection}")
+
+    # ---------------------------------------------------------
+    # RAW POINT UPSERT (copies between collections / shards)
+    # ---------------------------------------------------------
+    def upsert_points(self, collection, points, shard_key=None, batch_size: int = 256) -> int:
+        """Upsert existing points (id, vector, payload kept as-is) to an explicit shard key."""
+        batch, n = [], 0
+        for p in points:
+            batch.append(PointStruct(id=p.id, vector=p.vector, payload=p.payload or {}))
+            if len(batch) >= batch_size:
+                self.client.upsert(collection, batch, shard_key_selector=shard_key)
+                n += len(batch)
+                batch = []
+        if batch:
+            self.client.upsert(collection, batch, shard_key_selector=shard_key)
+            n += len(batch)
+        return n
 
     # ---------------------------------------------------------
     # SEARCH WITH OPTIONAL FILTER
@@ -71,7 +334,8 @@ class VectorORM:
             collection_name=collection,
             query_vector=embedding,
             limit=limit,
-            query_filter=q_filter
+            query_filter=q_filter,
+            shard_key_selector=self._shard_key(collection, user_id),
         )
 
         out = []
@@ -85,37 +349,83 @@ class VectorORM:
 
         return out
 
+    # ---------------------------------------------------------
+    # PAGED SCROLL (follows next_page_offset until exhausted)
+    # ---------------------------------------------------------
+    def iter_points(self, collection, where=None, with_vectors=False, batch_size: int = 256, shard_key=None):
+        """`shard_key` pins the scroll to one shard key (rebalancing); default: routed by user_id."""
+        offset = None
+        q_filter = self._build_filter(where)
+        shard_key = shard_key or self._shard_key(collection, self._user_of(where))
+
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection,
+                scroll_filter=q_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors,
+                shard_key_selector=shard_key,
+            )
+            yield from points
+
+            if offset is None:
+                break
+
     # ---------------------------------------------------------
     # DELETE VECTOR
     # ---------------------------------------------------------
-    def delete(self, collection, point_id):
+    def delete(self, collection, point_id, user_id=None):
         self.client.delete(
             collection_name=collection,
-            points_selector={"points": [point_id]}
+            points_selector={"points": [point_id]},
+            shard_key_selector=self._shard_key(collection, user_id, write=True),
         )
 
     # ---------------------------------------------------------
-    # GENERIC QUERY (FILTER BY user_id / type)
+    # BATCHED DELETE / PAYLOAD UPDATE (one request per batch)
     # ---------------------------------------------------------
-    def query(self, collection, query_vector, limit=5, where=None):
-        q_filter = None
+    def delete_many(self, collection, point_ids, batch_size: int = 512, user_id=None) -> int:
+        point_ids = list(point_ids)
+        shard_key = self._shard_key(collection, user_id, write=True)
+        for start in range(0, len(point_ids), batch_size):
+            self.client.delete(
+                collection_name=collection,
+                points_selector=PointIdsList(points=point_ids[start:start + batch_size]),
+                shard_key_selector=shard_key,
+            )
+        return len(point_ids)
 
-        if where:
-            conditions = [
-                FieldCondition(
-                    key=k,
-                    match=MatchValue(value=str(v))
-                ) for k, v in where.items()
-            ]
-            q_filter = Filter(must=conditions)
+    def set_payload(self, collection, payload: dict, point_ids, batch_size: int = 512, user_id=None):
+        point_ids = list(point_ids)
+        shard_key = self._shard_key(collection, user_id, write=True)
+        for start in range(0, len(point_ids), batch_size):
+            self.client.set_payload(
+                collection_name=collection,
+                payload=payload,
+                points=point_ids[start:start + batch_size],
+                shard_key_selector=shard_key,
+            )
+
+    # ---------------------------------------------------------
+    # GENERIC QUERY (FILTER BY user_id / type / domain / role)
+    # ---------------------------------------------------------
+    def query(self, collection, query_vector, limit=5, where=None):
+        q_filter = self._build_filter(where)
 
         results = self.client.search(
             collection_name=collection,
             query_vector=query_vector,
             limit=limit,
-            query_filter=q_filter
+            query_filter=q_filter,
+            shard_key_selector=self._shard_key(collection, self._user_of(where)),
         )
 
+        return self._hits(collection, results)
+
+    @staticmethod
+    def _hits(collection, results):
         return [
             {
                 "text": r.payload.get("text", ""),
@@ -125,3 +435,52 @@ class VectorORM:
             }
             for r in results
         ]
+
+    # ---------------------------------------------------------
+    # MULTI-QUERY SEARCH (one search_batch per collection, concurrently)
+    # ---------------------------------------------------------
+    _batch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="qdrant-batch")
+
+    def search_many(self, requests):
+        """
+        requests: [{"collection", "vector", "limit"?, "where"?}, ...]
+        Returns one hit list per request (same order as `requests`).
+
+        Qdrant batches only within a collection, so requests are grouped
+        into one search_batch call per collection and the groups run in
+        parallel: the wall time is a single round trip. A failing group
+        yields [] for its requests instead of failing the others.
+        """
+        groups = {}
+        for i, req in enumerate(requests):
+            groups.setdefault(req["collection"], []).append(i)
+
+        def run(collection, idxs):
+            batch = [
+                SearchRequest(
+                    vector=requests[i]["vector"],
+                    limit=requests[i].get("limit", 5),
+                    filter=self._build_filter(requests[i].get("where")),
+                    with_payload=True,
+                    shard_key=self._shard_key(collection, self._user_of(requests[i].get("where"))),
+                )
+                for i in idxs
+            ]
+            try:
+                return self.client.search_batch(collection_name=collection, requests=batch)
+            except Exception as e:
+                print(f"⚠️ search_batch on {collection} failed:", e)
+                return [[] for _ in idxs]
+
+        out = [[] for _ in requests]
+        items = list(groups.items())
+        if len(items) == 1:
+            results = [run(*items[0])]
+        else:
+            futures = [self._batch_pool.submit(copy_context().run, run, c, idxs) for c, idxs in items]
+            results = [f.result() for f in futures]
+
+        for (collection, idxs), batch_results in zip(items, results):
+            for i, hits in zip(idxs, batch_results):
+                out[i] = self._hits(collection, hits)
+        return out
@@ -3,6 +3,10 @@
 from app.vector_db.user_history import UserHistoryManager
 from app.embeddings.generator import EmbeddingGenerator
 from app.vector_db.orm import VectorORM
+from app.metrics import metrics
+from app.config import settings
+from app.vector_db.lexical_index import BM25Index, PredefinedLexicalIndex, reciprocal_rank_fusion
+from app.vector_db.snapshot import MmapVectorIndex
 
 
 class VectorSearchEngine:
@@ -16,41 +20,237 @@ class VectorSearchEngine:
         # Use the CORRECT LTM system
         self.history = UserHistoryManager()
 
-    def search_relevant_chunks(self, query: str, user_id: str):
+        # In-process BM25 over the predefined corpus (built now, refreshed in the background)
+        self.lexical = PredefinedLexicalIndex(self.db, refresh_seconds=settings.LEXICAL_REFRESH_SECONDS)
+        if settings.HYBRID_RETRIEVAL:
+            self.lexical.refresh()
+
+        # Memory-mapped predefined snapshot (falls back to Qdrant when absent)
+        self.snapshot = MmapVectorIndex(
+            settings.PREDEFINED_SNAPSHOT_DIR,
+            source=self.db.predefined,
+            check_seconds=settings.SNAPSHOT_CHECK_SECONDS,
+            hnsw_min_points=settings.SNAPSHOT_HNSW_MIN_POINTS,
+            model=self.embed.identity,
+        ) if settings.PREDEFINED_SNAPSHOT_DIR else None
+
+    @staticmethod
+    def predefined_scope(domain: str | None = None, role: str | None = None) -> dict:
+        """
+        Payload filter selecting the predefined-context partition for a request.
+        Role-specific chunks are searched together with the generic 'system' ones.
+        Points ingested before partitioning have no domain / role: they count
+        as DEFAULT_DOMAIN / 'system' (None = field missing, see _build_filter).
+        """
+        domain = (domain or settings.DEFAULT_DOMAIN).strip().lower()
+        default = settings.DEFAULT_DOMAIN.strip().lower()
+        where = {"domain": [domain, None] if domain == default else [domain]}
+        if role:
+            where["role"] = [role.strip().lower(), "system", None]
+        return where
+
+    def search_relevant_chunks(
+        self,
+        query: str,
+        user_id: str,
+        domain: str | None = None,
+        role: str | None = None,
+        query_embedding: list | None = None,
+    ):
+        """`query_embedding` skips the embedding call (batch callers embed up front)."""
         print("🔍 [DEBUG] Searching LTM for user_id:", user_id)
 
         if not query.strip():
             return []
 
+        scope = self.predefined_scope(domain, role)
+
+        if not settings.BATCHED_RETRIEVAL:
+            return self._search_sequential(query, user_id, scope, query_embedding)
+
+        # --------------------------
+        # 1) Lexical (BM25) over predefined — in-process, no embedding needed
+        # --------------------------
+        lexical = []
+        if settings.HYBRID_RETRIEVAL:
+            with metrics.timed("retrieval.lexical"):
+                lexical = self.lexical.search(query, limit=settings.PREDEFINED_TOP_K, where=scope)
+
+            # Fast path: exact keyword hits are strong enough on their own
+            if self._lexically_confident(lexical):
+                metrics.incr("retrieval.lexical_fast_path")
+                try:
+                    with metrics.timed("retrieval.user_fetch"):
+                        summaries = self.history.get_summaries(str(user_id))
+                except Exception:
+                    summaries = []
+                return self._fuse([], self._add_summary_lexical(query, lexical, summaries))
+
+        # Create embedding once
+        emb = query_embedding
+        if not emb:
+            with metrics.timed("retrieval.embed"):
+                emb = self.embed.create_embedding(query, user_id=user_id)
+
+        # Embedding unavailable: serve lexical hits instead of searching with an empty vector
+        if not emb:
+            metrics.incr("retrieval.embed_failed")
+            return self._fuse([], lexical)
+
+        # --------------------------
+        # 2) Predefined + user memory in one round trip
+        # --------------------------
+        with metrics.timed("retrieval.dense_batch"):
+            predefined, user_mem = self._dense_batch(emb, str(user_id), scope)
+
+        # --------------------------
+        # 3) Merge dense hits, fuse with lexical (summaries ranked lexically too)
+        # --------------------------
+        if settings.HYBRID_RETRIEVAL:
+            lexical = self._add_summary_lexical(query, lexical, user_mem)
+
+        dense = predefined + user_mem
+        dense.sort(key=lambda x: float(x.get("score", 0.0)), reverse=True)
+
+        return self._fuse(dense, lexical)
+
+    def _dense_batch(self, emb, user_id: str, scope: dict):
+        """
+        User-filtered summary search plus the predefined search (unless the
+        in-process snapshot serves it), sent together via VectorORM.search_many.
+        """
+        requests = [{
+            "collection": self.db.user_history,
+            "vector": emb,
+            "limit": settings.USER_MEMORY_TOP_K,
+            "where": {"user_id": user_id, "type": "summary"},
+        }]
+
+        predefined = self._search_snapshot(emb, scope)
+        if predefined is None:
+            metrics.incr("retrieval.predefined_qdrant")
+            requests.append({
+                "collection": self.db.predefined,
+                "vector": emb,
+                "limit": settings.PREDEFINED_TOP_K,
+                "where": scope,
+            })
+
+        results = self.db.search_many(requests)
+        user_mem = [
+            {"text": h["text"], "source": "summary", "score": float(h["score"]), "final_score": float(h["score"])}
+            for h in results[0]
+        ]
+        return (predefined if predefined is not None else results[1]), user_mem
+
+    @staticmethod
+    def _add_summary_lexical(query: str, lexical: list, summaries: list) -> list:
+        merged = lexical + BM25Index.from_docs(summaries).search(query, limit=5, source="summary")
+        merged.sort(key=lambda x: x["score"], reverse=True)
+        return merged
+
+    # ------------------------------------------------------------
+    # SEQUENTIAL PATH (BATCHED_RETRIEVAL=false): scroll + local scoring
+    # ------------------------------------------------------------
+    def _search_sequential(self, query: str, user_id: str, scope: dict, query_embedding: list | None):
+        # --------------------------
+        # 0) USER summaries (one scroll, shared by lexical + dense scoring)
+        # --------------------------
+        try:
+            with metrics.timed("retrieval.user_fetch"):
+                summaries = self.history.get_summaries(str(user_id))
+        except:
+            summaries = []
+
+        # --------------------------
+        # 1) Lexical (BM25) search — no embedding needed
+        # --------------------------
+        lexical = []
+        if settings.HYBRID_RETRIEVAL:
+            with metrics.timed("retrieval.lexical"):
+                lexical = self.lexical.search(query, limit=settings.PREDEFINED_TOP_K, where=scope)
+                lexical = self._add_summary_lexical(query, lexical, summaries)
+
+            # Fast path: exact keyword hits are strong enough on their own
+            if self._lexically_confident(lexical):
+                metrics.incr("retrieval.lexical_fast_path")
+                return self._fuse([], lexical)
+
         # Create embedding once
-        emb = self.embed.create_embedding(query)
+        emb = query_embedding
+        if not emb:
+            with metrics.timed("retrieval.embed"):
+                emb = self.embed.create_embedding(query, user_id=user_id)
+
+        # Embedding unavailable: serve lexical hits instead of searching with an empty vector
+        if not emb:
+            metrics.incr("retrieval.embed_failed")
+            return self._fuse([], lexical)
 
         # --------------------------
-        # 1) Predefined memory search
+        # 2) Predefined memory search (dense)
         # --------------------------
         try:
-            predefined = self.db.search(self.db.predefined, emb, limit=5)
+            with metrics.timed("retrieval.predefined"):
+                predefined = self._search_predefined(emb, scope)
         except:
             predefined = []
 
         # --------------------------
-        # 2) USER long-term memory search (Correct Path)
+        # 3) USER long-term memory search (dense, on fetched summaries)
         # --------------------------
         try:
-            user_mem = self.history.search_relevant_chunks(query, str(user_id))
+            with metrics.timed("retrieval.user_memory"):
+                user_mem = self.history.score_summaries(emb, summaries, limit=settings.USER_MEMORY_TOP_K)
         except:
             user_mem = []
 
-        # user_mem already has text, score, source, metadata fields.
-
         # --------------------------
-        # 3) Merge & sort both
+        # 4) Merge dense hits, fuse with lexical
         # --------------------------
-        merged = (predefined or []) + (user_mem or [])
+        dense = (predefined or []) + (user_mem or [])
+        dense.sort(key=lambda x: float(x.get("score", 0.0)), reverse=True)
+
+        return self._fuse(dense, lexical)
 
-        for item in merged:
-            item["final_score"] = float(item.get("score", 0.0))
+    def _search_snapshot(self, emb, scope: dict):
+        """Predefined hits from the in-process snapshot, or None when it cannot serve."""
+        if self.snapshot is None:
+            return None
+        self.snapshot.maybe_reload()
+        if not self.snapshot.ready:
+            return None
+        try:
+            hits = self.snapshot.search(emb, limit=settings.PREDEFINED_TOP_K, where=scope)
+        except Exception as e:
+            print("⚠️ Snapshot search failed, using Qdrant:", e)
+            return None
+        metrics.incr("retrieval.predefined_snapshot")
+        return hits
 
-        merged.sort(key=lambda x: x["final_score"], reverse=True)
+    def _search_predefined(self, emb, scope: dict) -> list:
+        """In-process snapshot search when mapped, Qdrant otherwise."""
+        hits = self._search_snapshot(emb, scope)
+        if hits is not None:
+            return hits
 
-        return merged
+        metrics.incr("retrieval.predefined_qdrant")
+        return self.db.query(self.db.predefined, emb, limit=settings.PREDEFINED_TOP_K, where=scope)
+
+    @staticmethod
+    def _lexically_confident(lexical: list) -> bool:
+        if len(lexical) < settings.LEXICAL_FAST_PATH_MIN_HITS:
+            return False
+        return lexical[0].get("coverage", 0.0) >= settings.LEXICAL_FAST_PATH_COVERAGE
+
+    @staticmethod
+    def _fuse(dense: list, lexical: list) -> list:
+        if not lexical:
+            for item in dense:
+                item["final_score"] = float(item.get("score", 0.0))
+            return dense
+
+        fused = reciprocal_rank_fusion([dense, lexical], k=settings.RRF_K)
+        for item in fused:
+            item["final_score"] = item["rrf_score"]
+        return fused
@@ -0,0 +1,136 @@
+# app/vector_db/sharding.py
+
+import json
+import time
+import zlib
+import threading
+from typing import List, Dict
+
+from redis.exceptions import WatchError
+
+
+class ShardRouter:
+    """
+    Routes each user of a custom-sharded collection to one shard key, so a
+    user's reads and writes touch a single shard.
+
+    Placement lives in Redis (`shardmap:{collection}`) and is shared by all
+    workers and tools:
+      - slots: crc32(user_id) % n_slots → shard key (the default placement)
+      - pins:  user_id → shard key (users moved by the rebalance tool)
+
+    Slots are fixed when the map is first written, so adding shard keys
+    later never silently remaps existing users; new keys receive users only
+    through scripts/rebalance_user_shards.py. The map is re-read every
+    `refresh_seconds`; the rebalance tool waits longer than that before
+    deleting a moved user's old copy.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        collection: str,
+        shard_keys: List[str],
+        n_slots: int = 256,
+        refresh_seconds: float = 5.0,
+    ):
+        if not shard_keys:
+            raise ValueError("ShardRouter needs at least one shard key")
+        self.r = redis_client
+        self.collection = collection
+        self.shard_keys = list(shard_keys)
+        self.n_slots = n_slots
+        self.refresh_seconds = refresh_seconds
+
+        self.map_key = f"shardmap:{collection}"
+        self._slots: List[str] = []
+        self._pins: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+        self._load()
+
+    @staticmethod
+    def keys_for(prefix: str, count: int) -> List[str]:
+        return [f"{prefix}_{i}" for i in range(count)]
+
+    def slot_of(self, user_id: str) -> int:
+        return zlib.crc32(str(user_id).encode("utf-8")) % self.n_slots
+
+    # ------------------------------------------------------------
+    # ROUTING
+    # ------------------------------------------------------------
+    def shard_for(self, user_id: str) -> str:
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._load()
+        user_id = str(user_id)
+        return self._pins.get(user_id) or self._slots[self.slot_of(user_id)]
+
+    # ------------------------------------------------------------
+    # MAP PERSISTENCE
+    # ------------------------------------------------------------
+    def _default_map(self) -> dict:
+        return {
+            "slots": [self.shard_keys[i % len(self.shard_keys)] for i in range(self.n_slots)],
+            "pins": {},
+        }
+
+    def _load(self):
+        with self._lock:
+            try:
+                raw = self.r.get(self.map_key)
+                if raw is None:
+                    # first worker writes the initial placement; others read it back
+                    self.r.set(self.map_key, json.dumps(self._default_map()), nx=True)
+                    raw = self.r.get(self.map_key)
+                data = json.loads(raw)
+            except Exception as e:
+                if self._slots:
+                    print("⚠️ Shard map refresh failed, keeping the last one:", e)
+                    self._loaded_at = time.monotonic()
+                    return
+                print("⚠️ Shard map unavailable, using default placement:", e)
+                data = self._default_map()
+
+            if len(data.get("slots") or []) != self.n_slots:
+                raise RuntimeError(
+                    f"❌ {self.map_key} has {len(data.get('slots') or [])} slots, expected {self.n_slots}"
+                )
+
+            data.setdefault("pins", {})
+            unknown = (set(data["slots"]) | set(data["pins"].values())) - set(self.shard_keys)
+            if unknown:
+                print(f"⚠️ {self.map_key} routes users to unconfigured shard keys {sorted(unknown)}")
+
+            self._slots = data["slots"]
+            self._pins = data["pins"]
+            self._loaded_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        self._load()
+        return {"slots": list(self._slots), "pins": dict(self._pins)}
+
+    def pin(self, assignments: Dict[str, str]):
+        """Persist user → shard key moves (rebalance tool only)."""
+        bad = set(assignments.values()) - set(self.shard_keys)
+        if bad:
+            raise ValueError(f"Unknown shard keys {sorted(bad)}")
+
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.map_key)
+                    data = json.loads(pipe.get(self.map_key) or json.dumps(self._default_map()))
+                    for user_id, key in assignments.items():
+                        user_id = str(user_id)
+                        if data["slots"][self.slot_of(user_id)] == key:
+                            data["pins"].pop(user_id, None)      # back on its default shard
+                        else:
+                            data["pins"][user_id] = key
+                    pipe.multi()
+                    pipe.set(self.map_key, json.dumps(data))
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        self._load()
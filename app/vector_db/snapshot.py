@@ -0,0 +1,310 @@
+# app/vector_db/snapshot.py
+
+import os
+import json
+import time
+import glob
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Iterable
+
+import numpy as np
+
+from app.vector_db.orm import payload_matches
+
+
+MANIFEST = "manifest.json"
+PARTITION_CACHE_SIZE = 32     # filters come from request fields: keep only the recent ones
+
+
+# ------------------------------------------------------------
+# WRITER (runs at ingestion time)
+# ------------------------------------------------------------
+def write_snapshot(directory: str, records: Iterable[Dict], model: str = "", keep: int = 2) -> Dict:
+    """
+    Write a versioned, memory-mappable snapshot:
+
+      vectors-<v>.f32   float32 [count, dim], rows L2-normalized
+      offsets-<v>.u64   uint64  [count + 1], byte offsets into the text blob
+      texts-<v>.bin     utf-8 text blob
+      payloads-<v>.jsonl one JSON payload per row (without 'text')
+      manifest.json     {version, count, dim, model, files} — written last, atomically
+
+    records: {"id", "text", "vector", "payload"}
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = time.strftime("%Y%m%d%H%M%S") + f"-{os.getpid()}"
+    files = {
+        "vectors": f"vectors-{version}.f32",
+        "offsets": f"offsets-{version}.u64",
+        "texts": f"texts-{version}.bin",
+        "payloads": f"payloads-{version}.jsonl",
+    }
+
+    vectors, offsets = [], [0]
+    with open(os.path.join(directory, files["texts"]), "wb") as tf, \
+            open(os.path.join(directory, files["payloads"]), "w", encoding="utf-8") as pf:
+        for r in records:
+            vec = np.asarray(r["vector"], dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            if vec.ndim != 1 or norm == 0.0:
+                continue
+
+            blob = (r.get("text") or "").encode("utf-8")
+            tf.write(blob)
+            offsets.append(offsets[-1] + len(blob))
+
+            payload = {k: v for k, v in (r.get("payload") or {}).items() if k not in ("text", "vector")}
+            pf.write(json.dumps({"id": str(r.get("id", "")), **payload}, ensure_ascii=False) + "\n")
+            vectors.append(vec / norm)
+
+    dim = int(vectors[0].shape[0]) if vectors else 0
+    matrix = np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+    matrix.tofile(os.path.join(directory, files["vectors"]))
+    np.asarray(offsets, dtype=np.uint64).tofile(os.path.join(directory, files["offsets"]))
+
+    manifest = {
+        "version": version,
+        "count": len(vectors),
+        "dim": dim,
+        "model": model,
+        "files": files,
+        "created_at": time.time(),
+    }
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    _prune_old_versions(directory, keep)
+    return manifest
+
+
+def _prune_old_versions(directory: str, keep: int):
+    """Keep the newest `keep` versions; older mmaps stay valid until closed (inode semantics)."""
+    versions = sorted({
+        os.path.basename(p)[len("vectors-"):-len(".f32")]
+        for p in glob.glob(os.path.join(directory, "vectors-*.f32"))
+    })
+    for old in versions[:-keep]:
+        for pattern in ("vectors-{}.f32", "offsets-{}.u64", "texts-{}.bin", "payloads-{}.jsonl"):
+            try:
+                os.remove(os.path.join(directory, pattern.format(old)))
+            except OSError:
+                pass
+
+
+def snapshot_collection(db, collection: str, directory: str, model: str = "") -> Dict:
+    """Page through a Qdrant collection (with vectors) and write a snapshot."""
+    records = (
+        {"id": p.id, "text": p.payload.get("text", ""), "vector": p.vector, "payload": p.payload}
+        for p in db.iter_points(collection, with_vectors=True)
+        if p.vector is not None
+    )
+    manifest = write_snapshot(directory, records, model=model)
+    print(f"💾 Snapshot {manifest['version']}: {manifest['count']} x {manifest['dim']} → {directory}")
+    return manifest
+
+
+# ------------------------------------------------------------
+# READER (memory-mapped, shared via the OS page cache)
+# ------------------------------------------------------------
+class _LoadedSnapshot:
+    def __init__(self, directory: str, manifest: Dict, hnsw_min_points: int):
+        files = manifest["files"]
+        self.manifest = manifest
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+
+        path = lambda key: os.path.join(directory, files[key])
+        self.vectors = np.memmap(path("vectors"), dtype=np.float32, mode="r", shape=(self.count, self.dim)) \
+            if self.count else np.zeros((0, self.dim), dtype=np.float32)
+        self.offsets = np.memmap(path("offsets"), dtype=np.uint64, mode="r")
+        self.texts = np.memmap(path("texts"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(path("texts")) else np.zeros(0, dtype=np.uint8)
+
+        with open(path("payloads"), "r", encoding="utf-8") as f:
+            self.payloads = [json.loads(line) for line in f]
+
+        self.hnsw = self._build_hnsw() if self.count >= hnsw_min_points else None
+        self._partitions = OrderedDict()    # filter -> row indices, LRU (payloads are immutable per version)
+        self._partitions_lock = threading.Lock()
+
+    def _build_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=self.count, ef_construction=200, M=16)
+        index.add_items(np.asarray(self.vectors), np.arange(self.count))
+        index.set_ef(128)
+        print(f"🕸 HNSW graph built over {self.count} snapshot vectors")
+        return index
+
+    def text(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.texts[start:end].tobytes().decode("utf-8")
+
+    def candidates(self, where: Dict | None):
+        if not where:
+            return None
+
+        key = json.dumps(where, sort_keys=True, default=list)
+        with self._partitions_lock:
+            rows = self._partitions.get(key)
+            if rows is not None:
+                self._partitions.move_to_end(key)
+                return rows
+
+        rows = np.fromiter(
+            (i for i, p in enumerate(self.payloads) if payload_matches(p, where)),
+            dtype=np.int64,
+        )
+        with self._partitions_lock:
+            self._partitions[key] = rows
+            while len(self._partitions) > PARTITION_CACHE_SIZE:
+                self._partitions.popitem(last=False)
+        return rows
+
+    def top_k(self, q: np.ndarray, limit: int, where: Dict | None):
+        rows = self.candidates(where)
+        if rows is not None and rows.size == 0:
+            return [], []
+
+        if self.hnsw is not None:
+            k = min(self.count, limit if rows is None else limit * 8)
+            labels, distances = self.hnsw.knn_query(q, k=k)
+            pairs = [(int(i), 1.0 - float(d)) for i, d in zip(labels[0], distances[0])]
+            if rows is not None:
+                allowed = set(rows.tolist())
+                pairs = [p for p in pairs if p[0] in allowed]
+            if len(pairs) >= min(limit, self.count if rows is None else rows.size):
+                pairs = pairs[:limit]
+                return [p[0] for p in pairs], [p[1] for p in pairs]
+            # filter too selective for the graph: fall through to exact scan
+
+        matrix = self.vectors if rows is None else self.vectors[rows]
+        scores = matrix @ q
+        k = min(limit, scores.shape[0])
+        if k == 0:
+            return [], []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        idx = top if rows is None else rows[top]
+        return idx.tolist(), scores[top].tolist()
+
+
+class MmapVectorIndex:
+    """
+    In-process cosine search over a snapshot written by write_snapshot().
+    Hot-reloads in the background when the manifest version changes (checked every few seconds).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        source: str,
+        check_seconds: float = 5.0,
+        hnsw_min_points: int = 50_000,
+        model: str | None = None,
+    ):
+        self.directory = directory
+        self.source = source
+        self.model = model
+        self.check_seconds = check_seconds
+        self.hnsw_min_points = hnsw_min_points
+
+        self._snap = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.maybe_reload(force=True)
+
+    @property
+    def ready(self) -> bool:
+        return self._snap is not None
+
+    @property
+    def manifest(self) -> Dict | None:
+        return self._snap.manifest if self._snap else None
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """
+        Pick up a new manifest version. Periodic checks run on a background
+        thread (load + HNSW build can take seconds) and swap the snapshot in
+        when ready; force=True loads inline (startup).
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_seconds:
+            return False
+        if not self._lock.acquire(blocking=force):
+            return False
+
+        self._checked_at = now
+        if force:
+            try:
+                self._reload()
+            finally:
+                self._lock.release()
+            return True
+
+        def run():
+            try:
+                self._reload()
+            finally:
+                self._lock.release()
+
+        threading.Thread(target=run, name="snapshot-reload", daemon=True).start()
+        return True
+
+    def _reload(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if self._snap and self._snap.manifest.get("version") == manifest.get("version"):
+            return
+
+        # Never serve vectors from another embedding space (stays on Qdrant)
+        if self.model and manifest.get("model") and manifest["model"] != self.model:
+            print(f"⚠️ Snapshot {manifest.get('version')} is '{manifest['model']}', expected '{self.model}'; not mapped")
+            self._snap = None
+            return
+
+        try:
+            snap = _LoadedSnapshot(self.directory, manifest, self.hnsw_min_points)
+        except Exception as e:
+            print("⚠️ Snapshot load failed:", e)
+            return
+
+        self._snap = snap     # atomic swap: in-flight searches keep the old one
+        print(f"🗺 Snapshot {manifest['version']} mapped ({snap.count} x {snap.dim})")
+
+    def search(self, query_vector, limit: int = 5, where: Dict | None = None) -> List[Dict]:
+        self.maybe_reload()
+        snap = self._snap
+        if snap is None or query_vector is None or len(query_vector) != snap.dim:
+            raise RuntimeError("snapshot unavailable or dimension mismatch")
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm == 0.0:
+            return []
+        q = q / norm
+
+        idx, scores = snap.top_k(q, limit, where)
+        out = []
+        for i, score in zip(idx, scores):
+            text = snap.text(i)
+            out.append({
+                "text": text,
+                "score": float(score),
+                "source": self.source,
+                "metadata": {**snap.payloads[i], "text": text},
+            })
+        return out
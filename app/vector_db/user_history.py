@@ -1,11 +1,15 @@
 # app/vector_db/user_history.py
 
+import time
 import uuid
+import itertools
 from typing import List, Dict, Any
 import numpy as np
 
 from app.vector_db.orm import VectorORM
 from app.embeddings.generator import EmbeddingGenerator
+from app.llm.scheduler import Priority
+from app.affinity import user_cache
 
 
 # ------------------------- UTIL -------------------------
@@ -31,14 +35,19 @@ def _is_trivial_text(s: str) -> bool:
     return len(s) < 10
 
 
+# Orders summary reads and writes for user_cache: a read taken before a
+# write finished can never re-cache what that write made stale.
+_summary_versions = itertools.count(1)
+
+
 # ----------------------- MANAGER ------------------------
 
 class UserHistoryManager:
     """
     Long-term memory manager that:
     - Stores vectors + payloads
-    - Uses scroll WITHOUT filter (manual filter)
-    - Works on ALL Qdrant versions (no index required)
+    - Reads a user's points with a paged, user_id-filtered scroll
+      (VectorORM.iter_points), so nothing past the first page is missed
     """
 
     def __init__(self):
@@ -53,7 +62,9 @@ class UserHistoryManager:
         if not force and _is_trivial_text(message):
             return
 
-        embedding = self.emb.create_embedding(message)
+        embedding = self.emb.create_embedding(message, priority=Priority.BACKGROUND, user_id=user_id)
+        if not embedding:
+            return          # embedding failed: never store a vector-less point
 
         self.db.insert(
             collection=self.db.user_history,
@@ -64,6 +75,7 @@ class UserHistoryManager:
                 "user_id": str(user_id),
                 "type": "history",
                 "vector": embedding,
+                "created_at": int(time.time()),
             },
         )
 
@@ -74,7 +86,9 @@ class UserHistoryManager:
         if not summary_text or _is_trivial_text(summary_text):
             return
 
-        embedding = self.emb.create_embedding(summary_text)
+        embedding = self.emb.create_embedding(summary_text, priority=Priority.BACKGROUND, user_id=user_id)
+        if not embedding:
+            return          # embedding failed: never store a vector-less point
 
         self.db.insert(
             collection=self.db.user_history,
@@ -85,35 +99,40 @@ class UserHistoryManager:
                 "user_id": str(user_id),
                 "type": "summary",
                 "vector": embedding,
+                "created_at": int(time.time()),
             },
         )
+        user_cache.invalidate(user_id, "summaries", version=next(_summary_versions))
 
     # ------------------- SUMMARY FETCH -----------------------
 
     def get_summaries(self, user_id: str) -> List[Dict]:
-        """Scroll all items then filter manually (NO FILTER —> NO ERROR)."""
-        try:
-            points, _ = self.db.client.scroll(
-                collection_name=self.db.user_history,
-                limit=500,          # enough for your use
-                with_vectors=True,
-            )
-        except Exception as e:
-            print("⚠️ ERROR get_summaries:", e)
-            return []
+        """All summary points of the user (every page, vectors included)."""
+        cached = user_cache.get("summaries", user_id)
+        if cached is not None:
+            return list(cached)
 
-        out = []
-
-        for p in points:
-            if p.payload.get("user_id") == str(user_id) and p.payload.get("type") == "summary":
-                out.append({
+        version = next(_summary_versions)
+        try:
+            out = [
+                {
                     "id": p.id,
                     "text": _normalize_text(p.payload.get("text", "")),
                     "vector": p.vector or p.payload.get("vector"),
                     "metadata": p.payload,
-                })
+                }
+                for p in self.db.iter_points(
+                    self.db.user_history,
+                    where={"user_id": str(user_id), "type": "summary"},
+                    with_vectors=True,
+                )
+            ]
+        except Exception as e:
+            print("⚠️ ERROR get_summaries:", e)
+            return []
 
-        return out
+        user_cache.put("summaries", user_id, out, version=version)
+        return list(out)
 
     # ------------------- UPSERT SUMMARY ----------------------
 
@@ -142,9 +161,10 @@ class UserHistoryManager:
             to_delete = [s["id"] for s in summaries[self.max_summaries:]]
             for sid in to_delete:
                 try:
-                    self.db.delete(self.db.user_history, sid)
+                    self.db.delete(self.db.user_history, sid, user_id=user_id)
                 except:
                     pass
+            user_cache.invalidate(user_id, "summaries", version=next(_summary_versions))
 
     # ---------------- SEARCH RELEVANT ------------------------
 
@@ -153,43 +173,53 @@ class UserHistoryManager:
         if not summaries:
             return []
 
-        query_emb = np.array(self.emb.create_embedding(query))
-        scored = []
+        return self.score_summaries(self.emb.create_embedding(query), summaries, limit)
+
+    def score_summaries(self, query_embedding, summaries: List[Dict], limit: int = 5):
+        """Cosine-rank already fetched summaries against a query embedding (one float32 matmul)."""
+        if not summaries or query_embedding is None or len(query_embedding) == 0:
+            return []
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0.0:
+            return []
 
+        rows, kept = [], []
         for item in summaries:
             vec = item.get("vector")
             if vec is None:
                 vec = self.emb.create_embedding(item["text"])
 
-            vec = np.array(vec)
+            # vectors of another width (e.g. before a reindex) are not comparable
+            if vec is None or len(vec) != len(q):
+                continue
+            rows.append(vec)
+            kept.append(item)
 
-            score = float(
-                np.dot(query_emb, vec) /
-                (np.linalg.norm(query_emb) * np.linalg.norm(vec))
-            )
+        if not rows:
+            return []
 
-            scored.append({
-                "text": item["text"],
-                "source": "summary",
-                "final_score": score
-            })
+        matrix = np.asarray(rows, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0.0] = 1.0
+        scores = (matrix @ q) / (norms * q_norm)
 
+        scored = [
+            {"text": item["text"], "source": "summary", "score": float(score), "final_score": float(score)}
+            for item, score in zip(kept, scores)
+        ]
         scored.sort(key=lambda x: x["final_score"], reverse=True)
         return scored[:limit]
 
     # ---------------------- DEBUG ---------------------------
 
     def fetch_recent(self, user_id: str, limit: int = 20):
-        """Scroll everything and manually filter (safe)."""
+        """Newest `limit` points of the user, across every page."""
         try:
-            points, _ = self.db.client.scroll(
-                collection_name=self.db.user_history,
-                limit=500
-            )
-        except:
+            points = list(self.db.iter_points(self.db.user_history, where={"user_id": str(user_id)}))
+        except Exception:
             return []
 
-        return [
-            p for p in points
-            if p.payload.get("user_id") == str(user_id)
-        ][:limit]
+        points.sort(key=lambda p: p.payload.get("created_at", 0), reverse=True)
+        return points[:limit]
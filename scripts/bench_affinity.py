@@ -0,0 +1,235 @@
+# scripts/bench_affinity.py
+"""
+User affinity + per-user state cache (app.affinity) against the offline
+fakes.
+
+    python -m scripts.bench_affinity
+    python -m scripts.bench_affinity --workers 4 --sessions 6 --turns 6 --qdrant-latency-ms 2
+
+Runs the real app in-process and simulates `--workers` workers, each with
+its own user_cache store, over the same interleaved multi-turn sessions:
+  - no_cache  every read goes to Redis / Qdrant (today's behaviour)
+  - random    cache on, each request lands on a random worker (what a
+              shared-socket pool does; shown for the hit rate only, the
+              cache is not safe there)
+  - affinity  cache on, worker chosen by the consistent-hash ring
+and reports per-kind hit rates and Redis / Qdrant round trips per request
+(from app.usage). Also checks that the ring only moves ~1/N of the users
+when a worker is added or removed, that an epoch change clears the
+cache, and that a window read which loses a race with a turn write does
+not cache the older window.
+
+For the router itself over HTTP: python -m scripts.bench_serve --affinity
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from scripts.bench_fakes import install_fakes, seed_predefined
+from scripts.bench_rag import load_sessions
+from app.metrics import _percentile
+
+
+def ring_movement(nodes: int, keys: int = 20000) -> dict:
+    from app.affinity import HashRing
+
+    names = [f"w{i}" for i in range(nodes)]
+    before = HashRing(names)
+    grown = HashRing(names + [f"w{nodes}"])
+    users = [f"user_{i}" for i in range(keys)]
+
+    owners = {u: before.node_for(u) for u in users}
+    moved_add = sum(1 for u in users if grown.node_for(u) != owners[u])
+    moved_remove = sum(1 for u in users if before.node_for(u, exclude={"w0"}) != owners[u])
+    share = max(sum(1 for o in owners.values() if o == n) for n in names) / keys
+    return {
+        "moved_on_add": round(moved_add / keys, 3),
+        "moved_on_remove": round(moved_remove / keys, 3),
+        "owned_by_w0": round(sum(1 for o in owners.values() if o == "w0") / keys, 3),
+        "max_share": round(share, 3),
+    }
+
+
+def _ops(usage) -> dict:
+    stages = usage.process_snapshot()["stages"]
+    return {f: sum(s.get(f, 0) for s in stages.values()) for f in ("redis_ops", "qdrant_ops")}
+
+
+def run_mode(client, mode: str, sessions: dict, workers: int, seed: int) -> dict:
+    from app.affinity import HashRing, user_cache
+    from app.usage import usage
+
+    rng = random.Random(seed)
+    ring = HashRing([f"w{i}" for i in range(workers)])
+    stores = {f"w{i}": type(user_cache._entries)() for i in range(workers)}
+
+    user_cache.enabled = mode != "no_cache"
+    user_cache.reset_stats()
+    for store in stores.values():
+        store.clear()
+
+    users = {f"{mode}_{uid}": msgs for uid, msgs in sessions.items()}
+    turns = max(len(m) for m in users.values())
+    before = _ops(usage)
+    latencies = []
+
+    # interleave sessions: turn 1 of every user, then turn 2, ...
+    for t in range(turns):
+        for user_id, msgs in users.items():
+            if t >= len(msgs):
+                continue
+            node = ring.node_for(user_id) if mode == "affinity" else rng.choice(list(stores))
+            user_cache._entries = stores[node]          # this request runs on `node`
+            start = time.perf_counter()
+            r = client.post("/rag", json={"user_id": user_id, "message": msgs[t]})
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            assert r.status_code == 200, r.text
+    time.sleep(0.5)                                     # rolling summaries on the background pool
+
+    after = _ops(usage)
+    n = len(latencies)
+    latencies.sort()
+    return {
+        "requests": n,
+        "redis_ops_per_request": round((after["redis_ops"] - before["redis_ops"]) / n, 2),
+        "qdrant_ops_per_request": round((after["qdrant_ops"] - before["qdrant_ops"]) / n, 2),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "cache": user_cache.stats()["kinds"] if mode != "no_cache" else {},
+    }
+
+
+def read_write_race() -> dict:
+    """get_context reads Redis, then a turn is written before the read's put lands."""
+    from app.affinity import user_cache
+    from app.main import chat_memory
+
+    user_cache.enabled = True
+    user_cache.clear()
+    user_id = "race_user"
+    chat_memory.clear(user_id)
+    chat_memory.add_user(user_id, "first message of the race")
+    user_cache.invalidate(user_id, "window")
+
+    pipeline = chat_memory.r.pipeline
+
+    class _WriteAfterRead:
+        def __init__(self, pipe):
+            self.pipe = pipe
+
+        def __getattr__(self, name):
+            return getattr(self.pipe, name)
+
+        def execute(self):
+            out = self.pipe.execute()
+            chat_memory.r.pipeline = pipeline
+            chat_memory.add_user(user_id, "second message written during the read")
+            return out
+
+    chat_memory.r.pipeline = lambda *a, **kw: _WriteAfterRead(pipeline(*a, **kw))
+    try:
+        seen, _ = chat_memory.get_context(user_id)
+    finally:
+        chat_memory.r.pipeline = pipeline
+
+    cached, _ = chat_memory.get_context(user_id)
+    return {
+        "read_saw_turns": len(seen),
+        "cached_turns_after": len(cached),
+        "redis_turns": len(chat_memory.r.lrange(chat_memory._key(user_id), 0, -1)),
+    }
+
+
+def run(args) -> dict:
+    os.environ["USER_CACHE_ENABLED"] = "true"
+    os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+    install_fakes(
+        llm_latency_ms=args.llm_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        qdrant_latency_ms=args.qdrant_latency_ms,
+    )
+    seed_predefined()
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.affinity import user_cache
+
+    sessions = load_sessions(args.corpus, args.sessions, args.turns)
+    modes = {}
+    with TestClient(app) as client:
+        for mode in ("no_cache", "random", "affinity"):
+            modes[mode] = run_mode(client, mode, sessions, args.workers, args.seed)
+
+        # epoch change → cache dropped
+        user_cache.enabled = True
+        user_cache.observe_epoch("1")
+        user_cache.put("window", "epoch_user", ([], ""))
+        user_cache.observe_epoch("2")
+        epoch_clears = user_cache.get("window", "epoch_user") is None
+
+        race = read_write_race()
+
+    ring = ring_movement(args.workers)
+    hit = lambda m, kind: modes[m]["cache"].get(kind, {}).get("hit_rate", 0.0)
+    checks = {
+        "affinity_beats_random_window_hits": hit("affinity", "window") > hit("random", "window"),
+        "affinity_cuts_redis_ops": modes["affinity"]["redis_ops_per_request"] < modes["no_cache"]["redis_ops_per_request"],
+        "affinity_cuts_qdrant_ops": modes["affinity"]["qdrant_ops_per_request"] < modes["no_cache"]["qdrant_ops_per_request"],
+        "ring_add_moves_about_1_over_n": ring["moved_on_add"] <= 1.5 / (args.workers + 1),
+        "ring_remove_moves_only_that_node": ring["moved_on_remove"] == ring["owned_by_w0"],
+        "epoch_change_clears_cache": epoch_clears,
+        "racing_read_keeps_newer_window": race["read_saw_turns"] == 1
+                                          and race["cached_turns_after"] == race["redis_turns"] == 2,
+    }
+    return {"config": vars(args), "modes": modes, "ring": ring, "race": race, "checks": checks}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="User affinity + per-user cache (offline)")
+    parser.add_argument("--corpus", default="scripts/bench_sessions.jsonl")
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--qdrant-latency-ms", type=float, default=2.0, help="Simulated Qdrant round trip")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    print(f"\n📊 {args.workers} simulated workers, {args.sessions} sessions x {args.turns} turns "
+          f"(fake Qdrant {args.qdrant_latency_ms:g}ms)")
+    kinds = ("window", "summaries", "retrieval")
+    print(f"{'mode':<10}{'redis/req':>11}{'qdrant/req':>12}{'p50':>9}{'p95':>9}" + "".join(f"{k:>11}" for k in kinds))
+    for mode, m in report["modes"].items():
+        rates = "".join(
+            f"{m['cache'][k]['hit_rate']:>11.0%}" if k in m["cache"] else f"{'-':>11}" for k in kinds
+        )
+        print(f"{mode:<10}{m['redis_ops_per_request']:>11}{m['qdrant_ops_per_request']:>12}"
+              f"{m['p50_ms']:>9}{m['p95_ms']:>9}{rates}")
+
+    ring = report["ring"]
+    print(f"\n   ring: +1 worker moves {ring['moved_on_add']:.1%} of users, -1 moves {ring['moved_on_remove']:.1%} "
+          f"(its own {ring['owned_by_w0']:.1%}); largest share {ring['max_share']:.1%}")
+    race = report["race"]
+    print(f"   read/write race: read saw {race['read_saw_turns']} turn(s), cache holds {race['cached_turns_after']}, "
+          f"Redis holds {race['redis_turns']}\n")
+
+    for name, ok in report["checks"].items():
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# scripts/bench_dump.py
+"""
+Collection export / import (app.vector_db.dump) against the offline fakes.
+
+    python -m scripts.bench_dump
+    python -m scripts.bench_dump --points 20000 --users 200 --qdrant-latency-ms 2
+
+Seeds the in-memory Qdrant with the predefined corpus plus `--points`
+synthetic user_history points (history + summaries, payload vector copy
+included, random unit vectors — no embedding calls), then:
+  - exports both collections, plain and gzip, and reports size / speed
+  - imports each dump into a fresh collection with 1 and `--workers`
+    upserts in flight
+  - checks the dump holds every point bit-exact (id, float32 vector,
+    payload), that the restored collection has the same ids and payloads
+    and the same vectors up to Qdrant's cosine re-normalization on upsert
+    (float32 rounding; bit-exact count reported), that the embedding API
+    was never called, and that a corrupted dump is rejected
+  - checks get_summaries() / fetch_recent() see a user's points past the
+    first 500 of the collection (the old single-page read did not)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import numpy as np
+
+from scripts.bench_fakes import install_fakes, seed_predefined
+
+
+def seed_user_history(db, points: int, users: int, dim: int, seed: int = 7) -> str:
+    """Synthetic user_history points; returns a user whose summaries are written last."""
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    late_user = "bench_late_user"
+
+    def items(n, user_of, kind_of):
+        vectors = rng.standard_normal((n, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for i, v in enumerate(vectors):
+            vector = v.tolist()
+            yield {
+                "id": str(uuid.uuid4()),
+                "text": f"synthetic note {i} about interview practice",
+                "embedding": vector,
+                "metadata": {
+                    "user_id": user_of(i),
+                    "type": kind_of(i),
+                    "vector": vector,
+                    "created_at": now - n + i,
+                },
+            }
+
+    db.insert_many(db.user_history, items(points, lambda i: f"bench_user_{i % users}",
+                                          lambda i: "summary" if i % 10 == 0 else "history"), batch_size=512)
+    db.insert_many(db.user_history, items(3, lambda i: late_user, lambda i: "summary"))
+    return late_user
+
+
+def fingerprints(rows) -> dict:
+    """(id, vector, payload) rows -> id -> (sha1 of canonical payload, float32 vector)."""
+    return {
+        str(pid): (hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest(),
+                   np.asarray(vector, dtype=np.float32))
+        for pid, vector, payload in rows
+    }
+
+
+def collection_rows(db, collection: str):
+    for p in db.iter_points(collection, with_vectors=True, batch_size=1024):
+        yield p.id, p.vector, p.payload
+
+
+def compare(source: dict, other: dict) -> dict:
+    same_keys = source.keys() == other.keys()
+    payloads = same_keys and all(source[k][0] == other[k][0] for k in source)
+    exact = sum(1 for k in source if k in other and np.array_equal(source[k][1], other[k][1]))
+    diff = max((float(np.abs(source[k][1] - other[k][1]).max()) for k in source if k in other), default=0.0)
+    return {"ids_and_payloads": payloads, "exact_vectors": exact, "points": len(source), "max_abs_diff": diff}
+
+
+def old_get_summaries(db, user_id: str) -> list:
+    """The previous implementation: one unfiltered 500-point page, filtered in Python."""
+    points, _ = db.client.scroll(collection_name=db.user_history, limit=500, with_vectors=True)
+    return [p for p in points if p.payload.get("user_id") == user_id and p.payload.get("type") == "summary"]
+
+
+def _mb(directory: str) -> float:
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1e6
+
+
+def run(args) -> dict:
+    gem = install_fakes(qdrant_latency_ms=args.qdrant_latency_ms)
+    seed_predefined()
+
+    from app.config import settings
+    from app.vector_db.user_history import UserHistoryManager
+    from app.vector_db.dump import export_collection, import_collection, iter_dump
+
+    history = UserHistoryManager()
+    db = history.db
+    late_user = seed_user_history(db, args.points, args.users, settings.EMBEDDING_DIM, args.seed)
+
+    root = tempfile.mkdtemp(prefix="bench-dump-")
+    embeds_before = gem.calls["embed"]
+    exports, imports, checks = [], [], {}
+
+    try:
+        for name in (db.predefined, db.user_history):
+            source = fingerprints(collection_rows(db, name))
+            for compress in (False, True):
+                directory = os.path.join(root, f"{name}{'_gz' if compress else ''}")
+                m = export_collection(db, name, directory, compress=compress)
+                exports.append({
+                    "collection": name,
+                    "compressed": compress,
+                    "points": m["count"],
+                    "mb": round(_mb(directory), 2),
+                    "seconds": m["elapsed_s"],
+                    "points_per_s": round(m["count"] / max(m["elapsed_s"], 1e-9)),
+                })
+                dumped = compare(source, fingerprints(
+                    (r["id"], r["embedding"], r["metadata"]) for r in iter_dump(directory)
+                ))
+                checks[f"{name}{'_gz' if compress else ''}_dump_bit_exact"] = (
+                    dumped["ids_and_payloads"] and dumped["exact_vectors"] == dumped["points"]
+                )
+
+            for workers in sorted({1, args.workers}):
+                target = f"{name}_restored_w{workers}"
+                r = import_collection(db, os.path.join(root, f"{name}_gz"), target, workers=workers)
+                restored = compare(source, fingerprints(collection_rows(db, target)))
+                imports.append({
+                    "collection": name,
+                    "workers": workers,
+                    "points": r["imported"],
+                    "seconds": r["elapsed_s"],
+                    "points_per_s": round(r["imported"] / max(r["elapsed_s"], 1e-9)),
+                    "exact_vectors": restored["exact_vectors"],
+                    "max_abs_diff": restored["max_abs_diff"],
+                })
+                checks[f"{name}_w{workers}_restored"] = (
+                    restored["ids_and_payloads"] and restored["max_abs_diff"] <= 1e-6
+                )
+                db.client.delete_collection(target)
+
+        checks["no_embedding_calls"] = gem.calls["embed"] == embeds_before
+
+        # a flipped byte in the payload stream must fail the import
+        bad = os.path.join(root, "corrupt")
+        shutil.copytree(os.path.join(root, db.predefined), bad)
+        path = os.path.join(bad, "points.jsonl")
+        with open(path, "r+b") as f:
+            f.seek(40)
+            byte = f.read(1)
+            f.seek(40)
+            f.write(bytes([byte[0] ^ 0x01]))
+        try:
+            for _ in iter_dump(bad):
+                pass
+            checks["corrupt_dump_rejected"] = False
+        except ValueError:
+            checks["corrupt_dump_rejected"] = True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    # reads past the first page
+    summaries = history.get_summaries(late_user)
+    recent = history.fetch_recent(late_user, limit=20)
+    paging = {
+        "collection_points": args.points + 3,
+        "late_user_summaries": 3,
+        "old_single_page_found": len(old_get_summaries(db, late_user)),
+        "get_summaries_found": len(summaries),
+        "fetch_recent_found": len(recent),
+    }
+    checks["get_summaries_reads_every_page"] = len(summaries) == 3
+    checks["fetch_recent_reads_every_page"] = len(recent) == 3
+
+    return {"config": vars(args), "exports": exports, "imports": imports, "paging": paging, "checks": checks}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collection export / import (offline)")
+    parser.add_argument("--points", type=int, default=10000, help="Synthetic user_history points")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4, help="Import upserts in flight")
+    parser.add_argument("--qdrant-latency-ms", type=float, default=2.0, help="Simulated Qdrant round trip")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    print(f"\n📊 export ({args.points} synthetic user_history points, fake Qdrant {args.qdrant_latency_ms:g}ms)")
+    print(f"{'collection':<22}{'gzip':>6}{'points':>9}{'MB':>9}{'seconds':>10}{'points/s':>11}")
+    for e in report["exports"]:
+        print(f"{e['collection']:<22}{'yes' if e['compressed'] else 'no':>6}{e['points']:>9}{e['mb']:>9}"
+              f"{e['seconds']:>10}{e['points_per_s']:>11}")
+
+    print(f"\n{'import':<22}{'workers':>8}{'points':>9}{'seconds':>10}{'points/s':>11}{'bit-exact':>11}{'max_diff':>10}")
+    for i in report["imports"]:
+        print(f"{i['collection']:<22}{i['workers']:>8}{i['points']:>9}{i['seconds']:>10}{i['points_per_s']:>11}"
+              f"{i['exact_vectors']:>11}{i['max_abs_diff']:>10.1e}")
+
+    pg = report["paging"]
+    print(f"\n   summaries of a user written after {pg['collection_points'] - 3} other points: "
+          f"old single page found {pg['old_single_page_found']}/3, get_summaries {pg['get_summaries_found']}/3, "
+          f"fetch_recent {pg['fetch_recent_found']}/3\n")
+
+    for name, ok in report["checks"].items():
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# scripts/bench_fakes.py
+"""
+Local stand-ins for every external dependency of the service.
+
+    from scripts.bench_fakes import install_fakes
+    install_fakes(llm_latency_ms=300, embed_latency_ms=40)
+    from app.main import app      # import AFTER install_fakes()
+
+- Redis   -> one shared fakeredis server
+- Qdrant  -> one shared in-memory QdrantClient(":memory:")
+- Gemini  -> deterministic fake generate_content / embed_content with
+             configurable latency
+
+Everything is deterministic: the same corpus produces the same prompts,
+the same embeddings and the same replies on every run.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import tempfile
+import hashlib
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9.+#-]*")
+
+
+# ------------------------------------------------------------
+# DETERMINISTIC EMBEDDINGS
+# ------------------------------------------------------------
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> list:
+    """Signed feature-hashing of word tokens -> unit vector."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        h = zlib.crc32(tok.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+# ------------------------------------------------------------
+# FAKE GEMINI
+# ------------------------------------------------------------
+class FakeGemini:
+    """Deterministic Gemini replacement with configurable latency."""
+
+    def __init__(self, llm_latency_ms: float = 0.0, embed_latency_ms: float = 0.0, jitter: float = 0.2):
+        self.llm_latency_ms = llm_latency_ms
+        self.embed_latency_ms = embed_latency_ms
+        self.jitter = jitter
+
+        self._lock = threading.Lock()
+        self.calls = {"generate": 0, "embed": 0}
+        self.input_tokens = []
+
+    def _sleep(self, base_ms: float, key: str):
+        if base_ms <= 0:
+            return
+        # jitter derived from the input, so runs are reproducible
+        frac = (int(hashlib.md5(key.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF) * 2 - 1
+        time.sleep(max(0.0, base_ms * (1 + self.jitter * frac)) / 1000.0)
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return max(1, len(text or "") // 4)
+
+    def embed_content(self, model=None, content=None, task_type=None, output_dimensionality=None, **kwargs):
+        with self._lock:
+            self.calls["embed"] += 1
+
+        dim = output_dimensionality or EMBEDDING_DIM
+        if isinstance(content, list):
+            self._sleep(self.embed_latency_ms, "|".join(content))
+            return {"embedding": [fake_embedding(c, dim) for c in content]}
+
+        self._sleep(self.embed_latency_ms, content or "")
+        return {"embedding": fake_embedding(content, dim)}
+
+    def generate(self, prompt: str) -> SimpleNamespace:
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+
+        with self._lock:
+            self.calls["generate"] += 1
+            self.input_tokens.append(self.count_tokens(prompt))
+
+        self._sleep(self.llm_latency_ms, prompt)
+
+        if "Extract only *user facts*" in prompt:
+            text = json.dumps(self._facts_from(prompt))
+        else:
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            text = (
+                "Great question! Here is a practical plan:\n"
+                "1. Break the goal into weekly milestones.\n"
+                "2. Build one small project to practice.\n"
+                "3. Review progress every Sunday.\n"
+                f"What would you like to start with? (ref {digest})"
+            )
+            if '{"reply":' in prompt:       # combined reply + facts mode
+                m = re.search(r"User's new message:\s*(.+)", prompt)
+                facts = self._facts_from(f"User: {m.group(1)}") if m else []
+                text = json.dumps({"reply": text, "facts": facts})
+
+        return SimpleNamespace(
+            candidates=[SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text=text)]),
+                finish_reason=SimpleNamespace(name="STOP"),
+                safety_ratings=[],
+            )],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=self.count_tokens(prompt),
+                cached_content_token_count=0,
+                candidates_token_count=self.count_tokens(text),
+                total_token_count=self.count_tokens(prompt) + self.count_tokens(text),
+            ),
+            text=text,
+        )
+
+    @staticmethod
+    def _facts_from(prompt: str) -> list:
+        m = re.search(r"User: (.+)", prompt)
+        if not m:
+            return []
+        msg = m.group(1).strip()
+        return [f"User said: {msg[:80]}"] if len(msg) > 12 else []
+
+
+class _FakeGenerativeModel:
+    gemini: FakeGemini = None
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+        self.kwargs = kwargs
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        return self.gemini.generate(contents)
+
+
+# ------------------------------------------------------------
+# THREAD-SAFE IN-MEMORY QDRANT
+# ------------------------------------------------------------
+class _LockedProxy:
+    """
+    Serializes every call to the (non thread-safe) local Qdrant client.
+    `latency_ms` adds a simulated network round trip per call, outside the
+    lock, so concurrent calls overlap the way real requests would.
+    """
+
+    def __init__(self, target, latency_ms: float = 0.0):
+        self._target = target
+        self._lock = threading.RLock()
+        self.latency_ms = latency_ms
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000.0)
+            with self._lock:
+                return attr(*args, **kwargs)
+
+        return call
+
+
+# ------------------------------------------------------------
+# INSTALL
+# ------------------------------------------------------------
+_installed = {}
+
+ADMIN_TOKEN = "offline-admin"      # X-Admin-Token for /metrics and /admin/* under the fakes
+
+
+def install_fakes(llm_latency_ms: float = 0.0, embed_latency_ms: float = 0.0, qdrant_latency_ms: float = 0.0) -> FakeGemini:
+    """
+    Patch redis / qdrant_client / google.generativeai in place.
+    Must run before anything under `app` is imported.
+    """
+    if _installed:
+        gem = _installed["gemini"]
+        gem.llm_latency_ms = llm_latency_ms
+        gem.embed_latency_ms = embed_latency_ms
+        _installed["qdrant"].latency_ms = qdrant_latency_ms
+        return gem
+
+    for key, value in {
+        "GEMINI_API_KEY": "offline",
+        "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "archive.db"),
+        "REDIS_HOST": "localhost",
+        "REDIS_PORT": "6379",
+        "REDIS_PASSWORD": "offline",
+        "PREDEFINED_SNAPSHOT_DIR": tempfile.mkdtemp(prefix="bench-snapshot-"),
+        "ADMIN_TOKEN": ADMIN_TOKEN,
+        # fakes have no quota; export lower values to benchmark admission control
+        "LLM_RATE_PER_MINUTE": "1000000",
+        "EMBED_RATE_PER_MINUTE": "1000000",
+    }.items():
+        os.environ.setdefault(key, value)
+
+    import redis
+    import fakeredis
+    import qdrant_client
+    import google.generativeai as genai
+
+    server = fakeredis.FakeServer()
+
+    def _fake_redis(*args, decode_responses=False, **kwargs):
+        return fakeredis.FakeRedis(server=server, decode_responses=decode_responses)
+
+    redis.Redis = _fake_redis
+
+    real_qdrant = qdrant_client.QdrantClient
+    shared_qdrant = _LockedProxy(real_qdrant(location=":memory:"), latency_ms=qdrant_latency_ms)
+    qdrant_client.QdrantClient = lambda *args, **kwargs: shared_qdrant
+
+    gem = FakeGemini(llm_latency_ms=llm_latency_ms, embed_latency_ms=embed_latency_ms)
+    _FakeGenerativeModel.gemini = gem
+    genai.configure = lambda *args, **kwargs: None
+    genai.embed_content = gem.embed_content
+    genai.GenerativeModel = _FakeGenerativeModel
+
+    _installed.update(gemini=gem, redis_server=server, qdrant=shared_qdrant)
+    return gem
+
+
+def seed_predefined(path: str = "scripts/predefined_data.json"):
+    """
+    Load the predefined corpus into the in-memory Qdrant and write its
+    snapshot. Call before importing app.main so startup indexes see it.
+    """
+    from app.config import settings
+    from app.vector_db.orm import VectorORM
+    from app.embeddings.generator import EmbeddingGenerator
+    from app.vector_db.snapshot import snapshot_collection
+    from scripts.populate_predefined_context import load_from_list
+
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    db, emb = VectorORM(), EmbeddingGenerator()
+    load_from_list(db, emb, items)
+
+    if settings.PREDEFINED_SNAPSHOT_DIR:
+        snapshot_collection(db, db.predefined, settings.PREDEFINED_SNAPSHOT_DIR, model=emb.identity)
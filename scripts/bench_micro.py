@@ -0,0 +1,252 @@
+# scripts/bench_micro.py
+"""
+Micro-benchmarks + allocation profiling for the per-request hot paths:
+
+  - PromptBuilder.build_prompt      (small and very large windows)
+  - ResponseFormatter.format
+  - GeminiClient.join_parts         (candidate-part joining in run_rag)
+  - GeminiClient.parse_facts        (JSON and bullet fallback)
+
+Timing follows pytest-benchmark conventions: calibrate the inner loop to
+a minimum round time, run several rounds, report min/median/mean per call.
+Allocations are measured with tracemalloc (peak bytes + blocks per call).
+
+Time thresholds are machine-independent: every timed round of a case is
+paired with a round of a fixed pure-Python calibration loop, and the case
+is scored in "units" (median case/calibration ratio), so a slower CPU or
+a busy CI host scales both sides.
+
+    python -m scripts.bench_micro                      # check thresholds
+    python -m scripts.bench_micro --only prompt        # filter cases
+    python -m scripts.bench_micro --update-thresholds  # re-baseline (worst of 5 runs x 2)
+
+Exits 1 when a case exceeds its units or allocation threshold in
+scripts/bench_micro_thresholds.json.
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+from types import SimpleNamespace
+
+from scripts.bench_fakes import install_fakes
+
+THRESHOLDS_FILE = "scripts/bench_micro_thresholds.json"
+
+
+def calibration():
+    """Reference workload (string building + dict/list churn, like the hot paths)."""
+    words = {}
+    for i in range(200):
+        words[f"w{i % 50}"] = words.get(f"w{i % 50}", 0) + 1
+    return " ".join(f"{k}:{v}" for k, v in sorted(words.items()))
+
+
+# ------------------------------------------------------------
+# FIXTURES
+# ------------------------------------------------------------
+def _chunks(n: int, size: int) -> list:
+    return [
+        {"text": (f"memory {i}: user is learning nodejs and mongodb. " * (size // 48 + 1))[:size],
+         "source": "summary" if i % 2 else "predefined_context"}
+        for i in range(n)
+    ]
+
+
+def _turns(n: int, size: int) -> list:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "text": (f"turn {i} about planning a backend project with express. " * (size // 56 + 1))[:size]}
+        for i in range(n)
+    ]
+
+
+def _parts(n: int, size: int) -> list:
+    return [SimpleNamespace(text="x" * size) for _ in range(n)]
+
+
+def build_cases() -> dict:
+    from app.rag.prompt_builder import PromptBuilder
+    from app.response.formatter import ResponseFormatter
+    from app.llm.gemini_client import GeminiClient
+
+    small_chunks, small_turns = _chunks(5, 200), _turns(6, 200)
+    large_chunks, large_turns = _chunks(64, 4000), _turns(200, 2000)
+    long_reply = "Step 1: plan.\n" * 2000
+    parts_small, parts_large = _parts(3, 300), _parts(64, 2000)
+    facts_json = json.dumps([f"user fact number {i} about goals" for i in range(50)])
+    facts_bullets = "\n".join(f"- user fact number {i} about goals" for i in range(500))
+
+    return {
+        "prompt_build_small": lambda: PromptBuilder.build_prompt("how do i start?", small_chunks, small_turns),
+        "prompt_build_large": lambda: PromptBuilder.build_prompt("how do i start?", large_chunks, large_turns),
+        "formatter_format_long": lambda: ResponseFormatter.format(long_reply),
+        "join_parts_small": lambda: GeminiClient.join_parts(parts_small),
+        "join_parts_large": lambda: GeminiClient.join_parts(parts_large),
+        "parse_facts_json": lambda: GeminiClient.parse_facts(facts_json, 8),
+        "parse_facts_bullets": lambda: GeminiClient.parse_facts(facts_bullets, 8),
+    }
+
+
+# ------------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------------
+def _iterations(fn, min_round_s: float) -> int:
+    """Inner-loop size so one round takes at least `min_round_s`."""
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        if time.perf_counter() - start >= min_round_s or iterations >= 1_000_000:
+            return iterations
+        iterations *= 2
+
+
+def _round_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_case(fn, rounds: int, min_round_s: float) -> dict:
+    """
+    Per-call timings over `rounds`; each round is paired with a round of
+    calibration() and "units" is the median of the per-pair ratios, so
+    host speed changes during the run cancel out.
+    """
+    iterations = _iterations(fn, min_round_s)
+    cal_iterations = _iterations(calibration, min_round_s)
+
+    per_call, ratios = [], []
+    for _ in range(rounds):
+        unit = _round_us(calibration, cal_iterations)
+        us = _round_us(fn, iterations)
+        per_call.append(us)
+        ratios.append(us / unit)
+
+    return {
+        "iterations": iterations,
+        "rounds": rounds,
+        "min_us": round(min(per_call), 3),
+        "median_us": round(statistics.median(per_call), 3),
+        "mean_us": round(statistics.fmean(per_call), 3),
+        "stddev_us": round(statistics.pstdev(per_call), 3),
+        "units": round(statistics.median(ratios), 4),
+    }
+
+
+def alloc_case(fn, calls: int = 20) -> dict:
+    fn()  # warm caches / lazy imports outside the measurement
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(max(0, s.count_diff) for s in stats)
+
+    return {
+        "peak_bytes": max(0, peak - base),
+        "blocks_per_call": round(blocks / calls, 2),
+    }
+
+
+def check_thresholds(results: dict, thresholds: dict) -> list:
+    """Failure messages for cases over their units / peak-bytes limits."""
+    failures = []
+    for name, r in results.items():
+        limit = thresholds.get(name)
+        if not limit:
+            continue
+        if r["units"] > limit["max_units"]:
+            failures.append(f"{name}: {r['units']} units > {limit['max_units']}")
+        if r["peak_bytes"] > limit["max_peak_bytes"]:
+            failures.append(f"{name}: peak {r['peak_bytes']}B > {limit['max_peak_bytes']}B")
+    return failures
+
+
+# ------------------------------------------------------------
+# MAIN
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks")
+    parser.add_argument("--only", default=None, help="Substring filter on case names")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-round-ms", type=float, default=20.0)
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    parser.add_argument("--update-thresholds", action="store_true",
+                        help="Write the worst of --baseline-runs runs x --headroom as the new thresholds")
+    parser.add_argument("--baseline-runs", type=int, default=5)
+    parser.add_argument("--headroom", type=float, default=2.0)
+    parser.add_argument("--out", default=None, help="Write JSON results here")
+    args = parser.parse_args(argv)
+
+    install_fakes()
+    cases = build_cases()
+    if args.only:
+        cases = {k: v for k, v in cases.items() if args.only in k}
+
+    runs = args.baseline_runs if args.update_thresholds else 1
+    history = []
+    for run in range(runs):
+        results = {}
+        if runs > 1:
+            print(f"\n— run {run + 1}/{runs}")
+        print(f"{'case':<26}{'min_us':>12}{'median_us':>12}{'units':>10}{'peak_bytes':>14}{'blocks':>10}")
+        for name, fn in cases.items():
+            res = {**time_case(fn, args.rounds, args.min_round_ms / 1000.0), **alloc_case(fn)}
+            results[name] = res
+            print(f"{name:<26}{res['min_us']:>12}{res['median_us']:>12}{res['units']:>10}"
+                  f"{res['peak_bytes']:>14}{res['blocks_per_call']:>10}")
+        history.append(results)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_thresholds:
+        # worst run x headroom: run-to-run noise is in the baseline, not eaten from the headroom
+        thresholds = {
+            name: {
+                "max_units": round(max(h[name]["units"] for h in history) * args.headroom, 4),
+                "max_peak_bytes": int(max(max(h[name]["peak_bytes"] for h in history), 1024) * args.headroom),
+            }
+            for name in results
+        }
+        with open(args.thresholds, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, indent=2)
+        print(f"\n📝 Thresholds written to {args.thresholds}")
+        return 0
+
+    try:
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            thresholds = json.load(f)
+    except FileNotFoundError:
+        print(f"\n⚠️ No thresholds file at {args.thresholds}; skipping checks.")
+        return 0
+
+    failures = check_thresholds(results, thresholds)
+    for f in failures:
+        print(f"❌ {f}")
+    if failures:
+        return 1
+
+    print("\n✅ All hot paths within thresholds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+# scripts/bench_rag.py
+"""
+Offline load test for the /rag endpoint.
+
+Runs the real FastAPI app in-process against local stand-ins
+(fakeredis, in-memory Qdrant, deterministic fake Gemini) and drives
+concurrent multi-turn sessions from a JSONL corpus.
+
+    python -m scripts.bench_rag --corpus scripts/bench_sessions.jsonl \\
+        --sessions 16 --turns 6 --concurrency 8 --llm-latency-ms 300 \\
+        --out bench_output.json
+
+Corpus lines may be either:
+    {"user_id": "...", "message": "..."}          (explicit sessions)
+    {"title": "...", "body": "..."}               (e.g. requests.jsonl)
+Lines without a user_id are dealt round-robin into synthetic sessions.
+
+With --baseline, the run fails (exit 1) if any stage p95 regresses by more
+than --tolerance compared to a previous --out file.
+"""
+
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.bench_fakes import install_fakes, seed_predefined
+
+
+# ------------------------------------------------------------
+# CORPUS
+# ------------------------------------------------------------
+def load_sessions(path: str, sessions: int, turns: int) -> dict:
+    explicit = defaultdict(list)
+    loose = []
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            msg = row.get("message") or row.get("body") or row.get("title") or ""
+            if not msg.strip():
+                continue
+            if row.get("user_id"):
+                explicit[str(row["user_id"])].append(msg)
+            else:
+                loose.append(msg)
+
+    out = {uid: msgs[:turns] for uid, msgs in explicit.items()}
+
+    if loose:
+        cycle = itertools.cycle(loose)
+        for i in range(max(0, sessions - len(out))):
+            out[f"bench_user_{i}"] = [next(cycle) for _ in range(turns)]
+
+    return dict(itertools.islice(out.items(), sessions))
+
+
+# ------------------------------------------------------------
+# DRIVER
+# ------------------------------------------------------------
+def _run_session(client, user_id: str, messages: list) -> list:
+    latencies = []
+    for msg in messages:
+        start = time.perf_counter()
+        r = client.post("/rag", json={"user_id": user_id, "message": msg})
+        latencies.append(((time.perf_counter() - start) * 1000.0, r.status_code))
+    return latencies
+
+
+def run(args) -> dict:
+    gem = install_fakes(
+        llm_latency_ms=args.llm_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        qdrant_latency_ms=args.qdrant_latency_ms,
+    )
+
+    seed_predefined()
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.metrics import metrics, _percentile
+
+    sessions = load_sessions(args.corpus, args.sessions, args.turns)
+    metrics.reset()
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(_run_session, client, uid, msgs) for uid, msgs in sessions.items()]
+            results = [f.result() for f in futures]
+        wall = time.perf_counter() - start
+
+    all_lat = sorted(ms for session in results for ms, _ in session)
+    errors = sum(1 for session in results for _, code in session if code != 200)
+    snap = metrics.snapshot()
+
+    return {
+        "config": {
+            "corpus": args.corpus,
+            "sessions": len(sessions),
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "qdrant_latency_ms": args.qdrant_latency_ms,
+        },
+        "requests": len(all_lat),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(all_lat) / wall, 2) if wall else 0.0,
+        "end_to_end": {
+            "p50_ms": round(_percentile(all_lat, 50), 3),
+            "p95_ms": round(_percentile(all_lat, 95), 3),
+            "p99_ms": round(_percentile(all_lat, 99), 3),
+        },
+        "stages": snap["stages"],
+        "counters": snap["counters"],
+        "values": snap["values"],
+        "gemini_calls": dict(gem.calls),
+    }
+
+
+# ------------------------------------------------------------
+# REPORTING
+# ------------------------------------------------------------
+def print_report(report: dict):
+    print(f"\n📊 {report['requests']} requests in {report['wall_s']}s "
+          f"→ {report['throughput_rps']} req/s ({report['errors']} errors)")
+    e2e = report["end_to_end"]
+    print(f"   end-to-end p50={e2e['p50_ms']}ms p95={e2e['p95_ms']}ms p99={e2e['p99_ms']}ms\n")
+
+    print(f"{'stage':<28}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, s in sorted(report["stages"].items()):
+        print(f"{stage:<28}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+    for name, v in sorted(report.get("values", {}).items()):
+        print(f"{name:<28}{v['count']:>8}{'p50=' + str(v['p50']):>14}{'p95=' + str(v['p95']):>14}{'max=' + str(v['max']):>14}")
+
+    if report["counters"]:
+        print("\ncounters:")
+        for k, v in sorted(report["counters"].items()):
+            print(f"  {k}: {v}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Return the stages whose p95 regressed beyond tolerance."""
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        cur = report["stages"].get(stage)
+        if not cur or base["p95_ms"] <= 0:
+            continue
+        ratio = cur["p95_ms"] / base["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append((stage, base["p95_ms"], cur["p95_ms"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline /rag load test")
+    parser.add_argument("--corpus", default="scripts/bench_sessions.jsonl")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--qdrant-latency-ms", type=float, default=0.0, help="Simulated Qdrant round trip")
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    parser.add_argument("--baseline", default=None, help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 regression (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for stage, base, cur, ratio in regressions:
+            print(f"❌ {stage}: p95 {base}ms → {cur}ms (x{ratio:.2f})")
+        if regressions:
+            return 1
+        print("✅ No stage regressed beyond tolerance.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
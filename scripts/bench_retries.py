@@ -0,0 +1,176 @@
+# scripts/bench_retries.py
+"""
+Client retries against the offline fakes.
+
+    python -m scripts.bench_retries
+
+Makes the fake Gemini fail on purpose and checks what a client that
+retries ends up with:
+  - busy (scheduler timeout → 503): the retry succeeds and the user turn
+    is in short-term memory once, not once per attempt
+  - LLM error reply under an Idempotency-Key: the retry runs the pipeline
+    again (not a replay of the error); a successful reply is replayed
+  - combined reply + facts JSON cut at max_output_tokens, or unreadable:
+    the user gets the recovered reply text or a plain reply, never raw JSON
+"""
+
+import sys
+import json
+import argparse
+from types import SimpleNamespace
+
+from scripts.bench_fakes import install_fakes, seed_predefined
+
+
+class _FailNext:
+    """Wraps FakeGemini.generate: the next `times` calls raise `error`."""
+
+    def __init__(self, gem):
+        self.gem = gem
+        self.generate = gem.generate
+        self.pending = []
+        self.mangle = None
+        gem.generate = self
+
+    def arm(self, error: Exception, times: int = 1):
+        self.pending = [error] * times
+
+    def arm_text(self, fn, finish_reason: str = "STOP"):
+        """The next response's text becomes fn(text), with this finish reason."""
+        self.mangle = (fn, finish_reason)
+
+    def __call__(self, *args, **kwargs):
+        if self.pending:
+            raise self.pending.pop()
+        resp = self.generate(*args, **kwargs)
+        if self.mangle:
+            (fn, reason), self.mangle = self.mangle, None
+            text = fn(resp.text)
+            resp.text = resp.candidates[0].content.parts[0].text = text
+            resp.candidates[0].finish_reason = SimpleNamespace(name=reason)
+        return resp
+
+
+def busy_retry(client, fail) -> dict:
+    from app.llm.scheduler import SchedulerTimeout
+    from app.main import chat_memory
+
+    user_id, message = "retry_busy_user", "How should I prepare for a system design interview?"
+    fail.arm(SchedulerTimeout("llm queue full for interactive work"))
+    first = client.post("/rag", json={"user_id": user_id, "message": message}).status_code
+    retry = client.post("/rag", json={"user_id": user_id, "message": message}).status_code
+
+    turns = chat_memory.get_recent(user_id)
+    return {
+        "first_status": first,
+        "retry_status": retry,
+        "user_turns_stored": sum(1 for t in turns if t["role"] == "user" and t["text"] == message),
+    }
+
+
+def error_retry(client, fail, gem) -> dict:
+    user_id, message = "retry_error_user", "What should I learn first for data engineering?"
+    headers = {"Idempotency-Key": "bench-retry-1"}
+    post = lambda: client.post("/rag", json={"user_id": user_id, "message": message}, headers=headers).json()
+
+    fail.arm(Exception("500 Internal error"))
+    first = post()
+    calls = gem.calls["generate"]
+    retry = post()
+    calls_retry = gem.calls["generate"] - calls
+    replay = post()
+    calls_replay = gem.calls["generate"] - calls - calls_retry
+    return {
+        "first": first["ai_text"][:60],
+        "retry": retry["ai_text"][:60],
+        "llm_calls_on_retry": calls_retry,
+        "llm_calls_on_replay": calls_replay,
+        "replay_matches_retry": replay == retry,
+    }
+
+
+def broken_json(client, fail, gem) -> dict:
+    from app.config import settings
+
+    post = lambda user_id: client.post("/rag", json={
+        "user_id": user_id, "message": "How do I get better at behavioural interviews?",
+    }).json()["ai_text"]
+
+    combined, settings.COMBINED_FACTS_MODE = settings.COMBINED_FACTS_MODE, True
+    try:
+        fail.arm_text(lambda text: text[:len(text) // 2], finish_reason="MAX_TOKENS")
+        calls = gem.calls["generate"]
+        truncated = post("retry_truncated_user")
+        calls_truncated = gem.calls["generate"] - calls
+
+        fail.arm_text(lambda text: '{"facts": ["likes SQL"], "repl')
+        calls = gem.calls["generate"]
+        unreadable = post("retry_unreadable_user")
+        calls_unreadable = gem.calls["generate"] - calls
+    finally:
+        settings.COMBINED_FACTS_MODE = combined
+    return {
+        "truncated": truncated[:60],
+        "llm_calls_truncated": calls_truncated,
+        "unreadable": unreadable[:60],
+        "llm_calls_unreadable": calls_unreadable,
+    }
+
+
+def run(args) -> dict:
+    gem = install_fakes()
+    seed_predefined()
+    fail = _FailNext(gem)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        busy = busy_retry(client, fail)
+        error = error_retry(client, fail, gem)
+        broken = broken_json(client, fail, gem)
+
+    checks = {
+        "busy_returns_503_then_succeeds": (busy["first_status"], busy["retry_status"]) == (503, 200),
+        "busy_retry_stores_user_turn_once": busy["user_turns_stored"] == 1,
+        "error_reply_returned": error["first"].startswith("[LLM ERROR]"),
+        "retry_after_error_runs_pipeline": error["llm_calls_on_retry"] > 0
+                                           and not error["retry"].startswith("[LLM ERROR]"),
+        "success_is_replayed": error["llm_calls_on_replay"] == 0 and error["replay_matches_retry"],
+        # + 1 call each: facts did not parse, so the background fact extraction runs
+        "truncated_json_shows_reply_text": broken["truncated"].startswith("Great question")
+                                           and broken["llm_calls_truncated"] == 2,
+        "unreadable_json_falls_back_to_plain_reply": broken["unreadable"].startswith("Great question")
+                                                     and broken["llm_calls_unreadable"] == 3,
+    }
+    return {"busy": busy, "error": error, "broken": broken, "checks": checks}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Client retries after failures (offline)")
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    b = report["busy"]
+    e = report["error"]
+    print(f"\n📊 busy: {b['first_status']} then {b['retry_status']}, user turn stored {b['user_turns_stored']}x")
+    print(f"   error: {e['first']!r} → retry made {e['llm_calls_on_retry']} LLM call(s), "
+          f"replay made {e['llm_calls_on_replay']}")
+    j = report["broken"]
+    print(f"   JSON cut at max tokens: {j['truncated']!r} ({j['llm_calls_truncated']} LLM calls)")
+    print(f"   unreadable JSON: {j['unreadable']!r} ({j['llm_calls_unreadable']} LLM calls)\n")
+
+    for name, ok in report["checks"].items():
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
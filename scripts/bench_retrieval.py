@@ -0,0 +1,100 @@
+# scripts/bench_retrieval.py
+"""
+Retrieval latency: batched (one round trip) vs sequential (scroll + local scoring).
+
+    python -m scripts.bench_retrieval --qdrant-latency-ms 5
+    python -m scripts.bench_retrieval --qdrant-latency-ms 5 --no-snapshot --users 200
+
+Runs VectorSearchEngine.search_relevant_chunks in-process against the
+offline fakes, with a simulated Qdrant round trip per call, after seeding
+`--users` users with `--summaries` summaries each. Lexical fast path is
+disabled so every query exercises the dense path.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from scripts.bench_fakes import install_fakes, seed_predefined, fake_embedding
+
+QUERIES_FILE = "scripts/bench_sessions.jsonl"
+
+
+def seed_users(history, users: int, summaries: int):
+    topics = ["python", "system design", "react", "sql", "career switch", "interviews", "nodejs", "docker"]
+    items = []
+    for u in range(users):
+        for k in range(summaries):
+            text = f"User {u} is working on {topics[(u + k) % len(topics)]} goal {k}"
+            items.append({
+                "text": text,
+                "embedding": fake_embedding(text),
+                "metadata": {"user_id": f"user_{u}", "type": "summary", "created_at": int(time.time())},
+            })
+    history.db.insert_many(history.db.user_history, items)
+
+
+def measure(engine, queries: list, users: int, rounds: int) -> dict:
+    from app.metrics import _percentile
+
+    timings = []
+    for r in range(rounds):
+        for i, q in enumerate(queries):
+            start = time.perf_counter()
+            engine.search_relevant_chunks(q, f"user_{(i + r) % users}", query_embedding=fake_embedding(q))
+            timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return {
+        "p50_ms": round(_percentile(timings, 50), 3),
+        "p95_ms": round(_percentile(timings, 95), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries": len(timings),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched vs sequential retrieval latency")
+    parser.add_argument("--qdrant-latency-ms", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--summaries", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--no-snapshot", action="store_true", help="Serve predefined from Qdrant too")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    install_fakes()
+    seed_predefined()
+
+    from app.config import settings
+    from app.vector_db.search_engine import VectorSearchEngine
+
+    settings.HYBRID_RETRIEVAL = False
+    engine = VectorSearchEngine()
+    if args.no_snapshot:
+        engine.snapshot = None
+    seed_users(engine.history, args.users, args.summaries)
+
+    with open(QUERIES_FILE, "r", encoding="utf-8") as f:
+        queries = [json.loads(line)["message"] for line in f if line.strip()]
+
+    install_fakes(qdrant_latency_ms=args.qdrant_latency_ms)
+
+    report = {}
+    for mode, batched in (("sequential", False), ("batched", True)):
+        settings.BATCHED_RETRIEVAL = batched
+        report[mode] = measure(engine, queries, args.users, args.rounds)
+        print(f"⏱️ {mode:<10} p50={report[mode]['p50_ms']}ms p95={report[mode]['p95_ms']}ms")
+
+    saved = report["sequential"]["p50_ms"] - report["batched"]["p50_ms"]
+    print(f"📉 p50 saved per retrieval: {saved:.3f}ms "
+          f"(qdrant round trip {args.qdrant_latency_ms}ms, snapshot {'off' if args.no_snapshot else 'on'})")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), **report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
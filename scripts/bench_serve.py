@@ -0,0 +1,209 @@
+# scripts/bench_serve.py
+"""
+Throughput of the production server profile (python -m app.serve) per
+worker count, over real HTTP against the offline fakes.
+
+    python -m scripts.bench_serve --workers 1 2 4 8 --llm-latency-ms 200 --concurrency 32
+
+For each worker count it starts `app.serve` in a subprocess whose master
+installs the fakes and seeds the predefined corpus before forking (every
+worker inherits its own copy), waits for the warmed-up workers, drives
+concurrent multi-turn sessions with keep-alive connections, and stops
+the server. Each worker has its own fake Redis / Qdrant, so cross-worker
+effects (shared cache hits, single-flight) are not represented.
+
+With --affinity the server runs behind the consistent-hash router
+(app.serve --affinity): every worker's fake stores then hold exactly its
+own users, the report adds the users seen on more than one worker (must
+be 0) and the per-user cache hit rates read from each worker's /metrics.
+
+Numbers depend on the host: run it on the target instance type and
+compare worker counts on the same machine, never across machines.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from scripts.bench_rag import load_sessions
+from scripts.bench_fakes import ADMIN_TOKEN
+from app.metrics import _percentile
+
+
+# ------------------------------------------------------------
+# SERVER SIDE (subprocess)
+# ------------------------------------------------------------
+def serve(args):
+    from scripts.bench_fakes import install_fakes, seed_predefined
+
+    os.environ.setdefault("ARCHIVE_ENABLED", "false")      # one sqlite file would serialize all workers
+    os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+    install_fakes(llm_latency_ms=args.llm_latency_ms, embed_latency_ms=args.embed_latency_ms)
+    seed_predefined()
+
+    from app.serve import main as serve_main
+    argv = ["--workers", str(args.serve), "--host", "127.0.0.1", "--port", str(args.port)]
+    return serve_main(argv + (["--affinity"] if args.affinity else []))
+
+
+# ------------------------------------------------------------
+# CLIENT SIDE
+# ------------------------------------------------------------
+ADMIN_HEADERS = {"X-Admin-Token": os.environ.get("ADMIN_TOKEN", ADMIN_TOKEN)}     # what the server gets from install_fakes
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            if requests.get(f"{url}/metrics", headers=ADMIN_HEADERS, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+_local = threading.local()
+nodes = defaultdict(set)        # user_id -> workers that answered (affinity router header)
+
+
+def _session(url: str, user_id: str, messages: list) -> list:
+    http = getattr(_local, "http", None) or requests.Session()        # keep-alive per client thread
+    _local.http = http
+    out = []
+    for msg in messages:
+        start = time.perf_counter()
+        code, retried = 0, False
+        for attempt in range(2):
+            try:
+                r = http.post(f"{url}/rag", json={"user_id": user_id, "message": msg}, timeout=120)
+                code = r.status_code
+                nodes[user_id].add(r.headers.get("x-affinity-node"))
+                break
+            except requests.ConnectionError:
+                # a recycled worker closed this keep-alive connection: one retry on
+                # a fresh one, as a proxy / load balancer in front would do
+                retried = True
+            except requests.RequestException:
+                break
+        out.append(((time.perf_counter() - start) * 1000.0, code, retried))
+    return out
+
+
+def measure(workers: int, args) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", "scripts.bench_serve", "--serve", str(workers), "--port", str(port),
+           "--llm-latency-ms", str(args.llm_latency_ms), "--embed-latency-ms", str(args.embed_latency_ms)]
+    if args.affinity:
+        cmd.append("--affinity")
+    log = open(os.devnull, "w") if not args.verbose else None
+    proc = subprocess.Popen(cmd, stdout=log, stderr=log, start_new_session=True)
+
+    try:
+        started = time.perf_counter()
+        _wait_ready(url, proc)
+        ready_s = time.perf_counter() - started
+
+        sessions = load_sessions(args.corpus, args.sessions, args.turns)
+        # distinct users per worker-count run (no memory carried over)
+        sessions = {f"w{workers}_{uid}": msgs for uid, msgs in sessions.items()}
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda kv: _session(url, *kv), sessions.items()))
+        wall = time.perf_counter() - start
+        cache = _worker_cache_stats(port, workers) if args.affinity else {}
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=60)
+
+    lat = sorted(ms for r in results for ms, _, _ in r)
+    errors = sum(1 for r in results for _, code, _ in r if code != 200)
+    retries = sum(1 for r in results for _, _, retried in r if retried)
+    return {
+        "workers": workers,
+        "sessions": len(results),
+        "requests": len(lat),
+        "errors": errors,
+        "retries": retries,
+        "throughput_rps": round(len(lat) / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(lat, 50), 1),
+        "p95_ms": round(_percentile(lat, 95), 1),
+        "p99_ms": round(_percentile(lat, 99), 1),
+        "startup_s": round(ready_s, 2),
+        "users_on_several_workers": sum(1 for uid in sessions if len(nodes[uid]) > 1) if args.affinity else None,
+        "user_cache": cache,
+    }
+
+
+def _worker_cache_stats(port: int, workers: int) -> dict:
+    """user_cache hit rate per kind over all workers (read directly on their loopback ports)."""
+    totals = defaultdict(lambda: {"hits": 0, "misses": 0})
+    for i in range(workers):
+        snap = requests.get(f"http://127.0.0.1:{port + 1 + i}/metrics", headers=ADMIN_HEADERS, timeout=5).json()
+        for kind, s in snap.get("user_cache", {}).get("kinds", {}).items():
+            totals[kind]["hits"] += s["hits"]
+            totals[kind]["misses"] += s["misses"]
+    return {k: round(v["hits"] / max(1, v["hits"] + v["misses"]), 3) for k, v in totals.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="app.serve throughput per worker count (offline)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--corpus", default="scripts/bench_sessions.jsonl")
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    parser.add_argument("--affinity", action="store_true", help="Serve through the consistent-hash router")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        return serve(args)
+
+    rows = [measure(w, args) for w in args.workers]
+
+    # the corpus may hold fewer sessions than --sessions
+    print(f"\n📊 app.serve{' --affinity' if args.affinity else ''}, {rows[0]['sessions']} sessions x {args.turns} turns, concurrency {args.concurrency}, "
+          f"fake LLM {args.llm_latency_ms:g}ms / embed {args.embed_latency_ms:g}ms, {os.cpu_count()} CPU host")
+    print(f"{'workers':>8}{'requests':>10}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}{'retries':>9}{'ready':>8}")
+    for r in rows:
+        print(f"{r['workers']:>8}{r['requests']:>10}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['errors']:>8}{r['retries']:>9}{r['startup_s']:>7}s")
+        if args.affinity:
+            rates = ", ".join(f"{k} {v:.0%}" for k, v in sorted(r["user_cache"].items()))
+            print(f"{'':>8}  users on >1 worker: {r['users_on_several_workers']}; cache hit rate: {rates}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+    return 0 if all(r["errors"] == 0 and not r["users_on_several_workers"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# scripts/bench_usage.py
+"""
+Per-user usage accounting (app.usage) against the offline fakes.
+
+    python -m scripts.bench_usage
+    python -m scripts.bench_usage --sessions 6 --turns 6 --events 200000
+
+Drives /rag sessions in-process, flushes the tracker and reads
+/admin/usage, then checks:
+  - every LLM token the fake Gemini received is attributed to a bench
+    user (reply, fact extraction and rolling summaries alike)
+  - each user has embedding, Qdrant and Redis ops attributed
+  - a user over USAGE_DAILY_BUDGET_USD gets 429
+  - the SpaceSaving sketch finds the true top users of a skewed stream
+    with far fewer slots than users
+and reports the cost of one usage.add() call.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter
+
+from scripts.bench_fakes import install_fakes, seed_predefined
+from scripts.bench_rag import load_sessions, _run_session
+
+
+def sketch_recall(events: int, users: int, capacity: int, top: int, seed: int = 7) -> dict:
+    """Zipf(1.1)-weighted user stream: true top-`top` vs SpaceSaving(capacity)."""
+    from app.usage import SpaceSaving
+
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** 1.1) for rank in range(1, users + 1)]
+    stream = rng.choices(range(users), weights=weights, k=events)
+
+    truth = Counter()
+    sketch = SpaceSaving(capacity)
+    for u in stream:
+        cost = rng.uniform(0.5, 1.5)
+        truth[u] += cost
+        sketch.add(str(u), cost, {"cost_usd": cost})
+
+    true_top = {str(u) for u, _ in truth.most_common(top)}
+    found = {key for key, *_ in sketch.top(top)}
+    max_rel_error = max(error / weight for _, weight, error, _ in sketch.top(top))
+    return {
+        "events": events,
+        "users": users,
+        "capacity": capacity,
+        "recall_at_top": round(len(true_top & found) / top, 3),
+        "max_relative_error_top": round(max_rel_error, 4),
+    }
+
+
+def add_cost_us(n: int = 200000) -> float:
+    from app.usage import usage
+
+    with usage.scope("bench_overhead", count_request=False):
+        start = time.perf_counter()
+        for _ in range(n):
+            usage.add(redis_ops=1)
+        return (time.perf_counter() - start) / n * 1e6
+
+
+def run(args) -> dict:
+    gem = install_fakes(llm_latency_ms=args.llm_latency_ms, embed_latency_ms=args.embed_latency_ms)
+    seed_predefined()
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.config import settings
+    from app.usage import usage
+
+    sessions = load_sessions(args.corpus, args.sessions, args.turns)
+    tokens_before = sum(gem.input_tokens)
+
+    with TestClient(app) as client:
+        for uid, msgs in sessions.items():
+            _run_session(client, uid, msgs)
+        time.sleep(1.0)                         # rolling summaries run on a background pool
+        usage.flush()
+        report = client.get("/admin/usage", params={"top": len(sessions) + 5},
+                            headers={"X-Admin-Token": settings.ADMIN_TOKEN}).json()
+        sent = sum(gem.input_tokens) - tokens_before
+
+        # budget: the heaviest user is now over a tiny daily budget
+        heavy = report["top_users"][0]["user_id"]
+        settings.USAGE_DAILY_BUDGET_USD = report["top_users"][0]["cost_usd"] / 2
+        blocked = client.post("/rag", json={"user_id": heavy, "message": "one more question"}).status_code
+        fresh = client.post("/rag", json={"user_id": "bench_new_user", "message": "hello there coach"}).status_code
+        settings.USAGE_DAILY_BUDGET_USD = 0.0
+
+    users = {row["user_id"]: row for row in report["top_users"]}
+    bench_users = [users.get(uid) for uid in sessions]
+
+    checks = {
+        "all_llm_tokens_attributed": sum(u["input_tokens"] for u in bench_users if u) == sent,
+        "every_user_has_ops": all(
+            u and u["embed_calls"] and u["qdrant_ops"] and u["redis_ops"] and u["llm_calls"] for u in bench_users
+        ),
+        "budget_blocks_heavy_user": blocked == 429,
+        "budget_allows_others": fresh == 200,
+    }
+
+    recall = sketch_recall(args.events, args.users, args.capacity, args.top)
+    checks["sketch_finds_top_users"] = recall["recall_at_top"] >= 0.9
+
+    return {
+        "config": vars(args),
+        "llm_input_tokens_sent": sent,
+        "report": report,
+        "sketch": recall,
+        "add_cost_us": round(add_cost_us(), 2),
+        "checks": checks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-user usage accounting (offline)")
+    parser.add_argument("--corpus", default="scripts/bench_sessions.jsonl")
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--events", type=int, default=200000, help="Synthetic events for the sketch check")
+    parser.add_argument("--users", type=int, default=50000, help="Distinct users in the synthetic stream")
+    parser.add_argument("--capacity", type=int, default=500, help="SpaceSaving slots for the sketch check")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default=None, help="Write JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    print(f"\n📊 usage for {len(report['report']['top_users'])} users "
+          f"({report['llm_input_tokens_sent']} LLM input tokens sent)")
+    print(f"{'user':<20}{'req':>5}{'llm':>6}{'in_tok':>9}{'out_tok':>9}{'embed':>7}"
+          f"{'qdrant':>8}{'redis':>7}{'wall_ms':>10}{'cost_usd':>11}")
+    for u in report["report"]["top_users"]:
+        print(f"{u['user_id']:<20}{u['requests']:>5.0f}{u['llm_calls']:>6.0f}{u['input_tokens']:>9.0f}"
+              f"{u['output_tokens']:>9.0f}{u['embed_calls']:>7.0f}{u['qdrant_ops']:>8.0f}{u['redis_ops']:>7.0f}"
+              f"{u['wall_ms']:>10.1f}{u['cost_usd']:>11.6f}")
+
+    print(f"\n{'stage':<22}{'wall_ms':>10}{'llm':>6}{'embed':>7}{'qdrant':>8}{'redis':>7}")
+    for name, s in sorted(report["report"]["stages"].items()):
+        print(f"{name:<22}{s.get('wall_ms', 0):>10.1f}{s.get('llm_calls', 0):>6.0f}{s.get('embed_calls', 0):>7.0f}"
+              f"{s.get('qdrant_ops', 0):>8.0f}{s.get('redis_ops', 0):>7.0f}")
+
+    sk = report["sketch"]
+    print(f"\n   sketch: {sk['users']} users / {sk['events']} events in {sk['capacity']} slots → "
+          f"recall@{args.top} {sk['recall_at_top']:.0%}, max relative error {sk['max_relative_error_top']:.2%}")
+    print(f"   usage.add(): {report['add_cost_us']} µs per call\n")
+
+    for name, ok in report["checks"].items():
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
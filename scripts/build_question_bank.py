@@ -0,0 +1,96 @@
+# scripts/build_question_bank.py
+"""
+Offline build of the interview question bank.
+
+    python -m scripts.build_question_bank                       # generate with Gemini
+    python -m scripts.build_question_bank --dump bank.json      # ...and keep a copy
+    python -m scripts.build_question_bank --from-json bank.json # re-load without the LLM
+
+For every skill x difficulty the LLM writes N questions once; each question
+is embedded and stored with skill / difficulty / role payload indexes so
+/interview_text/start only needs a vector lookup.
+"""
+
+import sys
+import json
+import argparse
+
+from app.vector_db.orm import VectorORM
+from app.embeddings.generator import EmbeddingGenerator
+from app.llm.gemini_client import GeminiClient
+from app.interview.question_bank import QuestionBank, DIFFICULTIES
+from app.llm.scheduler import Priority
+
+SKILLS_FILE = "scripts/interview_skills.json"
+
+
+def generate_questions(llm: GeminiClient, skill: str, difficulty: str, n: int) -> list:
+    prompt = f"""
+Write {n} {difficulty} technical interview questions about {skill}.
+Each question must be self-contained and answerable in text in 3-6 sentences.
+Return STRICT JSON: ["question 1", "question 2", ...]
+"""
+    try:
+        out = llm.extract_text(llm.generate_raw(prompt.strip(), max_output_tokens=1024, priority=Priority.BULK))
+    except Exception as e:
+        print(f"⚠️ Generation failed for {skill}/{difficulty}:", e)
+        return []
+
+    return [q for q in GeminiClient.parse_facts(out, max_facts=n) if len(q) > 15]
+
+
+def build(skills: list, per_bucket: int) -> list:
+    llm = GeminiClient()
+    items = []
+    for entry in skills:
+        for difficulty in DIFFICULTIES:
+            questions = generate_questions(llm, entry["skill"], difficulty, per_bucket)
+            print(f"📝 {entry['skill']:<18} {difficulty:<7} {len(questions)} questions")
+            items.extend(
+                {"question": q, "skill": entry["skill"], "difficulty": difficulty, "roles": entry.get("roles", [])}
+                for q in questions
+            )
+    return items
+
+
+def ingest(items: list):
+    bank = QuestionBank(VectorORM())
+    emb = EmbeddingGenerator()
+
+    rows = []
+    for item in items:
+        vector = emb.create_embedding(f"{item['skill']}: {item['question']}", priority=Priority.BULK)
+        if not vector:
+            continue
+        rows.append({**item, "embedding": vector})
+
+    bank.add_questions(rows)
+    print(f"✅ {len(rows)} questions stored in {bank.collection}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the interview question bank")
+    parser.add_argument("--skills", default=SKILLS_FILE)
+    parser.add_argument("--per-bucket", type=int, default=8, help="Questions per skill x difficulty")
+    parser.add_argument("--from-json", default=None, help="Load pre-generated questions instead of calling the LLM")
+    parser.add_argument("--dump", default=None, help="Write generated questions to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.from_json:
+        with open(args.from_json, "r", encoding="utf-8") as f:
+            items = json.load(f)
+    else:
+        with open(args.skills, "r", encoding="utf-8") as f:
+            skills = json.load(f)
+        items = build(skills, args.per_bucket)
+
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            json.dump(items, f, indent=2, ensure_ascii=False)
+
+    ingest(items)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# scripts/compact_user_history.py
+"""
+Compaction worker for the user_history collection.
+
+    python -m scripts.compact_user_history --dry-run        # report only
+    python -m scripts.compact_user_history                  # one run
+    python -m scripts.compact_user_history --loop           # every COMPACTION_INTERVAL_SECONDS
+
+Point it at a local Qdrant with QDRANT_URL=http://localhost:6333.
+Merges near-duplicate summaries per user, expires old raw history and
+deletes inactive users; prints points removed and the user-memory fetch
+latency before / after as JSON.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from app.config import settings
+from app.vector_db.compaction import MemoryCompactor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact user long-term memory in Qdrant")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be removed, change nothing")
+    parser.add_argument("--similarity", type=float, default=None, help="Duplicate-summary cosine threshold")
+    parser.add_argument("--history-days", type=float, default=None, help="Retention of raw history points")
+    parser.add_argument("--inactive-days", type=float, default=None, help="Delete users idle for this long")
+    parser.add_argument("--loop", action="store_true", help="Keep running on a schedule")
+    parser.add_argument("--interval", type=int, default=settings.COMPACTION_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+
+    compactor = MemoryCompactor(
+        similarity=args.similarity,
+        history_days=args.history_days,
+        inactive_days=args.inactive_days,
+        dry_run=args.dry_run,
+    )
+
+    while True:
+        try:
+            report = compactor.run()
+            print(json.dumps(report, indent=2))
+        except Exception as e:
+            print("❌ Compaction failed:", e)
+            if not args.loop:
+                return 1
+
+        if not args.loop:
+            return 0
+        print(f"😴 Next compaction in {args.interval}s")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
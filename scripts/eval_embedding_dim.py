@@ -0,0 +1,156 @@
+# scripts/eval_embedding_dim.py
+"""
+Recall@k vs latency for reduced embedding widths.
+
+    python -m scripts.eval_embedding_dim                          # against the configured Qdrant
+    python -m scripts.eval_embedding_dim --offline                # fakes + bundled corpus
+    python -m scripts.eval_embedding_dim --dims 768 512 256 128 --k 5 --tolerance 0.02
+
+Corpus = the predefined collection's stored (full-width) vectors; queries
+are embedded once at full width. For every candidate width both are
+truncated + renormalized, and results are compared with full-width
+exact top-k (recall@k). Latency is measured for the in-process NumPy
+scan and, unless --no-qdrant, for Qdrant search on a temporary
+collection. The smallest width with recall >= 1 - tolerance is printed.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+QUERIES_FILE = "scripts/bench_sessions.jsonl"
+
+
+def load_queries(path: str, limit: int) -> list:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            text = rec.get("message") or rec.get("body") or rec.get("title")
+            if text:
+                out.append(text)
+            if len(out) >= limit:
+                break
+    return out
+
+
+def truncate(matrix: np.ndarray, dim: int) -> np.ndarray:
+    m = matrix[:, :dim]
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(idx, np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1), axis=1)
+
+
+def pct(values: list, p: float) -> float:
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def qdrant_latency(db, corpus: np.ndarray, queries: np.ndarray, dim: int, k: int) -> dict:
+    from qdrant_client.models import PointStruct
+
+    name = f"{db.predefined}_eval_{dim}"
+    if db.client.collection_exists(name):
+        db.client.delete_collection(name)
+    db._ensure_collection(name, dim=dim)
+    try:
+        db.client.upsert(name, [PointStruct(id=i, vector=v.tolist(), payload={}) for i, v in enumerate(corpus)])
+        timings = []
+        for q in queries:
+            start = time.perf_counter()
+            db.client.search(collection_name=name, query_vector=q.tolist(), limit=k)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        return {"qdrant_p50_ms": round(pct(timings, 50), 3), "qdrant_p95_ms": round(pct(timings, 95), 3)}
+    finally:
+        db.client.delete_collection(name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall@k vs latency for embedding widths")
+    parser.add_argument("--dims", type=int, nargs="+", default=[768, 512, 384, 256, 128])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--max-queries", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed recall@k loss")
+    parser.add_argument("--no-qdrant", action="store_true")
+    parser.add_argument("--offline", action="store_true", help="Use fakes + the bundled predefined corpus")
+    parser.add_argument("--out", default=None, help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        from scripts.bench_fakes import install_fakes, seed_predefined
+        install_fakes()
+        seed_predefined()
+
+    from app.vector_db.orm import VectorORM
+    from app.embeddings.generator import EmbeddingGenerator
+    from app.embeddings.backends import NATIVE_DIM
+    from app.llm.scheduler import Priority
+
+    db = VectorORM()
+    rows = [p.vector for p in db.iter_points(db.predefined, with_vectors=True) if p.vector]
+    if not rows:
+        print("❌ Predefined collection is empty")
+        return 1
+    corpus = np.asarray(rows, dtype=np.float32)
+    full_dim = corpus.shape[1]
+
+    texts = load_queries(args.queries, args.max_queries)
+    vectors = EmbeddingGenerator(dim=NATIVE_DIM).create_embeddings(texts, priority=Priority.BULK)
+    queries = np.asarray([v[:full_dim] for v in vectors if len(v) >= full_dim], dtype=np.float32)
+
+    truth = top_k(truncate(corpus, full_dim), truncate(queries, full_dim), args.k)
+    print(f"📐 {corpus.shape[0]} corpus vectors x {full_dim} dims, {len(queries)} queries, k={args.k}")
+
+    report = []
+    for dim in sorted({d for d in args.dims if d <= full_dim}, reverse=True):
+        c, q = truncate(corpus, dim), truncate(queries, dim)
+
+        timings = []
+        for row in q:
+            start = time.perf_counter()
+            top_k(c, row[None, :], args.k)
+            timings.append((time.perf_counter() - start) * 1000.0)
+
+        found = top_k(c, q, args.k)
+        recall = float(np.mean([
+            len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist())
+        ]))
+
+        entry = {
+            "dim": dim,
+            f"recall@{args.k}": round(recall, 4),
+            "numpy_p50_ms": round(pct(timings, 50), 4),
+            "numpy_p95_ms": round(pct(timings, 95), 4),
+            "bytes_per_vector": dim * 4,
+        }
+        if not args.no_qdrant:
+            entry.update(qdrant_latency(db, c, q, dim, args.k))
+        report.append(entry)
+        print("  " + "  ".join(f"{k}={v}" for k, v in entry.items()))
+
+    ok = [e for e in report if e[f"recall@{args.k}"] >= 1.0 - args.tolerance]
+    best = min(ok, key=lambda e: e["dim"]) if ok else None
+    if best:
+        print(f"✅ Smallest width within tolerance: {best['dim']} (recall@{args.k}={best[f'recall@{args.k}']})")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"results": report, "recommended_dim": best and best["dim"]}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
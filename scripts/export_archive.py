@@ -0,0 +1,93 @@
+# scripts/export_archive.py
+"""
+Bulk export of the SQL turn archive (analytics, memory rebuilds).
+
+    python -m scripts.export_archive --output turns.jsonl
+    python -m scripts.export_archive --table facts --user u123 --since 2026-01-01 --output facts.csv --format csv
+
+Reads go through the (user_id, created_at) indexes and stream with a
+server-side cursor, so exports never load a full table into memory and
+never touch Qdrant. On Postgres, --format csv uses COPY ... TO STDOUT.
+"""
+
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.db.connection import engine
+from app.db.models import ConversationTurn, MemoryFact
+
+TABLES = {"turns": ConversationTurn, "facts": MemoryFact}
+
+
+def build_query(model, user_id: str | None, since: datetime | None, until: datetime | None):
+    stmt = select(model.__table__)
+    if user_id:
+        stmt = stmt.where(model.user_id == user_id)
+    if since:
+        stmt = stmt.where(model.created_at >= since)
+    if until:
+        stmt = stmt.where(model.created_at < until)
+    return stmt.order_by(model.user_id, model.created_at)
+
+
+def export_copy(stmt, out) -> None:
+    """Postgres fast path: the server formats CSV, we only stream bytes."""
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    raw = engine.raw_connection()
+    try:
+        raw.cursor().copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    finally:
+        raw.close()
+
+
+def export_rows(stmt, out, fmt: str) -> int:
+    n = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=2000).execute(stmt)
+        writer = None
+        for row in result:
+            rec = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row._mapping.items()}
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(rec))
+                    writer.writeheader()
+                writer.writerow(rec)
+            else:
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export archived conversation turns / facts")
+    parser.add_argument("--table", choices=sorted(TABLES), default="turns")
+    parser.add_argument("--user", default=None, help="Only this user_id")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="ISO date/time, inclusive")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="ISO date/time, exclusive")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--output", default="-", help="File path, or - for stdout")
+    args = parser.parse_args(argv)
+
+    stmt = build_query(TABLES[args.table], args.user, args.since, args.until)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+
+    try:
+        if args.format == "csv" and engine.dialect.name == "postgresql":
+            export_copy(stmt, out)
+            print(f"✅ Exported {args.table} via COPY", file=sys.stderr)
+        else:
+            n = export_rows(stmt, out, args.format)
+            print(f"✅ Exported {n} {args.table} rows", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
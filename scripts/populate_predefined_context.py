@@ -1,7 +1,10 @@
 import json
 import uuid
-from vector_db.orm import VectorORM
-from embeddings.generator import EmbeddingGenerator
+from app.vector_db.orm import VectorORM, PREDEFINED_PARTITION_FIELDS
+from app.embeddings.generator import EmbeddingGenerator
+from app.vector_db.snapshot import snapshot_collection
+from app.config import settings
+from app.llm.scheduler import Priority
 
 DATA_FILE = "scripts/predefined_data.json"
 
@@ -15,6 +18,7 @@ def recreate_collection(db: VectorORM, name: str):
 
     print(f"📌 Recreating collection: {name}")
     db._ensure_collection(name)
+    db._ensure_payload_index(name, PREDEFINED_PARTITION_FIELDS)
 
 
 def load_from_list(db, emb, items):
@@ -22,16 +26,21 @@ def load_from_list(db, emb, items):
 
     for item in items:
         text = item["text"]
-        role = item.get("role", "system")
+        role = (item.get("role") or "system").strip().lower()
+        domain = (item.get("domain") or "coach").strip().lower()
 
-        embedding = emb.create_embedding(text)
+        embedding = emb.create_embedding(text, priority=Priority.BULK)
+        if not embedding:
+            print(f"⚠️ Skipping (no embedding): {text[:60]}")
+            continue
 
         db.insert(
             collection=db.predefined,
             text=text,
             embedding=embedding,
             metadata={
-                "role": role
+                "role": role,
+                "domain": domain,
             }
         )
 
@@ -51,6 +60,10 @@ def load_from_json(path):
 
     load_from_list(db, emb, items)
 
+    # Emit the memory-mapped snapshot served in-process by VectorSearchEngine
+    if settings.PREDEFINED_SNAPSHOT_DIR:
+        snapshot_collection(db, db.predefined, settings.PREDEFINED_SNAPSHOT_DIR, model=emb.identity)
+
 
 if __name__ == "__main__":
     load_from_json(DATA_FILE)
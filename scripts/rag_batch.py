@@ -0,0 +1,103 @@
+# scripts/rag_batch.py
+"""
+Offline bulk answering with RAGService (evaluation runs, backfills).
+
+    python -m scripts.rag_batch --input messages.jsonl --output answers.jsonl
+    python -m scripts.rag_batch --input messages.jsonl --output answers.jsonl --resume
+
+Input lines:  {"user_id": "...", "message": "...", "domain"?: "...", "role"?: "...", ...}
+Output lines: the input fields + "index", "answer", "sources", "error", "latency_ms"
+
+The output file is the checkpoint: with --resume, input lines whose index
+already has a successful answer are skipped and new results are appended
+(failed items are retried; the last record per index wins).
+LLM calls run at BULK priority, so a batch never delays live /rag traffic.
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from app.rag.rag_service import RAGService
+from app.llm.scheduler import Priority
+
+
+def load_done(path: str) -> set:
+    """Indexes that already have a successful answer in the output file."""
+    done = set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue            # torn last line from an interrupted run
+                if rec.get("error") is None and "index" in rec:
+                    done.add(rec["index"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def read_items(path: str, skip: set):
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line or index in skip:
+                continue
+            try:
+                item = json.loads(line)
+            except Exception as e:
+                print(f"⚠️ Line {index}: invalid JSON ({e})")
+                continue
+            yield {**item, "index": index}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL stream of messages with RAGService")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--resume", action="store_true", help="Skip items already answered in --output")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Queries embedded per API call")
+    parser.add_argument("--search-concurrency", type=int, default=None)
+    parser.add_argument("--llm-concurrency", type=int, default=None)
+    parser.add_argument("--store-memory", action="store_true", help="Also store extracted user memories")
+    parser.add_argument("--report-every", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    done = load_done(args.output) if args.resume else set()
+    if done:
+        print(f"⏩ Resuming: {len(done)} items already answered")
+
+    service = RAGService()
+    results = service.answer_batch(
+        read_items(args.input, done),
+        chunk_size=args.chunk_size,
+        search_concurrency=args.search_concurrency,
+        llm_concurrency=args.llm_concurrency,
+        priority=Priority.BULK,
+        store_memory=args.store_memory,
+    )
+
+    n = errors = 0
+    start = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as out:
+        for rec in results:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+            errors += rec.get("error") is not None
+
+            if n % args.report_every == 0:
+                out.flush()
+                elapsed = time.perf_counter() - start
+                print(f"⏱️ {n} answered ({errors} errors) — {n / elapsed:.2f} msg/s")
+
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed if elapsed > 0 else 0.0
+    print(f"✅ {n} answered, {errors} errors in {elapsed:.1f}s → {rate:.2f} msg/s")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# scripts/rebalance_user_shards.py
+"""
+Move users between user_history shard keys (USER_HISTORY_SHARD_KEYS > 0).
+
+    python -m scripts.rebalance_user_shards --status
+    python -m scripts.rebalance_user_shards --move u123 --to user_shard_3
+    python -m scripts.rebalance_user_shards --auto --tolerance 0.1 --dry-run
+    python -m scripts.rebalance_user_shards --auto
+
+--auto moves the largest users that fit from the most loaded shard key to
+the least loaded one until every key is within `tolerance` of the mean
+(points, not users). Use it after raising USER_HISTORY_SHARD_KEYS: new keys
+start empty because existing users keep their placement.
+
+Each move is copy → pin in the shard map → wait for every worker to
+reload the map → copy again (writes that raced the switch) → delete the
+old copy. Reads keep working throughout: until a worker reloads, it still
+reads the source shard, which is only cleaned up at the end.
+"""
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+from app.vector_db.orm import VectorORM, TENANT_FIELD
+
+
+def shard_loads(db: VectorORM) -> dict:
+    """shard key -> Counter(user_id -> points), from a payload-only scan of each key."""
+    loads = {}
+    for key in db.router.shard_keys:
+        users = Counter()
+        for p in db.iter_points(db.user_history, shard_key=key):
+            users[str((p.payload or {}).get(TENANT_FIELD, ""))] += 1
+        loads[key] = users
+    return loads
+
+
+def plan_moves(loads: dict, tolerance: float) -> list:
+    """Greedy plan: [(user_id, src, dst, points), ...]."""
+    totals = {k: sum(u.values()) for k, u in loads.items()}
+    users = {k: dict(u) for k, u in loads.items()}
+    mean = sum(totals.values()) / max(1, len(totals))
+    moves = []
+
+    while True:
+        src = max(totals, key=totals.get)
+        dst = min(totals, key=totals.get)
+        if totals[src] <= mean * (1 + tolerance) or src == dst:
+            break
+
+        # largest user that moves the pair closer together without overshooting
+        gap = totals[src] - totals[dst]
+        candidates = [(n, u) for u, n in users[src].items() if 0 < n < gap and n <= totals[src] - mean + 1]
+        if not candidates:
+            break
+        n, user_id = max(candidates)
+
+        moves.append((user_id, src, dst, n))
+        del users[src][user_id]
+        users[dst][user_id] = n
+        totals[src] -= n
+        totals[dst] += n
+
+    return moves
+
+
+def _user_filter(user_id: str) -> Filter:
+    return Filter(must=[FieldCondition(key=TENANT_FIELD, match=MatchValue(value=str(user_id)))])
+
+
+def _copy(db: VectorORM, user_id: str, src: str, dst: str) -> int:
+    points = db.iter_points(db.user_history, where={TENANT_FIELD: user_id}, with_vectors=True, shard_key=src)
+    return db.upsert_points(db.user_history, points, shard_key=dst)
+
+
+def apply_moves(db: VectorORM, moves: list):
+    if not moves:
+        return
+
+    for user_id, src, dst, _ in moves:
+        copied = _copy(db, user_id, src, dst)
+        print(f"📦 {user_id}: copied {copied} points {src} → {dst}")
+
+    db.router.pin({user_id: dst for user_id, _, dst, _ in moves})
+
+    grace = db.router.refresh_seconds * 2
+    print(f"⏳ Waiting {grace:.0f}s for workers to reload the shard map...")
+    time.sleep(grace)
+
+    for user_id, src, dst, _ in moves:
+        _copy(db, user_id, src, dst)
+        db.client.delete(
+            collection_name=db.user_history,
+            points_selector=_user_filter(user_id),
+            shard_key_selector=src,
+        )
+        print(f"✅ {user_id} now on {dst}")
+
+
+def print_status(loads: dict):
+    total = sum(sum(u.values()) for u in loads.values())
+    mean = total / max(1, len(loads))
+    print(f"{'shard key':<16}{'users':>8}{'points':>10}{'vs mean':>10}")
+    for key, users in loads.items():
+        points = sum(users.values())
+        print(f"{key:<16}{len(users):>8}{points:>10}{(points / mean - 1 if mean else 0):>+10.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebalance user_history shard keys")
+    parser.add_argument("--status", action="store_true", help="Show users / points per shard key")
+    parser.add_argument("--move", default=None, help="user_id to move (with --to)")
+    parser.add_argument("--to", default=None, help="Destination shard key for --move")
+    parser.add_argument("--auto", action="store_true", help="Plan and apply moves toward an even load")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed load above the mean (0.1 = +10%%)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan only")
+    args = parser.parse_args(argv)
+
+    db = VectorORM()
+    if db.router is None:
+        print("❌ user_history is not custom-sharded (set USER_HISTORY_SHARD_KEYS on a new collection)")
+        return 1
+
+    if args.move:
+        if not args.to:
+            parser.error("--move needs --to")
+        src = db.router.shard_for(args.move)
+        if src == args.to:
+            print(f"ℹ️ {args.move} is already on {src}")
+            return 0
+        moves = [(args.move, src, args.to, None)]
+    elif args.auto:
+        loads = shard_loads(db)
+        print_status(loads)
+        moves = plan_moves(loads, args.tolerance)
+        print(f"\n🧮 {len(moves)} moves planned ({sum(m[3] for m in moves)} points)")
+        for user_id, src, dst, n in moves:
+            print(f"  {user_id}: {src} → {dst} ({n} points)")
+    else:
+        print_status(shard_loads(db))
+        return 0
+
+    if args.dry_run:
+        return 0
+
+    apply_moves(db, moves)
+    if args.auto:
+        print()
+        print_status(shard_loads(db))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# scripts/reindex_embeddings.py
+"""
+Copy collections into new ones at a different embedding width.
+
+    python -m scripts.reindex_embeddings --dim 256                 # truncate + renormalize stored vectors
+    python -m scripts.reindex_embeddings --dim 256 --reembed       # re-embed every text instead
+    python -m scripts.reindex_embeddings --dim 256 --snapshot-dir snapshots/predefined_256
+
+Targets are named <collection>_<dim>; sources are left untouched so the
+switch is a config change (and reversible):
+
+    EMBEDDING_DIM=256 PREDEFINED_COLLECTION=<predefined>_256 USER_HISTORY_COLLECTION=<history>_256
+
+Truncation is only valid for shrinking vectors from a model trained with
+Matryoshka-style prefixes (text-embedding-004 is); use --reembed otherwise.
+Check the expected recall first with scripts/eval_embedding_dim.py.
+"""
+
+import sys
+import argparse
+
+from app.vector_db.orm import VectorORM
+from app.vector_db.snapshot import snapshot_collection
+from app.embeddings.generator import EmbeddingGenerator
+from app.embeddings.backends import fit_dimension
+from app.llm.scheduler import Priority
+
+
+def reindex(db: VectorORM, source: str, dim: int, reembed: bool, batch_size: int) -> str:
+    target = f"{source}_{dim}"
+    embedder = EmbeddingGenerator(dim=dim) if reembed else None
+    identity = embedder.identity if embedder else f"{db.embedding_model.rsplit('@', 1)[0]}@{dim}"
+    db._ensure_collection(target, dim=dim, model=identity)
+
+    copied = skipped = 0
+    batch = []
+
+    def flush() -> int:
+        nonlocal batch
+        if embedder is not None:
+            vectors = embedder.create_embeddings([it["text"] for it in batch], priority=Priority.BULK)
+            for it, vec in zip(batch, vectors):
+                it["embedding"] = vec
+                if "vector" in it["metadata"]:
+                    it["metadata"]["vector"] = vec
+        rows = [it for it in batch if it["embedding"]]
+        if rows:
+            db.insert_many(target, rows, batch_size=batch_size)
+        batch = []
+        return len(rows)
+
+    for p in db.iter_points(source, with_vectors=not reembed, batch_size=batch_size):
+        payload = dict(p.payload or {})
+        if reembed:
+            vec = None
+        elif p.vector is None or len(p.vector) < dim:
+            skipped += 1
+            continue
+        else:
+            vec = fit_dimension(p.vector, dim)
+
+        if vec is not None and "vector" in payload:
+            payload["vector"] = vec             # user_history keeps a payload copy
+        payload["embedding_model"] = identity
+        batch.append({"id": p.id, "text": payload.get("text", ""), "embedding": vec, "metadata": payload})
+
+        if len(batch) >= batch_size:
+            copied += flush()
+
+    copied += flush()
+    print(f"✅ {source} → {target}: {copied} points at {dim} dims ({skipped} skipped)")
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reindex collections at a new embedding width")
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument("--collections", nargs="*", default=None, help="Default: predefined + user history")
+    parser.add_argument("--reembed", action="store_true", help="Re-embed texts instead of truncating vectors")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--snapshot-dir", default=None, help="Also write a predefined snapshot at the new width")
+    args = parser.parse_args(argv)
+
+    db = VectorORM()
+    collections = args.collections or [db.predefined, db.user_history]
+
+    targets = {c: reindex(db, c, args.dim, args.reembed, args.batch_size) for c in collections}
+
+    if args.snapshot_dir and db.predefined in targets:
+        snapshot_collection(db, targets[db.predefined], args.snapshot_dir, model=f"{db.embedding_model.rsplit('@', 1)[0]}@{args.dim}")
+
+    print("➡️ Switch with: EMBEDDING_DIM=%d %s" % (args.dim, " ".join(
+        f"{'PREDEFINED_COLLECTION' if c == db.predefined else 'USER_HISTORY_COLLECTION' if c == db.user_history else c}={t}"
+        for c, t in targets.items()
+    )))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
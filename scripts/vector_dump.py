@@ -0,0 +1,74 @@
+# scripts/vector_dump.py
+"""
+Backup / restore / migrate Qdrant collections without re-embedding.
+
+    python -m scripts.vector_dump export --out backups/2026-10-19
+    python -m scripts.vector_dump export --out backups/2026-10-19 --collections user_history --compress
+    python -m scripts.vector_dump import --src backups/2026-10-19
+    python -m scripts.vector_dump import --src backups/2026-10-19 --collections user_history --rename user_history=user_history_v2 --workers 8
+
+One sub-directory per collection (see app.vector_db.dump): raw float32
+vectors + NDJSON payloads + manifest with CRCs. Export pages with scroll
+offsets; import re-upserts batches in parallel with the original ids
+(re-runs are idempotent). The embedding API is never called, so a
+migration costs Qdrant I/O only.
+"""
+
+import os
+import sys
+import argparse
+
+from app.vector_db.orm import VectorORM
+from app.vector_db.dump import export_collection, import_collection, read_manifest
+
+
+def _mb(directory: str) -> float:
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export / import Qdrant collections (vectors + payloads)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export")
+    exp.add_argument("--out", required=True, help="Dump directory (one sub-directory per collection)")
+    exp.add_argument("--collections", nargs="*", default=None, help="Default: predefined + user_history")
+    exp.add_argument("--compress", action="store_true", help="gzip the vectors and payload files")
+    exp.add_argument("--batch-size", type=int, default=1024, help="Points per scroll page")
+
+    imp = sub.add_parser("import")
+    imp.add_argument("--src", required=True, help="Dump directory written by `export`")
+    imp.add_argument("--collections", nargs="*", default=None, help="Default: every collection in the dump")
+    imp.add_argument("--rename", nargs="*", default=[], help="source=target pairs")
+    imp.add_argument("--batch-size", type=int, default=512, help="Points per upsert")
+    imp.add_argument("--workers", type=int, default=4, help="Upserts in flight")
+
+    args = parser.parse_args(argv)
+    db = VectorORM()
+
+    if args.command == "export":
+        for name in args.collections or [db.predefined, db.user_history]:
+            directory = os.path.join(args.out, name)
+            m = export_collection(db, name, directory, compress=args.compress, batch_size=args.batch_size)
+            print(f"📦 {name}: {m['count']} points ({m['dim']}-dim, {m['model']}) → {directory} "
+                  f"[{_mb(directory):.1f} MB, {m['elapsed_s']}s, {m['skipped']} skipped]")
+        return 0
+
+    renames = dict(pair.split("=", 1) for pair in args.rename)
+    names = args.collections or sorted(
+        d for d in os.listdir(args.src) if os.path.exists(os.path.join(args.src, d, "manifest.json"))
+    )
+    failed = 0
+    for name in names:
+        directory = os.path.join(args.src, name)
+        manifest = read_manifest(directory)
+        target = renames.get(name, manifest["collection"])
+        r = import_collection(db, directory, target, batch_size=args.batch_size, workers=args.workers)
+        ok = r["imported"] == r["expected"]
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name} → {target}: {r['imported']}/{r['expected']} points in {r['elapsed_s']}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
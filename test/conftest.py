@@ -0,0 +1,39 @@
+# test/conftest.py
+"""
+Offline pytest setup: Redis, Qdrant and Gemini are replaced by the
+deterministic fakes in scripts/bench_fakes.py before anything under `app`
+is imported, so the suite needs no services or API key.
+
+    python -m pytest -q test
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.bench_fakes import install_fakes, seed_predefined  # noqa: E402
+
+GEMINI = install_fakes()
+
+# manual smoke scripts that post to a running server (python test/test_rag.py)
+collect_ignore = ["test_rag.py", "test_rag_batch.py", "test_interview_start.py"]
+
+
+@pytest.fixture(scope="session")
+def gemini():
+    return GEMINI
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The real app in-process (startup hooks included) over the fakes."""
+    seed_predefined()
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,63 @@
+# test/test_affinity.py
+
+import pytest
+
+from app.affinity import HashRing, UserStateCache, user_cache
+from app.vector_db.user_history import UserHistoryManager
+
+
+def test_removing_a_node_only_moves_its_users():
+    users = [f"user_{i}" for i in range(2000)]
+    ring = HashRing(["w0", "w1", "w2", "w3"])
+    before = {u: ring.node_for(u) for u in users}
+
+    after = {u: ring.node_for(u, exclude={"w2"}) for u in users}
+    moved = [u for u in users if before[u] != after[u]]
+    assert moved and all(before[u] == "w2" for u in moved)
+    assert "w2" not in after.values()
+    assert 0.15 < len(moved) / len(users) < 0.35            # about a quarter of the users
+
+
+def test_versioned_put_never_replaces_newer_state():
+    cache = UserStateCache(enabled=True)
+    cache.put("window", "u", "v2", version=2)
+    cache.put("window", "u", "v1", version=1)                # slow read finishing late
+    assert cache.get("window", "u") == "v2"
+    assert cache.stats()["kinds"]["window"]["stale_puts"] == 1
+
+
+def test_versioned_invalidate_rejects_older_reads():
+    cache = UserStateCache(enabled=True)
+    cache.put("summaries", "u", ["old"], version=1)
+    cache.invalidate("u", "summaries", version=3)
+
+    assert cache.get("summaries", "u") is None
+    cache.put("summaries", "u", ["read before the write"], version=2)
+    assert cache.get("summaries", "u") is None
+    cache.put("summaries", "u", ["read after the write"], version=4)
+    assert cache.get("summaries", "u") == ["read after the write"]
+
+
+@pytest.fixture
+def cache_on(monkeypatch):
+    monkeypatch.setattr(user_cache, "enabled", True)
+    yield user_cache
+    user_cache.clear()
+
+
+def test_summary_written_during_a_read_is_not_hidden_by_it(cache_on):
+    history = UserHistoryManager()
+    user_id = "summary_race_user"
+    scroll = history.db.iter_points
+
+    def scroll_then_concurrent_write(*args, **kwargs):
+        points = list(scroll(*args, **kwargs))              # the read has its (old) page...
+        history.db.iter_points = scroll
+        history.save_summary(user_id, "User is preparing for system design interviews")
+        return iter(points)                                 # ...and returns after the write
+
+    history.db.iter_points = scroll_then_concurrent_write
+    assert history.get_summaries(user_id) == []
+
+    texts = [s["text"] for s in history.get_summaries(user_id)]
+    assert texts == ["User is preparing for system design interviews"]
@@ -0,0 +1,69 @@
+# test/test_lexical_index.py
+
+import time
+import threading
+from types import SimpleNamespace
+
+from app.vector_db.lexical_index import BM25Index, PredefinedLexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_tech_names():
+    assert tokenize("Learn Node.js and C++ fast") == ["learn", "node.js", "nodejs", "c++", "fast"]
+
+
+def test_bm25_ranks_matching_document_first():
+    idx = BM25Index.from_docs([
+        {"text": "python basics for data analysis", "metadata": {"domain": "data"}},
+        {"text": "system design interview preparation", "metadata": {"domain": "career"}},
+        {"text": "docker and kubernetes deployment", "metadata": {"domain": "devops"}},
+    ])
+
+    hits = idx.search("system design interview", limit=2)
+    assert hits[0]["text"] == "system design interview preparation"
+    assert hits[0]["coverage"] == 1.0
+    assert idx.search("system design", where={"domain": "data"}) == []
+
+
+def test_average_length_is_kept_incrementally():
+    idx = BM25Index.from_docs({"text": "word " * n} for n in (1, 2, 3, 6))
+    assert idx._avg_len == 3.0
+
+
+def test_rrf_sums_reciprocal_ranks_by_text():
+    fused = reciprocal_rank_fusion([
+        [{"text": "A"}, {"text": "B"}],
+        [{"text": "b"}, {"text": "C"}],
+    ], k=60)
+
+    assert [f["text"] for f in fused] == ["B", "A", "C"]
+    assert abs(fused[0]["rrf_score"] - (1 / 62 + 1 / 61)) < 1e-12
+
+
+class _SlowDB:
+    """iter_points blocks until released, like a long scroll of a big collection."""
+    predefined = "predefined_context"
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.release = threading.Event()
+
+    def iter_points(self, collection):
+        self.release.wait(5)
+        for t in self.texts:
+            yield SimpleNamespace(payload={"text": t})
+
+
+def test_stale_index_refreshes_off_the_request_thread():
+    db = _SlowDB(["kubernetes deployment guide"])
+    lex = PredefinedLexicalIndex(db, refresh_seconds=0)
+
+    start = time.perf_counter()
+    assert lex.search("kubernetes") == []               # old (empty) index, no waiting on the scroll
+    assert time.perf_counter() - start < 1.0
+    assert lex.refresh_async() is False                 # one rebuild at a time
+
+    db.release.set()
+    deadline = time.monotonic() + 5
+    while len(lex._index) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert lex._index.search("kubernetes")[0]["text"] == "kubernetes deployment guide"
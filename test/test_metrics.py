@@ -0,0 +1,33 @@
+# test/test_metrics.py
+
+from app.metrics import Metrics, _percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert _percentile(values, 50) == 50
+    assert _percentile(values, 95) == 95
+    assert _percentile(values, 100) == 100
+    assert _percentile([], 50) == 0.0
+
+
+def test_timed_records_stage_and_counts():
+    m = Metrics(window=4)
+    for _ in range(6):
+        with m.timed("stage"):
+            pass
+    m.incr("hits", 3)
+    m.record("tokens", 10)
+
+    snap = m.snapshot()
+    assert snap["stages"]["stage"]["count"] == 6          # lifetime count, window bounds samples only
+    assert snap["counters"] == {"hits": 3}
+    assert snap["values"]["tokens"]["max"] == 10
+
+
+def test_reset_clears_everything():
+    m = Metrics()
+    m.observe("stage", 1.0)
+    m.incr("hits")
+    m.reset()
+    assert m.snapshot() == {"stages": {}, "counters": {}, "values": {}}
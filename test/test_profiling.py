@@ -0,0 +1,36 @@
+# test/test_profiling.py
+
+import os
+
+from app.config import settings
+from app.profiling import profile_request
+from scripts.bench_micro import check_thresholds
+
+
+def test_profiles_in_the_same_second_do_not_overwrite(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    for _ in range(3):
+        with profile_request("cprofile"):
+            sum(range(100))
+
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".prof")]) == 3
+
+
+def test_profiling_off_without_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    with profile_request(None):
+        pass
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_thresholds_compare_units_and_bytes():
+    limits = {"case": {"max_units": 1.0, "max_peak_bytes": 100}}
+
+    assert check_thresholds({"case": {"units": 0.9, "peak_bytes": 100}}, limits) == []
+    failures = check_thresholds({"case": {"units": 1.5, "peak_bytes": 200}, "unlisted": {"units": 9}}, limits)
+    assert len(failures) == 2 and all(f.startswith("case:") for f in failures)
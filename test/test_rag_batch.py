@@ -0,0 +1,23 @@
+import requests
+import json
+
+URL = "http://127.0.0.1:8000/rag/batch"
+
+payload = {
+    "items": [
+        {"user_id": "test_user_8", "message": "how should i prepare for a backend interview"},
+        {"user_id": "test_user_9", "message": "i am weak in system design, where do i start"},
+    ]
+}
+
+print("👉 Sending request to /rag/batch ...\n")
+
+try:
+    response = requests.post(URL, json=payload)
+
+    print("🔹 Status Code:", response.status_code)
+    print("🔹 Response JSON:")
+    print(json.dumps(response.json(), indent=2, ensure_ascii=False))
+except Exception as e:
+    print("❌ Error while connecting to the microservice:")
+    print(str(e))
@@ -0,0 +1,32 @@
+# test/test_reply_parsing.py
+
+from app.llm.gemini_client import GeminiClient
+
+parse = GeminiClient.parse_reply_with_facts
+
+
+def test_combined_json_yields_reply_and_facts():
+    out = '```json\n{"reply": " Start with SQL. ", "facts": ["wants data eng", "", 3, "knows python"]}\n```'
+    assert parse(out) == ("Start with SQL.", ["wants data eng", "knows python"])
+    assert parse('{"reply": "ok", "facts": ["a", "b", "c"]}', max_facts=2) == ("ok", ["a", "b"])
+
+
+def test_plain_text_is_the_reply():
+    assert parse("Just practise every day.") == ("Just practise every day.", None)
+
+
+def test_reply_cut_at_max_tokens_is_recovered():
+    reply, facts = parse('{"reply": "Line one.\\nLine two is cut mid-sen')
+    assert reply == "Line one.\nLine two is cut mid-sen"
+    assert facts is None
+
+
+def test_half_escape_and_half_surrogate_are_dropped():
+    assert parse('{"reply": "Tabs\\tand a cut escape \\')[0] == "Tabs\tand a cut escape"
+    assert parse('{"reply": "caf\\u00')[0] == "caf"
+    assert parse('{"reply": "smile \\ud83d')[0] == "smile"
+
+
+def test_json_without_reply_never_leaks_raw_json():
+    assert parse('{"facts": ["a"]}') == ("", None)
+    assert parse('{"reply": ') == ("", None)
@@ -0,0 +1,101 @@
+# test/test_scheduler.py
+
+import time
+import threading
+
+import pytest
+
+from app.llm.scheduler import LLMScheduler, Priority, SchedulerTimeout, is_quota_error
+
+
+def _scheduler(**kw):
+    kw.setdefault("max_concurrency", 1)
+    return LLMScheduler("test", rate_per_minute=60_000, burst=100, **kw)
+
+
+def _wait_queued(s, n):
+    deadline = time.monotonic() + 5
+    while sum(s.stats()["queued"].values()) < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def _run_queued(s, jobs):
+    """Hold the only slot, queue `jobs` [(priority, user)] in order, release; return dispatch order."""
+    order, threads = [], []
+
+    def work(priority, user):
+        with s.slot(priority, user_id=user):
+            order.append((priority, user))
+
+    with s.slot(Priority.INTERACTIVE, user_id="holder"):
+        for i, (priority, user) in enumerate(jobs):
+            t = threading.Thread(target=work, args=(priority, user))
+            t.start()
+            threads.append(t)
+            _wait_queued(s, i + 1)
+    for t in threads:
+        t.join(5)
+    return order
+
+
+def test_strict_priority_between_classes():
+    order = _run_queued(_scheduler(), [
+        (Priority.BULK, "a"), (Priority.BACKGROUND, "a"), (Priority.INTERACTIVE, "a"),
+    ])
+    assert [p for p, _ in order] == [Priority.INTERACTIVE, Priority.BACKGROUND, Priority.BULK]
+
+
+def test_round_robin_between_users_in_a_class():
+    order = _run_queued(_scheduler(), [
+        (Priority.BACKGROUND, "a"), (Priority.BACKGROUND, "a"), (Priority.BACKGROUND, "b"),
+    ])
+    assert [u for _, u in order] == ["a", "b", "a"]
+
+
+def test_reserved_slots_only_go_to_interactive_work():
+    s = _scheduler(max_concurrency=2, reserved_interactive=1)
+
+    with s.slot(Priority.BACKGROUND, user_id="bg"):
+        with pytest.raises(SchedulerTimeout):
+            with s.slot(Priority.BACKGROUND, user_id="bg2", timeout=0.1):
+                pass
+        with s.slot(Priority.INTERACTIVE, user_id="u", timeout=0.1):
+            assert s.stats()["in_flight"] == 2
+
+    assert s.stats() == {"in_flight": 0, "queued": {"interactive": 0, "background": 0, "bulk": 0}}
+
+
+def test_full_queue_rejects_immediately():
+    s = _scheduler(max_queue=1)
+    outcome = []
+
+    def queued():
+        try:
+            with s.slot(timeout=0.5):
+                outcome.append("ran")
+        except SchedulerTimeout:
+            outcome.append("timeout")
+
+    with s.slot(user_id="holder"):
+        waiter = threading.Thread(target=queued)
+        waiter.start()
+        _wait_queued(s, 1)
+
+        start = time.monotonic()
+        with pytest.raises(SchedulerTimeout, match="queue full"):
+            with s.slot(timeout=5):
+                pass
+        assert time.monotonic() - start < 0.5
+    waiter.join(5)
+    assert outcome == ["ran"]
+
+
+def test_quota_error_pauses_admission():
+    s = _scheduler()
+    s.report_quota_error(backoff_seconds=5)
+
+    with pytest.raises(SchedulerTimeout):
+        with s.slot(timeout=0.1):
+            pass
+    assert is_quota_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not is_quota_error(ValueError("bad request"))
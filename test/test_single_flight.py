@@ -0,0 +1,82 @@
+# test/test_single_flight.py
+
+import time
+import threading
+
+import fakeredis
+import pytest
+
+from app.rag.single_flight import DoNotCache, SingleFlight
+
+
+def _flight(**kw):
+    return SingleFlight(fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True), **kw)
+
+
+def test_key_scopes_by_domain_role_and_window_version():
+    key = SingleFlight.key_for
+    assert key("u", "  Yes ") == key("u", "yes")
+    assert key("u", "yes", window_version=3) != key("u", "yes", window_version=4)
+    assert key("u", "yes", domain="interview") != key("u", "yes", domain="coach")
+    assert key("u", "yes", role="backend") != key("u", "yes", role="frontend")
+    assert key("u", "a", "idem-1") == key("u", "b", "idem-1") == "idem:u:idem-1"
+
+
+def test_concurrent_duplicates_run_once():
+    sf = _flight()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"ai_text": "hi"}
+
+    threads = [threading.Thread(target=lambda: results.append(sf.do("k", fn))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"ai_text": "hi"}] * 5
+
+
+def test_result_is_shared_across_workers_but_errors_are_not():
+    server = fakeredis.FakeServer()
+    a = SingleFlight(fakeredis.FakeRedis(server=server, decode_responses=True))
+    b = SingleFlight(fakeredis.FakeRedis(server=server, decode_responses=True))
+
+    assert a.do("ok", lambda: {"n": 1}) == {"n": 1}
+    assert b.do("ok", lambda: pytest.fail("should replay")) == {"n": 1}
+
+    def error_reply():
+        raise DoNotCache({"ai_text": "[LLM ERROR]"})
+
+    assert a.do("err", error_reply) == {"ai_text": "[LLM ERROR]"}
+    assert b.do("err", lambda: {"ai_text": "fine"}) == {"ai_text": "fine"}
+
+
+def test_follower_stops_waiting_for_a_stuck_leader():
+    sf = _flight(lock_ttl=0.2)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: sf.do("k", lambda: release.wait(5) and "leader"))
+    leader.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    assert sf.do("k", lambda: "follower") == "follower"
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    leader.join(5)
+
+
+def test_repeated_short_reply_after_the_answer_is_a_new_turn(client):
+    from app.main import chat_memory
+
+    user_id = "single_flight_yes_user"
+    for _ in range(2):
+        assert client.post("/rag", json={"user_id": user_id, "message": "yes"}).status_code == 200
+
+    turns = chat_memory.get_recent(user_id)
+    assert sum(1 for t in turns if t["role"] == "user" and t["text"] == "yes") == 2
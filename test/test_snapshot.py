@@ -0,0 +1,67 @@
+# test/test_snapshot.py
+
+import time
+
+import numpy as np
+
+from app.vector_db import snapshot
+from app.vector_db.snapshot import MmapVectorIndex, write_snapshot
+
+
+def _records(n, dim=8):
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        yield {
+            "id": i,
+            "text": f"chunk {i}",
+            "vector": rng.standard_normal(dim).tolist(),
+            "payload": {"domain": "coach", "role": "backend" if i % 2 else "system"},
+        }
+
+
+def test_filtered_search_returns_only_matching_rows(tmp_path):
+    write_snapshot(str(tmp_path), _records(20))
+    index = MmapVectorIndex(str(tmp_path), source="predefined")
+
+    hits = index.search(np.ones(8), limit=20, where={"role": "backend"})
+    assert len(hits) == 10
+    assert all(h["metadata"]["role"] == "backend" for h in hits)
+    assert index.search(np.ones(8), limit=5, where={"role": "nobody"}) == []
+
+
+def test_partition_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "PARTITION_CACHE_SIZE", 4)
+    write_snapshot(str(tmp_path), _records(10))
+    snap = MmapVectorIndex(str(tmp_path), source="predefined")._snap
+
+    for i in range(50):
+        snap.candidates({"role": f"client-supplied-{i}"})
+    snap.candidates({"role": "client-supplied-46"})     # most recent stays
+    assert len(snap._partitions) == 4
+    assert '{"role": "client-supplied-46"}' in snap._partitions
+
+
+def test_reload_builds_off_the_request_thread(tmp_path, monkeypatch):
+    write_snapshot(str(tmp_path), _records(10), keep=5)
+    index = MmapVectorIndex(str(tmp_path), source="predefined", check_seconds=0)
+    first = index.manifest["version"]
+
+    class SlowLoad(snapshot._LoadedSnapshot):
+        def __init__(self, *args):
+            time.sleep(0.5)
+            super().__init__(*args)
+
+    monkeypatch.setattr(snapshot, "_LoadedSnapshot", SlowLoad)
+    time.sleep(1.1)                                         # versions are second-resolution
+    write_snapshot(str(tmp_path), _records(12), keep=5)
+
+    start = time.perf_counter()
+    assert index.maybe_reload() is True
+    assert index.search(np.ones(8), limit=3)                # old snapshot keeps serving
+    assert time.perf_counter() - start < 0.4
+    assert index.maybe_reload() is False                    # one reload at a time
+
+    deadline = time.monotonic() + 5
+    while index.manifest["version"] == first and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert index._snap.count == 12
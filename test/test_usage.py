@@ -0,0 +1,56 @@
+# test/test_usage.py
+
+import fakeredis
+import pytest
+
+from app.config import settings
+from app.usage import SpaceSaving, UsageTracker, cost_of
+from scripts.bench_fakes import ADMIN_TOKEN
+
+
+def test_space_saving_evicts_lightest_and_keeps_totals():
+    sketch = SpaceSaving(capacity=2)
+    sketch.add("heavy", 5.0, {"llm_calls": 5})
+    sketch.add("light", 1.0, {"llm_calls": 1})
+    sketch.add("new", 2.0, {"llm_calls": 2})
+
+    assert [(k, w, e) for k, w, e, _ in sketch.top(2)] == [("heavy", 5.0, 0.0), ("new", 3.0, 1.0)]
+    assert sketch.other == {"llm_calls": 1}                 # evicted counters are not lost
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_DAILY_BUDGET_USD", 0.01)
+    t = UsageTracker(top_k=10, flush_seconds=0)
+    t.enabled = True
+    t.r = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    return t
+
+
+def test_budget_counts_unflushed_and_flushed_cost(tracker):
+    spend = {"input_tokens": 200_000, "output_tokens": 20_000}
+    assert cost_of(spend) > 0.01
+
+    tracker.add(user_id="spender", stage="llm_generate", **spend)
+    assert tracker.over_budget("spender")
+    assert not tracker.over_budget("someone_else")
+
+    tracker.flush()                                         # now only in Redis
+    assert tracker.spent_today("spender") == pytest.approx(cost_of(spend))
+    assert tracker.over_budget("spender")
+
+
+def test_no_budget_never_blocks(tracker, monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_DAILY_BUDGET_USD", 0.0)
+    tracker.add(user_id="spender", input_tokens=10_000_000)
+    assert not tracker.over_budget("spender")
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/admin/usage"])
+def test_admin_endpoints_fail_closed(client, monkeypatch, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": ADMIN_TOKEN}).status_code == 200
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.get(path, headers={"X-Admin-Token": ""}).status_code == 404